@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+File Converter Benchmark
+
+Generates synthetic fixtures (DOCX, PDF, images, multi-sheet XLSX, Markdown),
+runs every conversion tool on them, either by calling the tool functions
+directly or through an in-process MCP client, and reports latency
+percentiles, throughput and peak RSS. Results can be saved as a baseline and
+later runs compared against it, e.g. before and after upgrading pdf2docx,
+Pillow or pyarrow.
+
+Usage:
+    python benchmark.py                                   # quick profile, both modes
+    python benchmark.py --profile full --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json          # exits with 1 on a regression
+"""
+
+import argparse
+import asyncio
+import base64
+import importlib.metadata
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+# Fixture sizes per profile
+PROFILES = {
+    "quick": {
+        "docx_pages": [1, 20],
+        "pdf_pages": [1, 10],
+        "images": [(256, 256, "RGB", "png", "jpg"), (2048, 2048, "RGBA", "png", "webp"),
+                   (2048, 2048, "L", "tiff", "png"), (1024, 1024, "P", "gif", "png")],
+        "xlsx_rows": [1000],
+        "markdown_sections": [10],
+    },
+    "full": {
+        "docx_pages": [1, 20, 200],
+        "pdf_pages": [1, 10, 100, 500],
+        "images": [(256, 256, "RGB", "png", "jpg"), (2048, 2048, "RGBA", "png", "webp"),
+                   (2048, 2048, "L", "tiff", "png"), (1024, 1024, "P", "gif", "png"),
+                   (8000, 8000, "RGB", "png", "jpg"), (1024, 1024, "CMYK", "tiff", "jpg")],
+        "xlsx_rows": [1000, 50000],
+        "markdown_sections": [10, 500],
+    },
+}
+
+# MCP tool name of each benchmarked tool function
+MCP_TOOL_NAMES = {
+    "convert_docx_to_pdf": "docx2pdf",
+    "convert_pdf_to_docx": "pdf2docx",
+    "convert_image": "convert_image",
+    "convert_excel_to_csv": "excel2csv",
+    "convert_html_to_pdf": "html2pdf",
+    "convert_content": "convert_content",
+}
+
+# Packages whose upgrades the benchmark is meant to catch
+TRACKED_PACKAGES = ["mcp", "pdf2docx", "pymupdf", "pillow", "pyarrow", "openpyxl", "markdown", "pdfkit", "docx2pdf"]
+
+WORDS = ("conversion document page table image report figure section value result "
+         "server client format quality stream buffer archive sheet column row").split()
+
+def sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+class FixtureFactory:
+    """Create deterministic fixtures once and reuse them across runs."""
+    
+    def __init__(self, directory: str, seed: int = 0):
+        self.directory = directory
+        self.seed = seed
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, name: str, build) -> str:
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            partial = path + ".partial" + os.path.splitext(path)[1]
+            build(partial, random.Random(f"{self.seed}:{name}"))
+            os.replace(partial, path)
+        return path
+    
+    def docx(self, pages: int) -> str:
+        def build(path, rng):
+            import docx
+            document = docx.Document()
+            for page in range(pages):
+                document.add_heading(f"Section {page + 1}", level=1)
+                for _ in range(4):
+                    document.add_paragraph(" ".join(sentence(rng) for _ in range(5)))
+                table = document.add_table(rows=4, cols=3)
+                for cell in table._cells:
+                    cell.text = rng.choice(WORDS)
+                if page < pages - 1:
+                    document.add_page_break()
+            document.save(path)
+        return self._path(f"document_{pages}p.docx", build)
+    
+    def pdf(self, pages: int) -> str:
+        def build(path, rng):
+            import pymupdf
+            document = pymupdf.open()
+            for page_number in range(pages):
+                page = document.new_page()
+                page.insert_text((72, 72), f"Page {page_number + 1}", fontsize=18)
+                text = "\n".join(sentence(rng, 10) for _ in range(30))
+                page.insert_textbox(pymupdf.Rect(72, 100, 523, 600), text, fontsize=10)
+                for row in range(5):
+                    for column in range(3):
+                        cell = pymupdf.Rect(72 + column * 150, 620 + row * 20, 222 + column * 150, 640 + row * 20)
+                        page.draw_rect(cell)
+                        page.insert_textbox(cell, rng.choice(WORDS), fontsize=9)
+            document.save(path)
+            document.close()
+        return self._path(f"document_{pages}p.pdf", build)
+    
+    def image(self, width: int, height: int, mode: str, fmt: str) -> str:
+        def build(path, rng):
+            from PIL import Image
+            # A smooth gradient plus noise compresses like a photograph, not like a flat fill
+            gradient = Image.linear_gradient("L").resize((width, height))
+            noise = Image.effect_noise((width, height), 40)
+            base = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_90)))
+            if mode == "RGBA":
+                image = base.convert("RGBA")
+                image.putalpha(gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT))
+            elif mode == "P":
+                image = base.quantize(256)
+            else:
+                image = base.convert(mode)
+            image.save(path, format="TIFF" if fmt == "tiff" else fmt.upper())
+        return self._path(f"image_{width}x{height}_{mode}.{fmt}", build)
+    
+    def xlsx(self, rows: int, sheets: int = 3) -> str:
+        def build(path, rng):
+            import openpyxl
+            workbook = openpyxl.Workbook(write_only=True)
+            for index in range(sheets):
+                sheet = workbook.create_sheet(f"Sheet{index + 1}")
+                sheet.append(["id", "name", "amount", "ratio", "note"])
+                for row in range(rows):
+                    sheet.append([row, rng.choice(WORDS), rng.randint(0, 10 ** 6), rng.random(), sentence(rng, 6)])
+            workbook.save(path)
+        return self._path(f"workbook_{rows}r.xlsx", build)
+    
+    def markdown(self, sections: int) -> str:
+        def build(path, rng):
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("# Benchmark document\n\n")
+                for index in range(sections):
+                    file.write(f"## Section {index + 1}\n\n{' '.join(sentence(rng) for _ in range(6))}\n\n")
+                    file.write("".join(f"- {sentence(rng, 6)}\n" for _ in range(4)) + "\n")
+                    file.write("| Name | Value |\n|------|-------|\n")
+                    file.write("".join(f"| {rng.choice(WORDS)} | {rng.randint(0, 999)} |\n" for _ in range(3)) + "\n")
+                    file.write(f"```\n{sentence(rng, 8)}\n```\n\n")
+        return self._path(f"document_{sections}s.md", build)
+
+def base64_file(path: str) -> str:
+    with open(path, "rb") as file:
+        return base64.b64encode(file.read()).decode("ascii")
+
+def build_cases(fixtures: FixtureFactory, profile: dict) -> list:
+    """Return (tool, label, input path, arguments) for every benchmark case."""
+    cases = []
+    for pages in profile["docx_pages"]:
+        path = fixtures.docx(pages)
+        cases.append(("convert_docx_to_pdf", f"{pages} pages", path, {"input_file": path}))
+    for pages in profile["pdf_pages"]:
+        path = fixtures.pdf(pages)
+        cases.append(("convert_pdf_to_docx", f"{pages} pages", path, {"input_file": path}))
+    for width, height, mode, input_format, output_format in profile["images"]:
+        path = fixtures.image(width, height, mode, input_format)
+        cases.append(("convert_image", f"{width}x{height} {mode} {input_format}->{output_format}", path,
+                      {"input_file": path, "output_format": output_format}))
+    for rows in profile["xlsx_rows"]:
+        path = fixtures.xlsx(rows)
+        cases.append(("convert_excel_to_csv", f"3 sheets x {rows} rows", path,
+                      {"input_file": path, "all_sheets": True, "archive": True}))
+    for sections in profile["markdown_sections"]:
+        path = fixtures.markdown(sections)
+        cases.append(("convert_html_to_pdf", f"markdown {sections} sections", path, {"input_file": path}))
+        cases.append(("convert_content", f"markdown {sections} sections md->html", path,
+                      {"file_content_base64": base64_file(path), "input_format": "md", "output_format": "html"}))
+    path = fixtures.image(*profile["images"][0][:4])
+    cases.append(("convert_content", "256x256 png->jpg", path,
+                  {"file_content_base64": base64_file(path), "input_format": "png", "output_format": "jpg"}))
+    return cases
+
+def process_tree_rss() -> int:
+    """Resident memory of this process and its children (the process pool) in bytes."""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    own_pid = str(os.getpid())
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+            if entry.name == own_pid or fields[1] == own_pid:
+                total += int(fields[21]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+class RssSampler:
+    """
+    Sample the RSS of the process tree while a case runs. Without /proc
+    (macOS, Windows) the peak RSS of this process from getrusage is reported.
+    """
+    
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._use_proc = os.path.isdir("/proc/self")
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss())
+            self._stop.wait(self.interval)
+    
+    def __enter__(self):
+        if self._use_proc:
+            self.peak = process_tree_rss()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, process_tree_rss())
+        else:
+            # ru_maxrss is in KiB on Linux and in bytes on macOS
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak = maxrss if sys.platform == "darwin" else maxrss * 1024
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of values."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def summarize(latencies: list, input_bytes: int, peak_rss: int) -> dict:
+    total = sum(latencies)
+    return {
+        "iterations": len(latencies),
+        "p50": percentile(latencies, 0.50),
+        "p90": percentile(latencies, 0.90),
+        "p99": percentile(latencies, 0.99),
+        "mean": total / len(latencies),
+        "min": min(latencies),
+        "max": max(latencies),
+        "ops_per_second": len(latencies) / total if total else 0.0,
+        "input_mb_per_second": input_bytes * len(latencies) / total / 1024 ** 2 if total else 0.0,
+        "input_bytes": input_bytes,
+        "peak_rss_bytes": peak_rss,
+    }
+
+def parse_result(result) -> dict:
+    """Turn a tool result (dict, JSON text or MCP CallToolResult) into a response dictionary."""
+    if isinstance(result, dict):
+        return result
+    if isinstance(result, str):
+        return json.loads(result)
+    if getattr(result, "isError", False):
+        return {"success": False, "error": " ".join(getattr(item, "text", "") for item in result.content)}
+    structured = getattr(result, "structuredContent", None)
+    if structured:
+        return json.loads(structured["result"]) if isinstance(structured.get("result"), str) else structured
+    return json.loads(result.content[0].text)
+
+async def run_case(call, tool: str, arguments: dict, input_bytes: int, warmup: int, iterations: int) -> dict:
+    """Time iterations of one tool call after warmup calls; stops at the first failure."""
+    for _ in range(warmup):
+        response = parse_result(await call(tool, arguments))
+        if not response.get("success"):
+            return {"error": response.get("error", "conversion failed")}
+    latencies = []
+    with RssSampler() as sampler:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = parse_result(await call(tool, arguments))
+            latencies.append(time.perf_counter() - started)
+            if not response.get("success"):
+                return {"error": response.get("error", "conversion failed")}
+    return summarize(latencies, input_bytes, sampler.peak)
+
+async def run_benchmark(cases: list, modes: list, warmup: int, iterations: int) -> dict:
+    import file_converter_server as server
+    
+    async def call_direct(tool, arguments):
+        # The tool functions are synchronous; run them in a thread like the server does
+        return await asyncio.to_thread(getattr(server, tool), **arguments)
+    
+    results = {}
+    
+    async def run_mode(mode, call):
+        for tool, label, path, arguments in cases:
+            key = f"{mode}:{tool}:{label}"
+            print(f"  {key} ...", end="", flush=True)
+            results[key] = await run_case(call, tool, arguments, os.path.getsize(path), warmup, iterations)
+            result = results[key]
+            print(f" failed: {result['error'][:80]}" if "error" in result else
+                  f" p50 {result['p50'] * 1000:.1f} ms, peak RSS {result['peak_rss_bytes'] / 1024 ** 2:.0f} MiB")
+    
+    if "direct" in modes:
+        await run_mode("direct", call_direct)
+    if "mcp" in modes:
+        from mcp.shared.memory import create_connected_server_and_client_session
+        async with create_connected_server_and_client_session(server.mcp) as session:
+            await run_mode("mcp", lambda tool, arguments: session.call_tool(MCP_TOOL_NAMES[tool], arguments))
+    return results
+
+def package_versions() -> dict:
+    versions = {}
+    for package in TRACKED_PACKAGES:
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+def print_report(results: dict):
+    print(f"\n{'case':<70} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'ops/s':>8} {'MB/s':>8} {'RSS MiB':>8}")
+    for key, result in results.items():
+        if "error" in result:
+            print(f"{key:<70} {'failed':>9}")
+            continue
+        print(f"{key:<70} {result['p50'] * 1000:>9.1f} {result['p90'] * 1000:>9.1f} {result['p99'] * 1000:>9.1f} "
+              f"{result['ops_per_second']:>8.2f} {result['input_mb_per_second']:>8.2f} "
+              f"{result['peak_rss_bytes'] / 1024 ** 2:>8.0f}")
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    """Print p50 and peak RSS changes against the baseline and return the regressed cases."""
+    regressions = []
+    previous = baseline["results"]
+    changed = {name: (old, new) for name, old in baseline.get("packages", {}).items()
+               if (new := package_versions().get(name)) != old}
+    print(f"\nCompared with baseline from {baseline.get('created', 'unknown date')}")
+    for name, (old, new) in changed.items():
+        print(f"  {name}: {old} -> {new}")
+    print(f"{'case':<70} {'p50 change':>11} {'RSS change':>11}")
+    for key, result in results.items():
+        old = previous.get(key)
+        if old is None or "error" in old or "error" in result:
+            continue
+        latency_ratio = result["p50"] / old["p50"] if old["p50"] else 1.0
+        rss_ratio = result["peak_rss_bytes"] / old["peak_rss_bytes"] if old["peak_rss_bytes"] else 1.0
+        flag = ""
+        if latency_ratio > 1 + threshold or rss_ratio > 1 + threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<70} {(latency_ratio - 1) * 100:>+10.1f}% {(rss_ratio - 1) * 100:>+10.1f}%{flag}")
+    return regressions
+
+def main():
+    """Main entry point for the benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark the File Converter MCP tools.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick", help="Fixture sizes to run")
+    parser.add_argument("--modes", default="direct,mcp", help="Comma-separated: direct, mcp")
+    parser.add_argument("--tools", help="Comma-separated tool names to run (default: all)")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed calls per case")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed calls per case before timing")
+    parser.add_argument("--output-mode", default="file", choices=["base64", "file", "resource"],
+                        help="output_mode passed to the tools")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache enabled (disabled by default)")
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "file_converter_bench_fixtures"),
+                        help="Directory where generated fixtures are kept between runs")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the fixture generator")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--save-baseline", help="Save the results as the baseline JSON file")
+    parser.add_argument("--baseline", help="Compare the results with this baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative p50 or peak RSS increase reported as a regression")
+    args = parser.parse_args()
+    
+    # The server reads its configuration at import time
+    if not args.cache:
+        os.environ["FILE_CONVERTER_CACHE"] = "0"
+    os.environ.setdefault("FILE_CONVERTER_OUTPUT_DIR", os.path.join(args.fixtures_dir, "output"))
+    
+    print(f"Generating {args.profile} fixtures in {args.fixtures_dir} ...")
+    started = time.perf_counter()
+    cases = build_cases(FixtureFactory(args.fixtures_dir, args.seed), PROFILES[args.profile])
+    print(f"✓ Fixtures ready in {time.perf_counter() - started:.1f}s")
+    if args.tools:
+        selected = set(args.tools.split(","))
+        cases = [case for case in cases if case[0] in selected]
+    for _, _, _, arguments in cases:
+        arguments["output_mode"] = args.output_mode
+    
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    print(f"Running {len(cases)} cases x {len(modes)} modes, {args.warmup} warmup + {args.iterations} timed calls each")
+    results = asyncio.run(run_benchmark(cases, modes, args.warmup, args.iterations))
+    print_report(results)
+    
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "profile": args.profile,
+        "output_mode": args.output_mode,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "packages": package_versions(),
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(report, file, indent=2)
+            print(f"✓ Results written to {path}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"✗ {len(regressions)} cases regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print("✓ No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -13,16 +13,46 @@ The server is built using the Model Context Protocol (MCP) Python SDK.
 
 from mcp.server.fastmcp import FastMCP, Context
 import os
-import base64
+import binascii
+import io
+import mmap
+import re
 from pathlib import Path
 import tempfile
 import mimetypes
 import json
-import glob
 import logging
 import sys
 import time
 import traceback
+import threading
+import asyncio
+import atexit
+import functools
+import contextvars
+import inspect
+import concurrent.futures
+import contextlib
+import collections
+import heapq
+import itertools
+import hashlib
+import uuid
+import glob
+import zipfile
+import csv
+import importlib
+import importlib.util
+import queue
+import multiprocessing
+import shutil
+import socket
+import subprocess
+import struct
+import zlib
+import http.server
+import urllib.parse
+import urllib.request
 
 # Set up logging
 logging.basicConfig(
@@ -34,16 +64,507 @@ logging.basicConfig(
 )
 logger = logging.getLogger("file_converter_mcp")
 
+# HTTP transport configuration
+# Transport used when the server is started directly: "stdio", "streamable-http" or "sse"
+TRANSPORT = os.environ.get("FILE_CONVERTER_TRANSPORT", "stdio").lower()
+# Address, port and number of uvicorn worker processes of the HTTP transports
+HTTP_HOST = os.environ.get("FILE_CONVERTER_HTTP_HOST", "127.0.0.1")
+HTTP_PORT = int(os.environ.get("FILE_CONVERTER_HTTP_PORT", "8000"))
+HTTP_WORKERS = int(os.environ.get("FILE_CONVERTER_HTTP_WORKERS", "1"))
+# Handle every request without server-side sessions, so that any replica can serve any request
+HTTP_STATELESS = os.environ.get("FILE_CONVERTER_HTTP_STATELESS", "1").lower() not in ("0", "false", "no", "off")
+# Answer requests with a single JSON response instead of an SSE stream
+HTTP_JSON_RESPONSE = os.environ.get("FILE_CONVERTER_HTTP_JSON_RESPONSE", "0").lower() not in ("0", "false", "no", "off")
+
 # Initialize MCP server
-mcp = FastMCP("File Converter")
+mcp = FastMCP("File Converter", host=HTTP_HOST, port=HTTP_PORT,
+              stateless_http=HTTP_STATELESS, json_response=HTTP_JSON_RESPONSE)
+
+# Metrics configuration
+# Port of the local HTTP endpoint serving /metrics in the Prometheus text format (0 disables it)
+METRICS_PORT = int(os.environ.get("FILE_CONVERTER_METRICS_PORT", "0"))
+# Address the metrics endpoint listens on
+METRICS_HOST = os.environ.get("FILE_CONVERTER_METRICS_HOST", "127.0.0.1")
+# Histogram bucket upper bounds for durations (seconds) and sizes (1 KiB to 1 GiB)
+METRICS_DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+METRICS_SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(11))
+
+class ToolCall:
+    """Stage timings and input and output sizes gathered during one tool call."""
+    
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.status = "success"
+        self.stages = collections.defaultdict(float)
+        # Sizes keyed by file path or object id, so an input resolved twice counts once
+        self.inputs = {}
+        self.outputs = {}
+        self._lock = threading.Lock()
+    
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] += seconds
+    
+    def add_input(self, key, size: int):
+        with self._lock:
+            self.inputs[key] = size
+    
+    def add_output(self, key, size: int):
+        with self._lock:
+            self.outputs[key] = size
+
+# Tool call of the current thread or task, and the stage being timed in it
+current_call = contextvars.ContextVar("current_call", default=None)
+current_stage = contextvars.ContextVar("current_stage", default=None)
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms with labels, rendered in the Prometheus text
+    exposition format. Collectors add gauges computed at render time from the
+    stats() of the shared executor, cache and workspaces.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._values = {}
+        self._histograms = {}
+        self._collectors = []
+    
+    def describe(self, name: str, metric_type: str, help_text: str, buckets: tuple = None):
+        self._meta[name] = (metric_type, help_text, buckets)
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+    
+    def observe(self, name: str, value: float, **labels):
+        buckets = self._meta[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+    
+    def add_collector(self, collector):
+        """Register a callable returning (name, type, help, labels, value) tuples at render time."""
+        self._collectors.append(collector)
+    
+    @contextlib.contextmanager
+    def tool_call(self, tool: str):
+        """Track one call of tool: in-flight gauge, duration, stages, sizes and result."""
+        call = ToolCall(tool)
+        token = current_call.set(call)
+        self.inc("file_converter_tool_in_flight", tool=tool)
+        started = time.perf_counter()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            call.status = "cancelled"
+            raise
+        except BaseException:
+            call.status = "error"
+            raise
+        finally:
+            current_call.reset(token)
+            self.inc("file_converter_tool_in_flight", -1, tool=tool)
+            self._finish(call, time.perf_counter() - started)
+    
+    def _finish(self, call: ToolCall, seconds: float):
+        self.inc("file_converter_tool_calls_total", tool=call.tool, status=call.status)
+        if call.status != "success":
+            self.inc("file_converter_tool_errors_total", tool=call.tool)
+        self.observe("file_converter_tool_duration_seconds", seconds, tool=call.tool)
+        for stage, stage_seconds in call.stages.items():
+            self.observe("file_converter_stage_duration_seconds", stage_seconds, tool=call.tool, stage=stage)
+        if call.inputs:
+            self.observe("file_converter_input_bytes", sum(call.inputs.values()), tool=call.tool)
+        if call.outputs:
+            self.observe("file_converter_output_bytes", sum(call.outputs.values()), tool=call.tool)
+    
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Add the time spent in the block to stage name of the current tool call.
+        A stage nested in the same stage (e.g. a registry step calling
+        run_in_process) is only counted once.
+        """
+        call = current_call.get()
+        if call is None or current_stage.get() == name:
+            yield
+            return
+        token = current_stage.set(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            call.add_stage(name, time.perf_counter() - started)
+            current_stage.reset(token)
+    
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        def format_labels(labels) -> str:
+            if not labels:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                       for _, value in labels)
+            return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+        
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self._histograms.items()}
+        meta = dict(self._meta)
+        for collector in self._collectors:
+            try:
+                for name, metric_type, help_text, labels, value in collector():
+                    meta.setdefault(name, (metric_type, help_text, None))
+                    values[(name, tuple(sorted(labels.items())))] = value
+            except Exception as e:
+                logger.debug(f"Metrics collector failed: {str(e)}")
+        
+        def format_value(value) -> str:
+            return str(value) if isinstance(value, int) else repr(float(value))
+        
+        lines = []
+        for name, (metric_type, help_text, buckets) in meta.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type != "histogram":
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                continue
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+# Shared metrics of all tools
+metrics = MetricsRegistry()
+metrics.describe("file_converter_tool_calls_total", "counter", "Tool calls by result (success, error or cancelled).")
+metrics.describe("file_converter_tool_errors_total", "counter", "Tool calls that failed or were cancelled.")
+metrics.describe("file_converter_tool_in_flight", "gauge", "Tool calls currently queued or running.")
+metrics.describe("file_converter_tool_duration_seconds", "histogram", "Total duration of tool calls.",
+                 METRICS_DURATION_BUCKETS)
+metrics.describe("file_converter_stage_duration_seconds", "histogram",
+                 "Time a tool call spent in each stage: resolve, decode, convert, encode, serialize.",
+                 METRICS_DURATION_BUCKETS)
+metrics.describe("file_converter_input_bytes", "histogram", "Size of the inputs of a tool call.", METRICS_SIZE_BUCKETS)
+metrics.describe("file_converter_output_bytes", "histogram", "Size of the outputs of a tool call.", METRICS_SIZE_BUCKETS)
+
+def timed_stage(name: str, on_result=None):
+    """
+    Decorator adding the duration of every call to stage name of the current
+    tool call. on_result, if given, is called with the return value.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.stage(name):
+                result = func(*args, **kwargs)
+            if on_result is not None:
+                on_result(result)
+            return result
+        return wrapper
+    return decorator
+
+def record_input(key, size: int):
+    """Record the size of an input of the current tool call."""
+    call = current_call.get()
+    if call is not None:
+        call.add_input(key, size)
+
+def record_output(key, size: int):
+    """Record the size of an output of the current tool call."""
+    call = current_call.get()
+    if call is not None:
+        call.add_output(key, size)
+
+def record_input_file(path: str):
+    try:
+        record_input(os.path.abspath(path), os.path.getsize(path))
+    except OSError:
+        pass
+
+# Resolver configuration
+# Minimum number of seconds between two incremental rescans of the file index
+RESOLVER_RESCAN_INTERVAL = float(os.environ.get("FILE_CONVERTER_RESOLVER_RESCAN_INTERVAL", "2.0"))
+
+def get_search_locations() -> list:
+    """
+    Return the directories searched when a file is not found at its given path.
+    The order of the list is the search priority.
+    """
+    # Current directory and subdirectories (recursive)
+    search_locations = ["."]
+    
+    # Temp directories
+    search_locations.append(tempfile.gettempdir())
+    
+    # Common upload directories
+    for common_dir in ['/tmp', './uploads', '/var/tmp', '/var/upload', os.path.expanduser('~/tmp'), os.path.expanduser('~/Downloads')]:
+        if os.path.exists(common_dir):
+            search_locations.append(common_dir)
+    
+    # Claude specific upload locations (based on observation)
+    claude_dirs = ['./claude_uploads', './uploads', './input', './claude_files', '/tmp/claude']
+    for claude_dir in claude_dirs:
+        if os.path.exists(claude_dir):
+            search_locations.append(claude_dir)
+    
+    # Skip locations already covered by an earlier one (e.g. tempdir and /tmp)
+    unique_locations = []
+    seen = set()
+    for location in search_locations:
+        real_location = os.path.realpath(location)
+        if real_location not in seen:
+            seen.add(real_location)
+            unique_locations.append(location)
+    return unique_locations
+
+class FileIndex:
+    """
+    Filename index over the search locations used by validate_file_exists.
+    
+    The directory trees are walked once, then kept current incrementally: a
+    refresh only stats directories and re-lists the ones whose mtime changed.
+    Lookups by exact name, lowercase name and "<prefix>.*" are dictionary hits.
+    Like the recursive glob it replaces, hidden files and directories are skipped.
+    Directories registered with exclude (the server's own outputs, cache,
+    workspaces and uploads, which live below the temp directories) are never indexed.
+    """
+    
+    def __init__(self, locations_func=get_search_locations, rescan_interval: float = RESOLVER_RESCAN_INTERVAL):
+        self._locations_func = locations_func
+        self._rescan_interval = rescan_interval
+        self._lock = threading.RLock()
+        self._locations = []
+        self._excluded = set()
+        # directory -> (mtime, file names, subdirectory paths)
+        self._dirs = {}
+        # Lookup tables, each mapping a key to an ordered set of paths
+        self._by_name = {}
+        self._by_lower = {}
+        self._by_prefix = {}
+        self._last_refresh = None
+    
+    @staticmethod
+    def _name_prefixes(name: str) -> list:
+        """Return every prefix p such that name matches the glob "p.*"."""
+        return [name[:i] for i, char in enumerate(name) if char == "."]
+    
+    def _add_file(self, path: str, name: str):
+        self._by_name.setdefault(name, {})[path] = None
+        self._by_lower.setdefault(name.lower(), {})[path] = None
+        for prefix in self._name_prefixes(name):
+            self._by_prefix.setdefault(prefix, {})[path] = None
+    
+    def _remove_file(self, path: str, name: str):
+        for table, key in [(self._by_name, name), (self._by_lower, name.lower())] + \
+                [(self._by_prefix, prefix) for prefix in self._name_prefixes(name)]:
+            paths = table.get(key)
+            if paths is not None:
+                paths.pop(path, None)
+                if not paths:
+                    del table[key]
+    
+    def _scan_directory(self, directory: str, mtime: float):
+        """List a single directory and replace its entries in the index."""
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(os.path.join(directory, entry.name))
+                        elif entry.is_file():
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"Error scanning {directory}: {str(e)}")
+        
+        old = self._dirs.get(directory)
+        if old is not None:
+            for name in old[1]:
+                self._remove_file(os.path.join(directory, name), name)
+        for name in files:
+            self._add_file(os.path.join(directory, name), name)
+        self._dirs[directory] = (mtime, files, subdirs)
+    
+    def _forget_directory(self, directory: str):
+        """Drop a directory and everything below it from the index."""
+        entry = self._dirs.pop(directory, None)
+        if entry is None:
+            return
+        for name in entry[1]:
+            self._remove_file(os.path.join(directory, name), name)
+        for subdir in entry[2]:
+            self._forget_directory(subdir)
+    
+    def exclude(self, directory: str):
+        """
+        Keep directory and everything below it out of the index, e.g. the
+        directories where the server keeps files of other calls and clients.
+        """
+        with self._lock:
+            self._excluded.update({os.path.abspath(directory), os.path.realpath(directory)})
+            self._last_refresh = None
+    
+    def _is_excluded(self, directory: str) -> bool:
+        path = os.path.abspath(directory)
+        return any(self._under(path, excluded) for excluded in self._excluded)
+    
+    def refresh(self):
+        """
+        Bring the index up to date. Only directories whose mtime changed since
+        the previous scan are listed again; unchanged ones cost a single stat.
+        """
+        with self._lock:
+            started = time.monotonic()
+            rescanned = 0
+            self._locations = self._locations_func()
+            visited = set()
+            pending = list(self._locations)
+            while pending:
+                directory = pending.pop()
+                if directory in visited or self._is_excluded(directory):
+                    continue
+                visited.add(directory)
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    continue
+                cached = self._dirs.get(directory)
+                if cached is None or cached[0] != mtime:
+                    self._scan_directory(directory, mtime)
+                    rescanned += 1
+                pending.extend(self._dirs[directory][2])
+            
+            # Forget directories that disappeared or are no longer below a location
+            for directory in [d for d in self._dirs if d not in visited]:
+                self._forget_directory(directory)
+            
+            self._last_refresh = time.monotonic()
+            logger.info(f"File index refreshed: {len(visited)} directories checked, "
+                        f"{rescanned} rescanned in {self._last_refresh - started:.3f}s")
+    
+    def ensure_fresh(self, force: bool = False) -> bool:
+        """
+        Refresh the index if it was never built, if the rescan interval has
+        elapsed, or if force is set. Returns True if a refresh happened.
+        """
+        with self._lock:
+            if (force or self._last_refresh is None
+                    or time.monotonic() - self._last_refresh >= self._rescan_interval):
+                self.refresh()
+                return True
+            return False
+    
+    @staticmethod
+    def _under(path: str, location: str) -> bool:
+        return path == location or path.startswith(location.rstrip(os.sep) + os.sep)
+    
+    @staticmethod
+    def _sort_key(path: str):
+        # Shallow matches first, as the direct match and glob("**") did
+        return (path.count(os.sep), path)
+    
+    def find(self, names: list, stems: list = ()) -> list:
+        """
+        Find files named like one of names, or matching "<stem>.*" for one of
+        stems. Matches are grouped by search location in priority order; within
+        a location, exact names come first, then names differing only in case,
+        then stem matches.
+        """
+        with self._lock:
+            lookups = [
+                (self._by_name, names),
+                (self._by_lower, [name.lower() for name in names]),
+                (self._by_prefix, stems),
+            ]
+            matches = {}
+            for location in self._locations:
+                for table, keys in lookups:
+                    for key in keys:
+                        paths = [p for p in table.get(key, {}) if self._under(p, location)]
+                        for path in sorted(paths, key=self._sort_key):
+                            matches[path] = None
+            return list(matches)
+    
+    def find_containing(self, substring: str, location: str = ".", with_extension: bool = False) -> list:
+        """
+        Find files directly inside location whose name contains substring
+        (glob "*substring*"), or with with_extension, contains substring
+        followed by an extension (glob "*substring*.*").
+        """
+        with self._lock:
+            entry = self._dirs.get(location)
+            if entry is None:
+                return []
+            matches = []
+            for name in sorted(entry[1]):
+                position = name.find(substring)
+                if position == -1:
+                    continue
+                if with_extension and "." not in name[position + len(substring):]:
+                    continue
+                matches.append(os.path.join(location, name))
+            return matches
+    
+    def stats(self) -> dict:
+        """Return the size of the index."""
+        with self._lock:
+            return {
+                "locations": list(self._locations),
+                "excluded": sorted(self._excluded),
+                "directories": len(self._dirs),
+                "files": sum(len(entry[1]) for entry in self._dirs.values()),
+            }
+
+# Shared index used by validate_file_exists
+file_index = FileIndex()
+
+def _find_in_index(names: list, stems: list) -> list:
+    """
+    Look up filename candidates in the shared index, dropping paths that no
+    longer exist on disk.
+    """
+    return [path for path in file_index.find(names, stems) if os.path.isfile(path)]
 
 # Helper functions
+@timed_stage("resolve", on_result=record_input_file)
 def validate_file_exists(file_path: str, expected_extension: str = None) -> str:
     """
     Validate that a file exists and optionally check its extension.
     Returns the actual file path that exists.
     """
     logger.info(f"Looking for file: {file_path}")
+    check_cancelled()
+    
+    # Finished chunked uploads are addressed by their handle
+    if is_upload_handle(file_path):
+        actual_path = uploads.resolve(file_path)
+        if expected_extension and not actual_path.lower().endswith(expected_extension.lower()):
+            logger.warning(f"Upload doesn't have expected extension {expected_extension}: {actual_path}")
+        return actual_path
     
     # First check if the file exists as is
     path = Path(file_path)
@@ -70,58 +591,19 @@ def validate_file_exists(file_path: str, expected_extension: str = None) -> str:
             possible_filenames.append(f"{name_no_ext}{expected_extension}")
             possible_filenames.append(f"{name_no_ext}{expected_extension.lower()}")
     
-    # Add wildcard pattern for files with similar names (ignoring case)
-    for name in list(possible_filenames):
-        name_no_ext = os.path.splitext(name)[0]
-        possible_filenames.append(f"{name_no_ext}.*")
-    
-    logger.info(f"Looking for file variations: {possible_filenames}")
-    
-    # Places to search
-    search_locations = []
-    
-    # Current directory and subdirectories (recursive)
-    search_locations.append(".")
-    
-    # Temp directories
-    temp_dir = tempfile.gettempdir()
-    search_locations.append(temp_dir)
-    
-    # Common upload directories
-    for common_dir in ['/tmp', './uploads', '/var/tmp', '/var/upload', os.path.expanduser('~/tmp'), os.path.expanduser('~/Downloads')]:
-        if os.path.exists(common_dir):
-            search_locations.append(common_dir)
-    
-    # Claude specific upload locations (based on observation)
-    claude_dirs = ['./claude_uploads', './uploads', './input', './claude_files', '/tmp/claude']
-    for claude_dir in claude_dirs:
-        if os.path.exists(claude_dir):
-            search_locations.append(claude_dir)
+    # Files with similar names and any extension ("<stem>.*")
+    possible_stems = list(dict.fromkeys(os.path.splitext(name)[0] for name in possible_filenames))
+    possible_filenames = list(dict.fromkeys(possible_filenames))
     
-    logger.info(f"Searching in locations: {search_locations}")
+    logger.info(f"Looking for file variations: {possible_filenames}, stems: {possible_stems}")
     
-    # Gather all files in these locations
-    all_files = []
-    for location in search_locations:
-        logger.info(f"Searching in: {location}")
-        # First try direct match
-        for name in possible_filenames:
-            if "*" not in name:  # Skip wildcard patterns for direct match
-                potential_path = os.path.join(location, name)
-                if os.path.exists(potential_path):
-                    logger.info(f"Found direct match: {potential_path}")
-                    all_files.append(potential_path)
-        
-        # Then try recursive search with wildcard patterns
-        try:
-            for name in possible_filenames:
-                pattern = os.path.join(location, "**", name)
-                matches = glob.glob(pattern, recursive=True)
-                if matches:
-                    logger.info(f"Found matches for pattern {pattern}: {matches}")
-                    all_files.extend(matches)
-        except Exception as e:
-            logger.warning(f"Error during recursive search in {location}: {str(e)}")
+    # Search the index, refreshing it once more before giving up in case the
+    # file appeared since the last scan
+    refreshed = file_index.ensure_fresh()
+    all_files = _find_in_index(possible_filenames, possible_stems)
+    if not all_files and not refreshed:
+        file_index.ensure_fresh(force=True)
+        all_files = _find_in_index(possible_filenames, possible_stems)
     
     # Log all the files found
     logger.info(f"All found files: {all_files}")
@@ -146,40 +628,167 @@ def validate_file_exists(file_path: str, expected_extension: str = None) -> str:
         
         return actual_path
     
-    # Special case for Claude: try to use a simple glob in the current directory
-    try:
-        # This is a common pattern in Claude uploads - it adds random numbers
-        last_resort_patterns = [
-            f"*{filename}*",  # Anything containing the filename
-            f"*{filename_no_ext}*.*",  # Anything containing the filename without extension
-        ]
-        
-        for pattern in last_resort_patterns:
-            logger.info(f"Trying last resort pattern: {pattern}")
-            matches = glob.glob(pattern)
-            if matches:
-                logger.info(f"Found last resort matches: {matches}")
-                for match in matches:
-                    if os.path.isfile(match):
-                        if expected_extension and not match.lower().endswith(expected_extension.lower()):
-                            logger.warning(f"Last resort file doesn't have expected extension {expected_extension}: {match}")
-                            # Be flexible here too
-                        logger.info(f"Selected last resort file: {match}")
-                        return match
-    except Exception as e:
-        logger.warning(f"Error during last resort search: {str(e)}")
+    # Special case for Claude: look in the current directory for names that
+    # contain the filename. This is a common pattern in Claude uploads - it adds random numbers
+    last_resort_matches = file_index.find_containing(filename)
+    last_resort_matches += file_index.find_containing(filename_no_ext, with_extension=True)
+    for match in last_resort_matches:
+        if os.path.isfile(match):
+            if expected_extension and not match.lower().endswith(expected_extension.lower()):
+                logger.warning(f"Last resort file doesn't have expected extension {expected_extension}: {match}")
+                # Be flexible here too
+            logger.info(f"Selected last resort file: {match}")
+            return match
     
     # If we reach here, we couldn't find the file
     error_msg = f"File not found: {file_path}. Searched in multiple locations with various filename patterns."
     logger.error(error_msg)
     raise ValueError(error_msg)
 
+# Codec configuration
+# Bytes of decoded data handled per chunk by the base64 codec (rounded down to a multiple of 3)
+BASE64_CHUNK_SIZE = int(os.environ.get("FILE_CONVERTER_BASE64_CHUNK_SIZE", str(3 * 256 * 1024)))
+
+class StreamingBase64Codec:
+    """
+    Base64 codec that moves data between JSON strings and files in fixed-size
+    chunks instead of whole-file buffers.
+    
+    Decoding writes each chunk to disk as soon as it is decoded. Encoding reads the
+    file through a memory-mapped view and spools the encoded chunks to a temporary
+    file, which the result string is built from in one copy, so neither the raw
+    file nor a second copy of the encoded text is held in memory. The codec tracks
+    the largest working buffer it needed and the process peak RSS.
+    """
+    
+    # Characters allowed in standard base64 data
+    _VALID = re.compile(r"[A-Za-z0-9+/=]*")
+    _INVALID = re.compile(r"[^A-Za-z0-9+/=]")
+    
+    def __init__(self, chunk_size: int = BASE64_CHUNK_SIZE):
+        self.chunk_size = max(3, chunk_size - chunk_size % 3)
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+    
+    def _record(self, operation: str, raw_bytes: int, buffer_bytes: int):
+        with self._lock:
+            self._stats[f"{operation}_calls"] += 1
+            self._stats[f"{operation}_bytes"] += raw_bytes
+            self._stats["peak_buffer_bytes"] = max(self._stats["peak_buffer_bytes"], buffer_bytes)
+    
+    @timed_stage("decode")
+    def decode_to_file(self, data: str, output_path: str) -> int:
+        """
+        Decode base64 text into output_path and return the number of bytes written.
+        Whitespace and other characters outside the base64 alphabet are ignored,
+        as base64.b64decode does; incorrect padding raises binascii.Error.
+        """
+        chunk_chars = self.chunk_size // 3 * 4
+        written = 0
+        pending = ""
+        with open(output_path, "wb") as output:
+            for start in range(0, len(data), chunk_chars):
+                check_cancelled()
+                piece = pending + data[start:start + chunk_chars]
+                if not self._VALID.fullmatch(piece):
+                    piece = self._INVALID.sub("", piece)
+                usable = len(piece) - len(piece) % 4
+                pending = piece[usable:]
+                if usable:
+                    written += output.write(binascii.a2b_base64(piece[:usable]))
+            if pending:
+                written += output.write(binascii.a2b_base64(pending))
+        self._record("decode", written, chunk_chars + self.chunk_size)
+        record_input(os.path.abspath(output_path), written)
+        return written
+    
+    def decoded_size(self, data: str) -> int:
+        """
+        Return the number of bytes data decodes to, counting only characters of
+        the base64 alphabet and subtracting the padding.
+        """
+        length = len(data)
+        if not self._VALID.fullmatch(data):
+            length -= sum(1 for _ in self._INVALID.finditer(data))
+        padding = data.rstrip()[-2:].count("=")
+        return max(0, length * 3 // 4 - padding)
+    
+    @timed_stage("decode")
+    def decode_bytes(self, data: str) -> bytes:
+        """
+        Decode base64 text held in memory, ignoring characters outside the
+        alphabet like decode_to_file.
+        """
+        if not self._VALID.fullmatch(data):
+            data = self._INVALID.sub("", data)
+        decoded = binascii.a2b_base64(data)
+        self._record("decode", len(decoded), len(decoded))
+        record_input(id(data), len(decoded))
+        return decoded
+    
+    @timed_stage("encode")
+    def encode_bytes(self, data: bytes) -> str:
+        """
+        Return the base64 encoding of data held in memory.
+        """
+        self._record("encode", len(data), 4 * ((len(data) + 2) // 3))
+        return binascii.b2a_base64(data, newline=False).decode("ascii")
+    
+    @timed_stage("encode")
+    def encode_file(self, file_path: str) -> str:
+        """
+        Return the base64 encoded content of file_path. The encoded text is
+        spooled to a temporary file and decoded into the result from a
+        memory-mapped view, so the result is the only full-size buffer in memory.
+        """
+        size = os.path.getsize(file_path)
+        if size == 0:
+            self._record("encode", 0, 0)
+            return ""
+        with tempfile.TemporaryFile() as spool:
+            with open(file_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for start in range(0, size, self.chunk_size):
+                    check_cancelled()
+                    spool.write(binascii.b2a_base64(view[start:start + self.chunk_size], newline=False))
+            spool.flush()
+            with mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) as encoded:
+                result = str(encoded, "ascii")
+        self._record("encode", size, len(result) + self.chunk_size)
+        return result
+    
+    def stats(self) -> dict:
+        """
+        Return call counts, bytes processed, the largest working buffer and the
+        peak resident set size of the process (where the platform reports it).
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        try:
+            import resource
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # Linux reports kilobytes, macOS bytes
+            stats["peak_rss_bytes"] = max_rss if sys.platform == "darwin" else max_rss * 1024
+        except ImportError:
+            pass
+        return stats
+
+# Shared codec used by all tools
+base64_codec = StreamingBase64Codec()
+
+def decode_base64_to_file(file_content_base64: str, output_path: str) -> int:
+    """
+    Decode base64 content into a file and return the number of bytes written.
+    Files written into a workspace count against the workspace quota.
+    """
+    if os.path.abspath(output_path).startswith(os.path.abspath(WORKSPACE_DIR) + os.sep):
+        workspaces.check_quota(base64_codec.decoded_size(file_content_base64))
+    return base64_codec.decode_to_file(file_content_base64, output_path)
+
 def get_base64_encoded_file(file_path: str) -> str:
     """
     Read a file and return its base64 encoded content.
     """
-    with open(file_path, "rb") as file:
-        return base64.b64encode(file.read()).decode("utf-8")
+    return base64_codec.encode_file(file_path)
 
 def format_error_response(error_msg: str) -> dict:
     """
@@ -201,6 +810,418 @@ def format_success_response(data: str) -> dict:
         "data": data
     }
 
+# Output configuration
+# "base64" returns the converted file inline, "file" a path in OUTPUT_DIR, "resource" a converted:// URI
+OUTPUT_MODES = ("base64", "file", "resource")
+DEFAULT_OUTPUT_MODE = os.environ.get("FILE_CONVERTER_OUTPUT_MODE", "base64").lower()
+# Directory of file/resource outputs, read back by converted:// and download_chunk; HTTP replicas
+# behind one load balancer must share it
+OUTPUT_DIR = os.environ.get("FILE_CONVERTER_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "file_converter_output"))
+# Seconds a file/resource output is kept before it is swept (0 keeps outputs forever)
+OUTPUT_TTL = float(os.environ.get("FILE_CONVERTER_OUTPUT_TTL", "3600"))
+OUTPUT_RESOURCE_SCHEME = "converted"
+# Outputs are only reachable through the response of the call that made them
+file_index.exclude(OUTPUT_DIR)
+
+def format_file_response(path: str, uri: str, size: int, sha256: str, mime_type: str) -> dict:
+    """
+    Format a successful response that refers to the converted file instead of embedding it.
+    """
+    return {
+        "success": True,
+        "path": path,
+        "uri": uri,
+        "size": size,
+        "sha256": sha256,
+        "mime_type": mime_type
+    }
+
+_last_output_sweep = 0.0
+
+def sweep_output_dir():
+    """
+    Remove outputs older than OUTPUT_TTL. Runs at most once a minute.
+    """
+    global _last_output_sweep
+    now = time.time()
+    if OUTPUT_TTL <= 0 or now - _last_output_sweep < 60:
+        return
+    _last_output_sweep = now
+    try:
+        with os.scandir(OUTPUT_DIR) as entries:
+            for entry in entries:
+                if entry.is_file() and now - entry.stat().st_mtime > OUTPUT_TTL:
+                    os.remove(entry.path)
+    except OSError as e:
+        logger.warning(f"Failed to sweep output directory {OUTPUT_DIR}: {str(e)}")
+
+def resolve_output_mode(output_mode: str = None) -> str:
+    """
+    Return the effective output mode, raising ValueError for unknown modes.
+    """
+    mode = (output_mode or DEFAULT_OUTPUT_MODE).lower()
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unsupported output mode: {output_mode}. Supported modes: {', '.join(OUTPUT_MODES)}")
+    return mode
+
+def deliver_output(output_path: str, output_mode: str = None, keep_source: bool = False) -> dict:
+    """
+    Build the success response for a converted file.
+    
+    In "base64" mode the file is embedded in the response. In "file" and "resource"
+    modes it is moved (or copied, with keep_source) into OUTPUT_DIR and the response
+    carries its path or converted:// URI together with its size and SHA-256, so
+    clients sharing a filesystem with the server skip the base64 round trip.
+    """
+    mode = resolve_output_mode(output_mode)
+    record_output(os.path.abspath(output_path), os.path.getsize(output_path))
+    if mode == "base64":
+        return format_success_response(get_base64_encoded_file(output_path))
+    
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    sweep_output_dir()
+    file_id = f"{uuid.uuid4().hex}{os.path.splitext(output_path)[1].lower()}"
+    stored_path = os.path.abspath(os.path.join(OUTPUT_DIR, file_id))
+    if keep_source:
+        shutil.copyfile(output_path, stored_path)
+    else:
+        shutil.move(output_path, stored_path)
+    
+    digest = hashlib.sha256()
+    with open(stored_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    mime_type = mimetypes.guess_type(stored_path)[0] or "application/octet-stream"
+    uri = Path(stored_path).as_uri() if mode == "file" else f"{OUTPUT_RESOURCE_SCHEME}://{file_id}"
+    logger.info(f"Stored converted file at {stored_path} ({mode} mode)")
+    return format_file_response(stored_path, uri, os.path.getsize(stored_path), digest.hexdigest(), mime_type)
+
+def deliver_bytes(data: bytes, extension: str, output_mode: str = None) -> dict:
+    """
+    Build the success response for a conversion result held in memory, like
+    deliver_output but without a temporary file: base64 mode encodes the bytes
+    directly and the other modes write them once into OUTPUT_DIR.
+    """
+    mode = resolve_output_mode(output_mode)
+    record_output(id(data), len(data))
+    if mode == "base64":
+        return format_success_response(base64_codec.encode_bytes(data))
+    
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    sweep_output_dir()
+    file_id = f"{uuid.uuid4().hex}.{extension.lower().lstrip('.')}"
+    stored_path = os.path.abspath(os.path.join(OUTPUT_DIR, file_id))
+    with open(stored_path, "wb") as file:
+        file.write(data)
+    mime_type = mimetypes.guess_type(stored_path)[0] or "application/octet-stream"
+    uri = Path(stored_path).as_uri() if mode == "file" else f"{OUTPUT_RESOURCE_SCHEME}://{file_id}"
+    logger.info(f"Stored converted file at {stored_path} ({mode} mode)")
+    return format_file_response(stored_path, uri, len(data), hashlib.sha256(data).hexdigest(), mime_type)
+
+# Converted files stored with output_mode="resource"
+@mcp.resource(f"{OUTPUT_RESOURCE_SCHEME}://{{file_id}}")
+def read_converted_file(file_id: str) -> bytes:
+    """
+    Read a converted file stored by a tool called with output_mode="resource".
+    """
+    if not file_id or os.path.basename(file_id) != file_id:
+        raise ValueError(f"Invalid converted file id: {file_id}")
+    with open(os.path.join(OUTPUT_DIR, file_id), "rb") as file:
+        return file.read()
+
+# Chunked transfer configuration
+# Directory holding upload sessions; HTTP replicas behind one load balancer should share it
+UPLOAD_DIR = os.environ.get("FILE_CONVERTER_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "file_converter_uploads"))
+# Largest chunk accepted by append_chunk or returned by download_chunk, in decoded bytes
+TRANSFER_CHUNK_BYTES = int(os.environ.get("FILE_CONVERTER_TRANSFER_CHUNK_BYTES", str(4 * 1024 * 1024)))
+# Largest file accepted through an upload session (0 disables the limit)
+UPLOAD_MAX_BYTES = int(os.environ.get("FILE_CONVERTER_UPLOAD_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Seconds an upload is kept after it was last used (0 keeps uploads forever)
+UPLOAD_TTL = float(os.environ.get("FILE_CONVERTER_UPLOAD_TTL", "3600"))
+UPLOAD_HANDLE_SCHEME = "upload"
+# Uploads are only reachable through their handle, never by file name
+file_index.exclude(UPLOAD_DIR)
+
+class UploadOffsetMismatch(ValueError):
+    """Raised when a chunk does not start where its upload currently ends."""
+    
+    def __init__(self, upload_id: str, offset: int, expected: int):
+        super().__init__(f"Chunk offset {offset} does not match upload {upload_id}, "
+                         f"which holds {expected} bytes; resume at offset {expected}")
+        self.expected = expected
+
+def parse_checksum(checksum: str) -> tuple:
+    """Split "algorithm:hexdigest", or a bare SHA-256 hex digest, into its algorithm and digest."""
+    algorithm, _, digest = checksum.strip().rpartition(":")
+    algorithm = (algorithm or "sha256").lower()
+    if algorithm not in hashlib.algorithms_available:
+        raise ValueError(f"Unsupported checksum algorithm: {algorithm}")
+    return algorithm, digest.lower()
+
+def is_upload_handle(path: str) -> bool:
+    return isinstance(path, str) and path.startswith(f"{UPLOAD_HANDLE_SCHEME}://")
+
+class UploadManager:
+    """
+    Upload sessions that assemble a large input from base64 chunks sent in
+    separate tool calls, so that no single message carries the whole file.
+    
+    Each upload is a directory under root holding a JSON state file and the
+    data received so far. The size of the data file is the committed offset:
+    a client whose transfer was interrupted asks for the status and resumes
+    there, from this or any other process sharing the directory; writes to a
+    session are serialized across processes by a lock file. A finished
+    upload is addressed by an upload://<id> handle that the conversion tools
+    accept in place of an input path. Uploads unused for ttl seconds are removed.
+    """
+    
+    def __init__(self, root: str = UPLOAD_DIR, max_bytes: int = UPLOAD_MAX_BYTES,
+                 chunk_bytes: int = TRANSFER_CHUNK_BYTES, ttl: float = UPLOAD_TTL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+        self._last_sweep = 0.0
+    
+    def _dir(self, upload_id: str) -> str:
+        if not isinstance(upload_id, str) or not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+            raise ValueError(f"Invalid upload id: {upload_id}")
+        return os.path.join(self.root, upload_id)
+    
+    def _load(self, upload_id: str) -> dict:
+        try:
+            with open(os.path.join(self._dir(upload_id), "state.json")) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            raise ValueError(f"Unknown or expired upload: {upload_id}") from None
+    
+    def _save(self, state: dict):
+        path = os.path.join(self._dir(state["upload_id"]), "state.json")
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(state, file)
+        os.replace(temp_path, path)
+    
+    @contextlib.contextmanager
+    def _locked(self, upload_id: str):
+        """
+        Hold the thread lock and, where fcntl is available, an exclusive lock on
+        the session's lock file, so that workers sharing root never interleave
+        their writes to one upload.
+        """
+        with self._lock:
+            try:
+                import fcntl
+            except ImportError:
+                yield
+                return
+            try:
+                lock_file = open(os.path.join(self._dir(upload_id), ".lock"), "a+b")
+            except FileNotFoundError:
+                raise ValueError(f"Unknown or expired upload: {upload_id}") from None
+            with lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                yield
+    
+    def _data_path(self, state: dict) -> str:
+        name = state["filename"] if state["finished"] else "data.part"
+        return os.path.join(self._dir(state["upload_id"]), name)
+    
+    def _describe(self, state: dict) -> dict:
+        described = {
+            "upload_id": state["upload_id"],
+            "filename": state["filename"],
+            "offset": os.path.getsize(self._data_path(state)),
+            "total_size": state["total_size"],
+            "finished": state["finished"],
+            "max_chunk_bytes": self.chunk_bytes,
+        }
+        if state["finished"]:
+            described.update(handle=f"{UPLOAD_HANDLE_SCHEME}://{state['upload_id']}", sha256=state["sha256"])
+        return described
+    
+    def sweep(self):
+        """Remove uploads not used for ttl seconds. Runs at most once a minute."""
+        now = time.time()
+        with self._lock:
+            if self.ttl <= 0 or now - self._last_sweep < 60:
+                return
+            self._last_sweep = now
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                stale = now - os.stat(os.path.join(entry.path, "state.json")).st_mtime > self.ttl
+            except OSError:
+                stale = now - entry.stat().st_mtime > self.ttl
+            if stale:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                with self._lock:
+                    self._stats["expired"] += 1
+    
+    def begin(self, filename: str = None, total_size: int = None, checksum: str = None) -> dict:
+        """
+        Open an upload session. filename only names the finished upload (its
+        extension tells the conversion tools the format); total_size and
+        checksum, if given, are verified when the upload is finished.
+        """
+        if total_size is not None and (total_size < 0 or self.max_bytes and total_size > self.max_bytes):
+            raise ValueError(f"Upload size {total_size} exceeds the limit of {self.max_bytes} bytes")
+        if checksum:
+            parse_checksum(checksum)
+        filename = os.path.basename((filename or "").replace("\\", "/")).strip()
+        if filename in ("", ".", "..", "state.json", "data.part", ".lock"):
+            filename = "upload"
+        self.sweep()
+        state = {"upload_id": uuid.uuid4().hex, "filename": filename, "total_size": total_size,
+                 "checksum": checksum, "finished": False, "sha256": None}
+        os.makedirs(self._dir(state["upload_id"]))
+        open(self._data_path(state), "wb").close()
+        self._save(state)
+        with self._lock:
+            self._stats["started"] += 1
+        logger.info(f"Started upload {state['upload_id']} ({filename}, {total_size} bytes announced)")
+        return self._describe(state)
+    
+    def status(self, upload_id: str) -> dict:
+        """Return the offset at which the next chunk must start, and whether the upload is finished."""
+        return self._describe(self._load(upload_id))
+    
+    def append(self, upload_id: str, offset: int, data: bytes, checksum: str = None) -> dict:
+        """
+        Write data at offset, which must be the current end of the upload. A chunk
+        whose checksum does not match is rejected before anything is written.
+        """
+        if len(data) > self.chunk_bytes:
+            raise ValueError(f"Chunk of {len(data)} bytes exceeds the limit of {self.chunk_bytes} bytes")
+        if checksum:
+            algorithm, expected = parse_checksum(checksum)
+            if hashlib.new(algorithm, data).hexdigest() != expected:
+                with self._lock:
+                    self._stats["checksum_failures"] += 1
+                raise ValueError(f"Checksum mismatch for the chunk at offset {offset} of upload {upload_id}")
+        with self._locked(upload_id):
+            state = self._load(upload_id)
+            if state["finished"]:
+                raise ValueError(f"Upload {upload_id} is already finished")
+            with open(self._data_path(state), "r+b") as file:
+                # The size is read under the lock, after any other worker's write
+                size = os.fstat(file.fileno()).st_size
+                if offset != size:
+                    self._stats["offset_mismatches"] += 1
+                    raise UploadOffsetMismatch(upload_id, offset, size)
+                limit = state["total_size"] if state["total_size"] is not None else self.max_bytes
+                if limit and size + len(data) > limit:
+                    raise ValueError(f"Chunk would grow upload {upload_id} past {limit} bytes")
+                file.seek(offset)
+                file.write(data)
+            os.utime(os.path.join(self._dir(upload_id), "state.json"))
+            self._stats["chunks"] += 1
+            self._stats["chunk_bytes"] += len(data)
+        return self._describe(state)
+    
+    def finish(self, upload_id: str, checksum: str = None) -> dict:
+        """
+        Verify the size and checksum of a complete upload and return its handle.
+        Finishing a finished upload returns the same handle again.
+        """
+        with self._locked(upload_id):
+            state = self._load(upload_id)
+            if state["finished"]:
+                return self._describe(state)
+            path = self._data_path(state)
+            size = os.path.getsize(path)
+            if state["total_size"] is not None and size != state["total_size"]:
+                raise ValueError(f"Upload {upload_id} holds {size} of {state['total_size']} bytes")
+            checksum = checksum or state["checksum"]
+            algorithm, expected = parse_checksum(checksum) if checksum else ("sha256", None)
+            digests = {"sha256": hashlib.sha256()}
+            digests.setdefault(algorithm, hashlib.new(algorithm))
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    for digest in digests.values():
+                        digest.update(chunk)
+            if expected and digests[algorithm].hexdigest() != expected:
+                self._stats["checksum_failures"] += 1
+                raise ValueError(f"Checksum mismatch for upload {upload_id}")
+            state.update(finished=True, sha256=digests["sha256"].hexdigest())
+            os.replace(path, self._data_path(state))
+            self._save(state)
+            self._stats["completed"] += 1
+        logger.info(f"Finished upload {upload_id} ({size} bytes)")
+        return self._describe(state)
+    
+    def abort(self, upload_id: str):
+        """Delete an upload, finished or not."""
+        self._load(upload_id)
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+        with self._lock:
+            self._stats["aborted"] += 1
+    
+    def resolve(self, handle: str) -> str:
+        """Return the path of the finished upload behind an upload:// handle."""
+        state = self._load(handle[len(f"{UPLOAD_HANDLE_SCHEME}://"):].strip("/"))
+        if not state["finished"]:
+            raise ValueError(f"Upload {state['upload_id']} is not finished yet")
+        # Using an upload keeps it from expiring
+        os.utime(os.path.join(self._dir(state["upload_id"]), "state.json"))
+        return self._data_path(state)
+    
+    def stats(self) -> dict:
+        """Return the number and size of open and finished uploads, plus chunk and checksum counters."""
+        stats = {"open": 0, "finished": 0, "bytes": 0}
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            entries = []
+        for entry in entries:
+            try:
+                for item in os.scandir(entry.path):
+                    if item.name == "data.part":
+                        stats["open"] += 1
+                    elif item.name not in ("state.json", ".lock") and not item.name.endswith(".tmp"):
+                        stats["finished"] += 1
+                    else:
+                        continue
+                    stats["bytes"] += item.stat().st_size
+            except OSError:
+                continue
+        with self._lock:
+            stats.update(self._stats)
+        return stats
+
+# Shared upload sessions
+uploads = UploadManager()
+
+def read_output_chunk(uri: str, offset: int = 0, length: int = None) -> dict:
+    """
+    Read up to length bytes (at most TRANSFER_CHUNK_BYTES) at offset from a
+    converted file stored in OUTPUT_DIR, given its converted:// URI, file:// URI or path.
+    """
+    if uri.startswith(f"{OUTPUT_RESOURCE_SCHEME}://"):
+        path = os.path.join(OUTPUT_DIR, uri[len(f"{OUTPUT_RESOURCE_SCHEME}://"):])
+    elif uri.startswith("file://"):
+        path = urllib.request.url2pathname(urllib.parse.urlparse(uri).path)
+    else:
+        path = uri
+    path = os.path.realpath(path)
+    if os.path.dirname(path) != os.path.realpath(OUTPUT_DIR) or not os.path.isfile(path):
+        raise ValueError(f"Not a converted file: {uri}")
+    length = min(length or TRANSFER_CHUNK_BYTES, TRANSFER_CHUNK_BYTES)
+    if offset < 0 or length < 0:
+        raise ValueError("offset and length must not be negative")
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        file.seek(offset)
+        data = file.read(length)
+    # Reading a file keeps it from being swept in the middle of a download
+    os.utime(path)
+    return {"data": data, "offset": offset, "size": size, "eof": offset + len(data) >= size}
+
 # Custom JSON encoder to ensure all responses are valid JSON
 class SafeJSONEncoder(json.JSONEncoder):
     """
@@ -213,11 +1234,33 @@ class SafeJSONEncoder(json.JSONEncoder):
             # For objects that cannot be serialized, convert to string
             return str(obj)
 
+# Response configuration
+# Full JSON round-trip validation of every response. Costly for large payloads, meant for debugging
+DEBUG_JSON = os.environ.get("FILE_CONVERTER_DEBUG_JSON", "0").lower() in ("1", "true", "yes", "on")
+
+_JSON_TYPES = (str, int, float, bool, type(None), list, dict)
+
+def is_well_formed_response(response) -> bool:
+    """
+    Cheap structural check of a tool response: a dict with a boolean "success",
+    an error message on failure, and JSON-native top-level values.
+    """
+    if not isinstance(response, dict) or not isinstance(response.get("success"), bool):
+        return False
+    if not response["success"] and not isinstance(response.get("error"), str):
+        return False
+    return all(isinstance(key, str) and isinstance(value, _JSON_TYPES) for key, value in response.items())
+
 # 修改debug_json_response函数
 def debug_json_response(response):
     """
     Debug JSON response to ensure it's valid.
+    Only a structural check runs by default; the full serialization round trip
+    runs for malformed responses or when FILE_CONVERTER_DEBUG_JSON is set.
     """
+    if not DEBUG_JSON and is_well_formed_response(response):
+        logger.info(f"Valid JSON response: success={response['success']}, keys={list(response)}")
+        return response
     try:
         # 使用自定义编码器确保所有响应都是有效的JSON
         json_str = json.dumps(response, cls=SafeJSONEncoder)
@@ -231,6 +1274,21 @@ def debug_json_response(response):
         # 返回一个安全的错误响应
         return {"success": False, "error": "Internal server error: Invalid JSON response"}
 
+def serialize_response(response) -> str:
+    """
+    Serialize a tool response to the JSON text sent to the client.
+    Tools return this text to FastMCP, so the payload is serialized exactly once;
+    in debug mode the same text is parsed back to validate it.
+    """
+    try:
+        json_str = json.dumps(response, cls=SafeJSONEncoder, separators=(",", ":"))
+        if DEBUG_JSON:
+            json.loads(json_str)
+        return json_str
+    except Exception as e:
+        logger.error(f"Failed to serialize response: {str(e)}")
+        return json.dumps(format_error_response("Internal server error: Invalid JSON response"))
+
 # Enhanced JSON parsing
 original_parse_json = mcp.parse_json if hasattr(mcp, 'parse_json') else None
 
@@ -263,176 +1321,2458 @@ if hasattr(mcp, 'parse_json'):
 else:
     logger.warning("Cannot enhance JSON parsing, mcp object doesn't have parse_json attribute")
 
-# DOCX to PDF conversion tool
-@mcp.tool("docx2pdf")
-def convert_docx_to_pdf(input_file: str = None, file_content_base64: str = None) -> dict:
+# Workspace configuration
+# tmpfs (/dev/shm) holds the workspaces only if it has at least this many bytes free
+WORKSPACE_TMPFS_MIN_FREE = int(os.environ.get("FILE_CONVERTER_WORKSPACE_TMPFS_MIN_FREE", str(1024 * 1024 * 1024)))
+# Disk space all live workspaces may use together, in bytes (0 disables the quota)
+WORKSPACE_QUOTA_BYTES = int(os.environ.get("FILE_CONVERTER_WORKSPACE_QUOTA_BYTES", str(4 * 1024 * 1024 * 1024)))
+# Emptied workspace directories kept for reuse
+WORKSPACE_POOL_SIZE = int(os.environ.get("FILE_CONVERTER_WORKSPACE_POOL_SIZE", "8"))
+# Workspaces untouched for this many seconds are orphans even if their owner cannot be checked
+WORKSPACE_ORPHAN_AGE = int(os.environ.get("FILE_CONVERTER_WORKSPACE_ORPHAN_AGE", "86400"))
+
+def default_workspace_dir() -> str:
+    """Use tmpfs for workspaces when it is writable and has room, else the temp directory."""
+    try:
+        if os.access("/dev/shm", os.W_OK) and shutil.disk_usage("/dev/shm").free >= WORKSPACE_TMPFS_MIN_FREE:
+            return os.path.join("/dev/shm", "file_converter_workspaces")
+    except OSError:
+        pass
+    return os.path.join(tempfile.gettempdir(), "file_converter_workspaces")
+
+# Directory holding the workspaces (FILE_CONVERTER_INTERMEDIATE_DIR is the former name)
+WORKSPACE_DIR = (os.environ.get("FILE_CONVERTER_WORKSPACE_DIR") or os.environ.get("FILE_CONVERTER_INTERMEDIATE_DIR")
+                 or default_workspace_dir())
+file_index.exclude(WORKSPACE_DIR)
+
+class WorkspaceQuotaExceeded(Exception):
+    """Raised when a workspace cannot be created or filled without exceeding WORKSPACE_QUOTA_BYTES."""
+
+def process_alive(pid: int) -> bool:
+    """Return whether a process exists; always True where this cannot be checked."""
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+class WorkspaceManager:
     """
-    Convert a DOCX file to PDF format. Supports both file path and direct file content input.
-    
-    Args:
-        input_file: Path to the DOCX file to convert. Optional if providing file_content_base64.
-        file_content_base64: Base64 encoded content of the DOCX file. Optional if providing input_file.
-        
-    Returns:
-        Dictionary containing success status and either base64 encoded PDF or error message.
+    Per-call working directories under WORKSPACE_DIR. Each workspace is named
+    after the owning process and a random id, so concurrent calls and servers
+    sharing the directory never collide. Released workspaces are emptied and
+    up to WORKSPACE_POOL_SIZE of them are kept for reuse. The space used by
+    live workspaces is limited to WORKSPACE_QUOTA_BYTES, and workspaces left
+    behind by processes that died are removed before the first one is created.
     """
-    try:
-        logger.info(f"Starting DOCX to PDF conversion")
-        logger.info(f"Received parameters: input_file={input_file}, file_content_base64={'[BASE64 content]' if file_content_base64 else 'None'}")
-        
-        # Log more debug information
-        if input_file:
-            logger.info(f"Input file type: {type(input_file)}")
-            logger.info(f"Input file length: {len(input_file) if isinstance(input_file, str) else 'not a string'}")
-            logger.info(f"Input file first 20 chars: {input_file[:20] if isinstance(input_file, str) else 'not a string'}")
-        
-        # Validate that at least one input method is provided
-        if input_file is None and file_content_base64 is None:
-            logger.error("No input provided: both input_file and file_content_base64 are None")
-            return debug_json_response(format_error_response("You must provide either input_file or file_content_base64"))
-        
-        # Create temporary directory for processing files
-        temp_dir = tempfile.mkdtemp()
-        logger.info(f"Created temporary directory: {temp_dir}")
-        
-        # Create a unique filename with timestamp
-        temp_input_file = os.path.join(temp_dir, f"input_{int(time.time())}.docx")
-        temp_output_file = os.path.join(temp_dir, f"output_{int(time.time())}.pdf")
-        
-        # Handle direct content mode
-        if file_content_base64:
-            logger.info("Using direct content mode (base64 input)")
-            try:
-                # Decode base64 content
-                file_content = base64.b64decode(file_content_base64)
-                
-                # Write to temporary file
-                with open(temp_input_file, "wb") as f:
-                    f.write(file_content)
-                logger.info(f"Successfully wrote input file from base64: {temp_input_file}")
-                
-                # Set actual file path to our temporary file
-                actual_file_path = temp_input_file
-            except Exception as e:
-                logger.error(f"Failed to decode or write base64 input: {str(e)}")
-                return debug_json_response(format_error_response(f"Error processing input file content: {str(e)}"))
-                
-        # Handle file path mode
-        else:
-            logger.info(f"Using file path mode with input: {input_file}")
-            
-            # List files in current directory for debugging
-            try:
-                current_files = os.listdir(".")
-                logger.info(f"Files in current directory: {current_files}")
-            except Exception as e:
-                logger.warning(f"Error listing files in current directory: {str(e)}")
-            
-            # Try to locate the file
-            try:
-                actual_file_path = validate_file_exists(input_file, ".docx")
-                logger.info(f"File validated, using path: {actual_file_path}")
-            except Exception as e:
-                logger.error(f"File validation error: {str(e)}")
-                
-                # Clean up temp directory before returning
-                try:
-                    import shutil
-                    shutil.rmtree(temp_dir)
-                except:
-                    pass
-                    
-                return debug_json_response(format_error_response(f"Error finding DOCX file: {str(e)}"))
-        
-        # Import docx2pdf here to avoid dependency if not needed
+    
+    def __init__(self, root: str = WORKSPACE_DIR, quota_bytes: int = WORKSPACE_QUOTA_BYTES,
+                 pool_size: int = WORKSPACE_POOL_SIZE):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._live = set()
+        self._pool = []
+        self._swept = False
+        self._peak_live = 0
+        self._created = 0
+        self._reused = 0
+        self._rejected = 0
+        self._orphans_removed = 0
+    
+    def sweep_orphans(self) -> int:
+        """
+        Remove workspaces whose owning process no longer runs, or that have not
+        been touched for WORKSPACE_ORPHAN_AGE seconds. Returns how many were removed.
+        """
+        removed = 0
+        now = time.time()
         try:
-            from docx2pdf import convert
-            logger.info("Successfully imported docx2pdf")
-        except ImportError as e:
-            logger.error(f"Failed to import docx2pdf: {str(e)}")
-            
-            # Clean up temp directory before returning
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return 0
+        for entry in entries:
+            owner = entry.name.split("_", 1)[0]
+            if not entry.is_dir() or not owner.isdigit() or int(owner) == os.getpid():
+                continue
             try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
+                stale = WORKSPACE_ORPHAN_AGE and now - entry.stat().st_mtime > WORKSPACE_ORPHAN_AGE
+            except OSError:
+                continue
+            if stale or not process_alive(int(owner)):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"Removed {removed} orphaned workspace(s) from {self.root}")
+        return removed
+    
+    def usage(self) -> int:
+        """Return the bytes used by the files in live workspaces."""
+        with self._lock:
+            paths = list(self._live)
+        total = 0
+        for path in paths:
+            for directory, _, files in os.walk(path):
+                for name in files:
+                    try:
+                        total += os.lstat(os.path.join(directory, name)).st_size
+                    except OSError:
+                        pass
+        return total
+    
+    def check_quota(self, extra_bytes: int = 0):
+        """Raise WorkspaceQuotaExceeded if extra_bytes more would exceed the quota."""
+        if not self.quota_bytes:
+            return
+        used = self.usage()
+        if used + extra_bytes > self.quota_bytes:
+            with self._lock:
+                self._rejected += 1
+            raise WorkspaceQuotaExceeded(
+                f"Workspace quota exceeded: {used} bytes in use, {extra_bytes} more requested, "
+                f"limit {self.quota_bytes} bytes")
+    
+    def acquire(self) -> str:
+        """Return an empty workspace directory for the caller's exclusive use."""
+        with self._lock:
+            sweep = not self._swept
+            self._swept = True
+        if sweep:
+            os.makedirs(self.root, exist_ok=True)
+            removed = self.sweep_orphans()
+            with self._lock:
+                self._orphans_removed += removed
+        self.check_quota()
+        with self._lock:
+            path = self._pool.pop() if self._pool else None
+            if path is not None:
+                self._reused += 1
+            else:
+                self._created += 1
+        if path is None:
+            path = os.path.join(self.root, f"{os.getpid()}_{uuid.uuid4().hex}")
+            os.makedirs(path)
+        with self._lock:
+            self._live.add(path)
+            self._peak_live = max(self._peak_live, len(self._live))
+        return path
+    
+    def release(self, path: str):
+        """Empty the workspace at path and return it to the pool; releasing twice is harmless."""
+        with self._lock:
+            if path not in self._live:
+                return
+            self._live.discard(path)
+        try:
+            for entry in os.scandir(path):
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+            with self._lock:
+                if len(self._pool) < self.pool_size:
+                    self._pool.append(path)
+                    return
+        except OSError as e:
+            logger.warning(f"Failed to empty workspace {path}: {str(e)}")
+        shutil.rmtree(path, ignore_errors=True)
+    
+    @contextlib.contextmanager
+    def workspace(self):
+        """Context manager yielding a workspace directory that is released on exit."""
+        path = self.acquire()
+        try:
+            yield path
+        finally:
+            self.release(path)
+    
+    def shutdown(self):
+        with self._lock:
+            paths = list(self._live) + self._pool
+            self._live.clear()
+            self._pool.clear()
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+    
+    def stats(self) -> dict:
+        """Return live and pooled workspace counts and space usage."""
+        usage = self.usage()
+        with self._lock:
+            return {
+                "root": self.root,
+                "live": len(self._live),
+                "pooled": len(self._pool),
+                "peak_live": self._peak_live,
+                "created": self._created,
+                "reused": self._reused,
+                "usage_bytes": usage,
+                "quota_bytes": self.quota_bytes,
+                "quota_rejections": self._rejected,
+                "orphans_removed": self._orphans_removed,
+            }
+
+# Shared workspace manager
+workspaces = WorkspaceManager()
+atexit.register(workspaces.shutdown)
+
+class ConversionCancelled(Exception):
+    """Raised inside a conversion when the client cancelled the request."""
+
+class ProgressChannel:
+    """
+    File-based progress and cancellation channel between a tool thread and a
+    backend running in a worker process. The worker writes "done total" after
+    each step (total 0 if unknown) and stops when the cancel marker appears;
+    the tool thread polls.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.cancel_path = path + ".cancel"
+    
+    # Worker side
+    def update(self, done: int, total: int = None):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            file.write(f"{done} {total or 0}")
+        os.replace(temp_path, self.path)
+    
+    def check_cancelled(self):
+        if os.path.exists(self.cancel_path):
+            raise ConversionCancelled("Conversion cancelled")
+    
+    # Tool thread side
+    def read(self):
+        """Return (done, total), or None if the worker has not reported yet. total is None if unknown."""
+        try:
+            with open(self.path) as file:
+                done, total = file.read().split()
+            return int(done), int(total) or None
+        except (OSError, ValueError):
+            return None
+    
+    def cancel(self):
+        with open(self.cancel_path, "w"):
+            pass
+    
+    def remove(self):
+        for path in (self.path, self.cancel_path):
+            try:
+                os.remove(path)
+            except OSError:
                 pass
-                
-            return debug_json_response(format_error_response("Error importing docx2pdf library. Please ensure it's installed."))
+
+class ConversionJob:
+    """
+    Progress and cancellation state of one tool call, shared between the event
+    loop that serves the request and the worker thread running the tool.
+    """
+    
+    # Minimum seconds between two progress notifications
+    PROGRESS_INTERVAL = 0.25
+    
+    def __init__(self, ctx: Context = None, loop: asyncio.AbstractEventLoop = None):
+        self.ctx = ctx
+        self.loop = loop
+        self.cancelled = threading.Event()
+        self._temp_dirs = []
+        self._last_report = 0.0
+    
+    def report(self, progress: float, total: float = None, message: str = None):
+        """
+        Send a progress notification from any thread. Notifications closer than
+        PROGRESS_INTERVAL are dropped unless they carry a message or finish the job.
+        """
+        if self.ctx is None or self.loop is None or self.loop.is_closed():
+            return
+        now = time.monotonic()
+        if message is None and progress != total and now - self._last_report < self.PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        asyncio.run_coroutine_threadsafe(report_progress(self.ctx, progress, total, message), self.loop)
+    
+    def cancel(self):
+        self.cancelled.set()
+    
+    def check_cancelled(self):
+        if self.cancelled.is_set():
+            raise ConversionCancelled("Conversion cancelled")
+    
+    def track_temp_dir(self, path: str):
+        """Release workspace path once the job ends, whether it finished, failed or was cancelled."""
+        self._temp_dirs.append(path)
+    
+    def cleanup(self):
+        for path in self._temp_dirs:
+            workspaces.release(path)
+        self._temp_dirs.clear()
+
+# Job of the tool call running in the current thread or task
+current_job = contextvars.ContextVar("current_job", default=None)
+
+def check_cancelled():
+    """Raise ConversionCancelled if the current tool call was cancelled."""
+    job = current_job.get()
+    if job is not None:
+        job.check_cancelled()
+
+def report_status(progress: float, total: float = None, message: str = None):
+    """Report progress of the current tool call, if the client asked for it."""
+    job = current_job.get()
+    if job is not None:
+        job.report(progress, total, message)
+
+@contextlib.contextmanager
+def job_scope():
+    """
+    Run the block as a job of its own unless one is already active, so that the
+    workspaces handed out by make_temp_dir inside it are released on exit.
+    """
+    job = current_job.get()
+    if job is not None:
+        yield job
+        return
+    job = ConversionJob()
+    token = current_job.set(job)
+    try:
+        yield job
+    finally:
+        current_job.reset(token)
+        job.cleanup()
+
+def make_temp_dir() -> str:
+    """
+    Acquire a workspace that is released when the current tool call ends. Code
+    running outside a tool call opens a job_scope first; without one the
+    workspace is only removed at exit.
+    """
+    temp_dir = workspaces.acquire()
+    job = current_job.get()
+    if job is not None:
+        job.track_temp_dir(temp_dir)
+    else:
+        logger.warning(f"Workspace {temp_dir} acquired outside a job; it is kept until exit")
+    return temp_dir
+
+async def report_progress(ctx: Context, progress: float, total: float = None, message: str = None):
+    """
+    Send a progress notification (and optionally a log message) to the client.
+    Does nothing without a context; notification failures never fail the tool.
+    """
+    if ctx is None:
+        return
+    try:
+        await ctx.report_progress(progress, total)
+        if message:
+            await ctx.info(message)
+    except Exception as e:
+        logger.debug(f"Failed to report progress: {str(e)}")
+
+# Executor configuration
+# Threads run tool bodies and subprocess-bound backends (docx2pdf/LibreOffice, wkhtmltopdf)
+THREAD_WORKERS = int(os.environ.get("FILE_CONVERTER_THREAD_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+# Processes run CPU-bound backends (pdf2docx, Pillow); 0 runs them in the calling thread
+PROCESS_WORKERS = int(os.environ.get("FILE_CONVERTER_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+# How worker processes are started; forking the threaded server could copy held locks into a worker
+PROCESS_START_METHOD = os.environ.get(
+    "FILE_CONVERTER_PROCESS_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+# Default number of calls of a single tool allowed to run at the same time
+DEFAULT_TOOL_CONCURRENCY = int(os.environ.get("FILE_CONVERTER_TOOL_CONCURRENCY", str(THREAD_WORKERS)))
+# Per-tool overrides, e.g. "docx2pdf=2,pdf2docx=4"
+TOOL_CONCURRENCY_LIMITS = {
+    name.strip(): int(limit)
+    for name, _, limit in (
+        item.partition("=") for item in os.environ.get("FILE_CONVERTER_TOOL_LIMITS", "").split(",") if "=" in item
+    )
+}
+# Number of calls of a single tool allowed to wait for a free slot before new ones are rejected
+MAX_QUEUE_DEPTH = int(os.environ.get("FILE_CONVERTER_MAX_QUEUE_DEPTH", "64"))
+
+class WorkerCrashed(Exception):
+    """Raised when a backend keeps killing its worker process, e.g. by crashing or running out of memory."""
+
+class ConversionExecutor:
+    """
+    Runs conversion work off the MCP event loop.
+    
+    Tool bodies are run in a thread pool so that concurrent clients overlap.
+    CPU-bound backends are sent from there to a process pool with run_in_process.
+    Each tool has a concurrency limit and a bounded queue; calls arriving when
+    the queue is full are rejected instead of piling up.
+    """
+    
+    def __init__(self, thread_workers: int = THREAD_WORKERS, process_workers: int = PROCESS_WORKERS,
+                 default_concurrency: int = DEFAULT_TOOL_CONCURRENCY, concurrency_limits: dict = None,
+                 max_queue_depth: int = MAX_QUEUE_DEPTH):
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.default_concurrency = default_concurrency
+        self.concurrency_limits = dict(concurrency_limits or {})
+        self.max_queue_depth = max_queue_depth
+        self._lock = threading.Lock()
+        self._thread_pool = None
+        self._process_pool = None
+        self._semaphores = {}
+        self._running = {}
+        self._waiting = {}
+        self._rejected = {}
+    
+    @property
+    def thread_pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.thread_workers, thread_name_prefix="converter")
+                logger.info(f"Started thread pool with {self.thread_workers} workers")
+            return self._thread_pool
+    
+    def _get_process_pool(self):
+        with self._lock:
+            if self._process_pool is None and self.process_workers > 0:
+                self._process_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.process_workers, mp_context=multiprocessing.get_context(PROCESS_START_METHOD))
+                logger.info(f"Started process pool with {self.process_workers} workers ({PROCESS_START_METHOD})")
+            return self._process_pool
+    
+    def _discard_process_pool(self, pool):
+        """Drop a broken process pool; the next call starts a fresh one."""
+        with self._lock:
+            if self._process_pool is pool:
+                self._process_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    # Seconds between two polls of a worker process for progress and cancellation
+    POLL_INTERVAL = 0.2
+    
+    @timed_stage("convert")
+    def run_in_process(self, func, *args, progress: bool = False, **kwargs):
+        """
+        Run a CPU-bound function in the process pool and wait for its result.
+        func and its arguments must be picklable (module-level functions, paths).
+        With progress, func also receives a progress_path for a ProgressChannel;
+        its updates are forwarded to the client and a cancelled call is stopped.
+        Runs in the calling thread only if no process pool is configured. If the
+        worker dies, the job is retried once in a new one, then WorkerCrashed is raised.
+        """
+        check_cancelled()
+        channel = None
+        if progress:
+            channel = ProgressChannel(os.path.join(tempfile.gettempdir(), f"progress_{uuid.uuid4().hex}"))
+            kwargs["progress_path"] = channel.path
+        
+        try:
+            # A broken pool is restarted and the job retried once in a fresh worker,
+            # never in this process: whatever killed the worker would take the server down
+            for attempt in range(2):
+                pool = self._get_process_pool()
+                if pool is None:
+                    return func(*args, **kwargs)
+                try:
+                    return self._wait_in_process(pool.submit(func, *args, **kwargs), channel)
+                except concurrent.futures.BrokenExecutor:
+                    self._discard_process_pool(pool)
+                    if attempt:
+                        raise WorkerCrashed(f"{getattr(func, '__name__', func)} crashed its worker process twice")
+                    logger.warning("Process pool is broken, restarting it and retrying the job in a new worker")
+        finally:
+            if channel is not None:
+                channel.remove()
+    
+    def _wait_in_process(self, future, channel: ProgressChannel = None):
+        """Wait for a process pool future, forwarding progress and cancellation through channel."""
+        job = current_job.get()
+        reported = None
+        while True:
+            try:
+                return future.result(timeout=self.POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                pass
+            if job is not None and channel is not None:
+                if job.cancelled.is_set():
+                    channel.cancel()
+                state = channel.read()
+                if state is not None and state != reported:
+                    job.report(*state)
+                    reported = state
+    
+    @timed_stage("convert")
+    def map_in_process(self, func, calls: list, total: int = None) -> list:
+        """
+        Run func once per argument tuple in calls, spread over the process pool,
+        and return the results in order. Each call receives its own progress_path;
+        the sum of their "done" counts is reported against total. If one call
+        fails or the job is cancelled, the remaining calls are stopped.
+        """
+        check_cancelled()
+        channels = [ProgressChannel(os.path.join(tempfile.gettempdir(), f"progress_{uuid.uuid4().hex}"))
+                    for _ in calls]
+        try:
+            # Retried once in a fresh pool like run_in_process, never in this process
+            for attempt in range(2):
+                pool = self._get_process_pool()
+                if pool is None:
+                    return [func(*args, progress_path=channel.path) for args, channel in zip(calls, channels)]
+                try:
+                    return self._map_in_pool(pool, func, calls, channels, total)
+                except concurrent.futures.BrokenExecutor:
+                    self._discard_process_pool(pool)
+                    if attempt:
+                        raise WorkerCrashed(f"{getattr(func, '__name__', func)} crashed its worker process twice")
+                    logger.warning("Process pool is broken, restarting it and retrying the jobs in new workers")
+                    for channel in channels:
+                        channel.remove()
+        finally:
+            for channel in channels:
+                channel.remove()
+    
+    def _map_in_pool(self, pool, func, calls: list, channels: list, total: int = None) -> list:
+        futures = [pool.submit(func, *args, progress_path=channel.path) for args, channel in zip(calls, channels)]
+        job = current_job.get()
+        reported = None
+        try:
+            while True:
+                finished, pending = concurrent.futures.wait(
+                    futures, timeout=self.POLL_INTERVAL, return_when=concurrent.futures.FIRST_EXCEPTION)
+                failed = [future for future in finished if future.exception() is not None]
+                if failed:
+                    failed[0].result()
+                if not pending:
+                    return [future.result() for future in futures]
+                if job is not None:
+                    job.check_cancelled()
+                    done = sum(state[0] for state in map(ProgressChannel.read, channels) if state)
+                    if done != reported:
+                        job.report(done, total)
+                        reported = done
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            for channel in channels:
+                channel.cancel()
+            concurrent.futures.wait(futures)
+            raise
+    
+    def limit_for(self, tool_name: str) -> int:
+        return self.concurrency_limits.get(tool_name, self.default_concurrency)
+    
+    async def run_tool(self, tool_name: str, func, *args, **kwargs):
+        """
+        Run a synchronous tool function in the thread pool, honoring the tool's
+        concurrency limit and queue depth.
+        """
+        with self._lock:
+            waiting = self._waiting.get(tool_name, 0)
+            running = self._running.get(tool_name, 0)
+            if running >= self.limit_for(tool_name) and waiting >= self.max_queue_depth:
+                self._rejected[tool_name] = self._rejected.get(tool_name, 0) + 1
+                logger.warning(f"Rejecting {tool_name} call: {running} running, {waiting} queued")
+                return format_error_response(
+                    f"Server busy: too many pending {tool_name} requests, please retry later")
+            if tool_name not in self._semaphores:
+                self._semaphores[tool_name] = asyncio.Semaphore(self.limit_for(tool_name))
+            semaphore = self._semaphores[tool_name]
+            self._waiting[tool_name] = waiting + 1
+        
+        try:
+            await semaphore.acquire()
+        finally:
+            with self._lock:
+                self._waiting[tool_name] -= 1
+        
+        with self._lock:
+            self._running[tool_name] = self._running.get(tool_name, 0) + 1
+        
+        def release():
+            with self._lock:
+                self._running[tool_name] -= 1
+            semaphore.release()
+        
+        # The slot is held until the thread finishes, even if the call is cancelled before
+        return await self.run_in_thread(func, *args, on_done=release, **kwargs)
+    
+    async def run_in_thread(self, func, *args, ctx: Context = None, on_done=None, **kwargs):
+        """
+        Run func in the thread pool as a ConversionJob reporting to ctx. If the
+        awaiting task is cancelled (e.g. the client cancelled the request), the
+        job is flagged so that func stops at its next check. Its temporary
+        directories are removed, and on_done is called on the event loop, once
+        func has stopped running, not when the task is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        job = current_job.get()
+        if job is None:
+            job = ConversionJob(ctx, loop)
+        context = contextvars.copy_context()
+        context.run(current_job.set, job)
+        
+        def finished(_):
+            job.cleanup()
+            if on_done is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(on_done)
+        
+        try:
+            future = self.thread_pool.submit(context.run, func, *args, **kwargs)
+        except BaseException:
+            if on_done is not None:
+                on_done()
+            raise
+        # The thread pool future finishes only when the thread does; the asyncio one on cancel
+        future.add_done_callback(finished)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            logger.info(f"Cancelling {getattr(func, '__name__', func)}")
+            job.cancel()
+            raise
+    
+    def stats(self) -> dict:
+        """Return running, queued and rejected call counts per tool."""
+        with self._lock:
+            return {
+                "thread_workers": self.thread_workers,
+                "process_workers": self.process_workers,
+                "running": dict(self._running),
+                "queued": dict(self._waiting),
+                "rejected": dict(self._rejected),
+            }
+    
+    def shutdown(self):
+        with self._lock:
+            pools = [self._thread_pool, self._process_pool]
+            self._thread_pool = self._process_pool = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+# Shared executor for all tools
+conversion_executor = ConversionExecutor(concurrency_limits=TOOL_CONCURRENCY_LIMITS)
+atexit.register(conversion_executor.shutdown)
+
+def async_tool(name: str):
+    """
+    Register a synchronous conversion function as an async MCP tool that runs in
+    the shared executor and returns its response already serialized to JSON.
+    The tool receives the request Context for progress reporting and cancellation.
+    The function is returned for other tools and scripts to keep calling directly
+    and get a dictionary; a direct call outside a job runs in a job_scope, so its
+    workspaces are released when it returns.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def tool_wrapper(*args, ctx: Context = None, **kwargs):
+            with metrics.tool_call(name) as call:
+                response = await conversion_executor.run_tool(name, func, *args, ctx=ctx, **kwargs)
+                if isinstance(response, dict) and not response.get("success", True):
+                    call.status = "error"
+                with metrics.stage("serialize"):
+                    return serialize_response(response)
+        
+        # Expose the function's parameters plus the Context that FastMCP injects
+        signature = inspect.signature(func)
+        tool_wrapper.__signature__ = signature.replace(parameters=list(signature.parameters.values()) + [
+            inspect.Parameter("ctx", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=Context)])
+        tool_wrapper.__annotations__ = dict(func.__annotations__, ctx=Context)
+        mcp.tool(name)(tool_wrapper)
+        
+        @functools.wraps(func)
+        def direct_call(*args, **kwargs):
+            with job_scope():
+                return func(*args, **kwargs)
+        return direct_call
+    return decorator
+
+# Backend registry configuration
+# Backends imported in the background at startup: "all", or a comma-separated list of names
+PREWARM_BACKENDS = os.environ.get("FILE_CONVERTER_PREWARM", "")
+# Also import the prewarmed backends in the process pool workers
+PREWARM_WORKERS = os.environ.get("FILE_CONVERTER_PREWARM_WORKERS", "1").lower() not in ("0", "false", "no", "off")
+
+def import_backend_modules(modules: list) -> dict:
+    """
+    Import modules and return the seconds each import took. Runs in process pool
+    workers to prewarm them; missing modules are skipped.
+    """
+    timings = {}
+    for module in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(module)
+        except (ImportError, OSError):
+            continue
+        timings[module] = time.perf_counter() - started
+    return timings
+
+class BackendRegistry:
+    """
+    Optional conversion libraries. Availability is probed with find_spec, which
+    does not import anything; a library is imported on first use (or by prewarm)
+    and the time its import took is recorded.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backends = {}
+        self._available = {}
+        self._import_seconds = {}
+        self._prewarm_thread = None
+    
+    def register(self, name: str, module: str, package: str = None, purpose: str = None):
+        """Register a backend by name; package is the pip package to suggest when it is missing."""
+        self._backends[name] = {"module": module, "package": package or module, "purpose": purpose}
+    
+    def names(self) -> list:
+        return list(self._backends)
+    
+    def available(self, name: str) -> bool:
+        """Whether the backend can be imported, without importing it."""
+        with self._lock:
+            if name not in self._available:
+                module = self._backends[name]["module"]
+                try:
+                    self._available[name] = module in sys.modules or importlib.util.find_spec(module) is not None
+                except (ImportError, ValueError):
+                    self._available[name] = False
+            return self._available[name]
+    
+    def require(self, name: str):
+        """Raise ValueError with an install hint if the backend is not installed."""
+        if not self.available(name):
+            backend = self._backends[name]
+            raise ValueError(f"{backend['purpose'] or name} requires the '{backend['package']}' package. "
+                             f"Please install it with 'pip install {backend['package']}'")
+    
+    def load(self, name: str):
+        """Import the backend's module (once) and return it."""
+        self.require(name)
+        module = self._backends[name]["module"]
+        if module in sys.modules:
+            return sys.modules[module]
+        started = time.perf_counter()
+        imported = importlib.import_module(module)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._import_seconds.setdefault(name, elapsed)
+        logger.info(f"Imported backend {name} in {elapsed:.3f}s")
+        return imported
+    
+    def prewarm(self, names: list = None, workers: bool = PREWARM_WORKERS):
+        """
+        Import backends in a background thread so that the first conversion does
+        not pay for the import. With workers, the process pool is started and its
+        workers import them too.
+        """
+        names = [name for name in (names or self.names()) if name in self._backends and self.available(name)]
+        if not names or self._prewarm_thread is not None:
+            return
+        
+        def run():
+            for name in names:
+                try:
+                    self.load(name)
+                except Exception as e:
+                    logger.warning(f"Failed to prewarm backend {name}: {str(e)}")
+            if workers and conversion_executor.process_workers > 0:
+                modules = [self._backends[name]["module"] for name in names]
+                pool = conversion_executor._get_process_pool()
+                try:
+                    for future in [pool.submit(import_backend_modules, modules) for _ in range(conversion_executor.process_workers)]:
+                        future.result()
+                    logger.info(f"Prewarmed {len(names)} backend(s) in {conversion_executor.process_workers} worker process(es)")
+                except Exception as e:
+                    logger.warning(f"Failed to prewarm worker processes: {str(e)}")
+        
+        self._prewarm_thread = threading.Thread(target=run, name="backend-prewarm", daemon=True)
+        self._prewarm_thread.start()
+    
+    def warming(self) -> bool:
+        """Whether a background prewarm is still importing backends."""
+        return self._prewarm_thread is not None and self._prewarm_thread.is_alive()
+    
+    def stats(self) -> dict:
+        """
+        Return availability, load state and import time of every backend.
+        """
+        return {
+            name: {
+                "module": backend["module"],
+                "available": self.available(name),
+                "loaded": backend["module"] in sys.modules,
+                "import_seconds": self._import_seconds.get(name),
+            }
+            for name, backend in self._backends.items()
+        }
+
+# Shared registry of optional conversion libraries
+backends = BackendRegistry()
+backends.register("docx2pdf", "docx2pdf", purpose="DOCX to PDF conversion with Microsoft Word")
+backends.register("pdf2docx", "pdf2docx", purpose="PDF to DOCX conversion")
+backends.register("PIL", "PIL", package="pillow", purpose="Image conversion")
+backends.register("openpyxl", "openpyxl", purpose="XLSX reading")
+backends.register("xlrd", "xlrd", purpose="XLS reading")
+backends.register("pyarrow", "pyarrow", purpose="Parquet and Feather output")
+backends.register("markdown", "markdown", purpose="Markdown conversion")
+backends.register("pdfkit", "pdfkit", purpose="HTML to PDF conversion with wkhtmltopdf")
+backends.register("weasyprint", "weasyprint", purpose="HTML to PDF conversion with WeasyPrint")
+backends.register("xhtml2pdf", "xhtml2pdf", purpose="HTML to PDF conversion with xhtml2pdf")
+backends.register("pymupdf", "pymupdf", purpose="Composing PDFs from cached Markdown sections")
+
+def prewarm_backends():
+    """Start the background prewarm configured by FILE_CONVERTER_PREWARM."""
+    if PREWARM_BACKENDS.strip().lower() == "all":
+        backends.prewarm()
+    elif PREWARM_BACKENDS.strip():
+        backends.prewarm([name.strip() for name in PREWARM_BACKENDS.split(",") if name.strip()])
+
+# Cache configuration
+CACHE_ENABLED = os.environ.get("FILE_CONVERTER_CACHE", "1").lower() not in ("0", "false", "no", "off")
+# Byte-size limits of the in-memory and on-disk tiers
+CACHE_MEMORY_BYTES = int(os.environ.get("FILE_CONVERTER_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+CACHE_DISK_BYTES = int(os.environ.get("FILE_CONVERTER_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+# Seconds a cached result stays valid
+CACHE_TTL = float(os.environ.get("FILE_CONVERTER_CACHE_TTL", "3600"))
+CACHE_DIR = os.environ.get("FILE_CONVERTER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "file_converter_cache"))
+file_index.exclude(CACHE_DIR)
+
+class ConversionCache:
+    """
+    Content-addressed cache of conversion results.
+    
+    Keys are a SHA-256 of the input bytes plus the input format, output format and
+    options, so the same document converts once no matter how it was sent. Results
+    live in an in-memory LRU tier backed by an on-disk tier; both are bounded in
+    bytes, entries expire after the TTL, and least recently used entries are
+    evicted first.
+    """
+    
+    HASH_CHUNK_SIZE = 1024 * 1024
+    
+    def __init__(self, directory: str = CACHE_DIR, memory_bytes: int = CACHE_MEMORY_BYTES,
+                 disk_bytes: int = CACHE_DISK_BYTES, ttl: float = CACHE_TTL, enabled: bool = CACHE_ENABLED):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # key -> (data, created)
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        # key -> (size, created), loaded from the cache directory on first use
+        self._disk = None
+        self._disk_size = 0
+        self._stats = collections.Counter()
+    
+    def make_key(self, input_path: str, input_format: str, output_format: str, options: dict = None) -> str:
+        """
+        Build the cache key for converting the file at input_path.
+        """
+        digest = hashlib.sha256()
+        with open(input_path, "rb") as file:
+            for chunk in iter(lambda: file.read(self.HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return self._finish_key(digest, input_format, output_format, options)
+    
+    def make_bytes_key(self, data: bytes, input_format: str, output_format: str, options: dict = None) -> str:
+        """
+        Build the cache key for converting data held in memory; equal to the key
+        of a file with the same content.
+        """
+        return self._finish_key(hashlib.sha256(data), input_format, output_format, options)
+    
+    @staticmethod
+    def _finish_key(digest, input_format: str, output_format: str, options: dict = None) -> str:
+        descriptor = json.dumps([input_format.lower(), output_format.lower(), options or {}], sort_keys=True, default=str)
+        digest.update(descriptor.encode("utf-8"))
+        return digest.hexdigest()
+    
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+    
+    def _load_disk_index(self):
+        """Index the files left in the cache directory by a previous run."""
+        if self._disk is not None:
+            return
+        self._disk = collections.OrderedDict()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.is_file() and not entry.name.endswith(".tmp"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name, stat.st_size))
+            for mtime, key, size in sorted(entries):
+                self._disk[key] = (size, mtime)
+                self._disk_size += size
+        except OSError as e:
+            logger.warning(f"Cannot use cache directory {self.directory}: {str(e)}")
+        self._evict_disk()
+    
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+    
+    def _remember(self, key: str, data: bytes, created: float):
+        """Put data in the memory tier, evicting the least recently used entries."""
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old[0])
+        self._memory[key] = (data, created)
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self._stats["memory_evictions"] += 1
+    
+    def _drop_disk_entry(self, key: str):
+        size, _ = self._disk.pop(key)
+        self._disk_size -= size
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+    
+    def _evict_disk(self):
+        now = time.time()
+        for key in [k for k, (_, created) in self._disk.items() if self.ttl > 0 and now - created > self.ttl]:
+            self._drop_disk_entry(key)
+            self._stats["expired"] += 1
+        while self._disk_size > self.disk_bytes and self._disk:
+            self._drop_disk_entry(next(iter(self._disk)))
+            self._stats["disk_evictions"] += 1
+    
+    def _lookup(self, key: str):
+        """
+        Find key under the lock. Returns (data, None) for a memory hit, (None, entry)
+        for a disk hit that the caller reads outside the lock, or (None, None).
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._expired(entry[1]):
+                    self._memory_size -= len(self._memory.pop(key)[0])
+                    self._stats["expired"] += 1
+                else:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0], None
+            
+            self._load_disk_index()
+            entry = self._disk.get(key)
+            if entry is not None:
+                if self._expired(entry[1]):
+                    self._drop_disk_entry(key)
+                    self._stats["expired"] += 1
+                else:
+                    self._disk.move_to_end(key)
+                    self._stats["disk_hits"] += 1
+                    return None, entry
+            
+            self._stats["misses"] += 1
+            return None, None
+    
+    def _disk_read_failed(self, key: str, entry: tuple, error: Exception):
+        """Count a disk hit whose file could not be read as a miss and forget the entry."""
+        logger.warning(f"Cannot read cache entry {key}: {str(error)}")
+        with self._lock:
+            self._stats["disk_hits"] -= 1
+            self._stats["misses"] += 1
+            if self._disk.get(key) == entry:
+                self._drop_disk_entry(key)
+    
+    def fetch(self, key: str, output_path: str) -> bool:
+        """
+        Write the cached result for key to output_path. Disk entries are copied
+        file to file outside the lock, and only entries that fit the memory tier
+        are loaded into it.
+        Returns True on a hit, False if the result has to be computed.
+        """
+        if not self.enabled:
+            return False
+        data, entry = self._lookup(key)
+        if data is not None:
+            with open(output_path, "wb") as file:
+                file.write(data)
+            return True
+        if entry is None:
+            return False
+        try:
+            shutil.copyfile(self._disk_path(key), output_path)
+        except OSError as e:
+            self._disk_read_failed(key, entry, e)
+            return False
+        if entry[0] <= self.memory_bytes:
+            with open(output_path, "rb") as file:
+                data = file.read()
+            with self._lock:
+                self._remember(key, data, entry[1])
+        return True
+    
+    def get(self, key: str) -> bytes:
+        """
+        Return the cached result for key, or None if it has to be computed.
+        Meant for small results; a disk entry is read outside the lock.
+        """
+        if not self.enabled:
+            return None
+        data, entry = self._lookup(key)
+        if data is not None or entry is None:
+            return data
+        try:
+            with open(self._disk_path(key), "rb") as file:
+                data = file.read()
+        except OSError as e:
+            self._disk_read_failed(key, entry, e)
+            return None
+        with self._lock:
+            self._remember(key, data, entry[1])
+        return data
+    
+    def store(self, key: str, output_path: str):
+        """
+        Cache the conversion result at output_path under key. The file is copied
+        into the cache directory outside the lock and read into memory only if it
+        fits the memory tier. Failures are logged and otherwise ignored.
+        """
+        if not self.enabled or not os.path.isfile(output_path):
+            return
+        try:
+            size = os.path.getsize(output_path)
+            data = None
+            if size <= self.memory_bytes:
+                with open(output_path, "rb") as file:
+                    data = file.read()
+            self._add(key, size, data, lambda temp_path: shutil.copyfile(output_path, temp_path))
+        except Exception as e:
+            logger.warning(f"Failed to cache conversion result: {str(e)}")
+    
+    def put(self, key: str, data: bytes):
+        """
+        Cache a conversion result held in memory under key.
+        Failures are logged and otherwise ignored.
+        """
+        if not self.enabled:
+            return
+        
+        def write(temp_path):
+            with open(temp_path, "wb") as file:
+                file.write(data)
+        
+        try:
+            self._add(key, len(data), data, write)
+        except Exception as e:
+            logger.warning(f"Failed to cache conversion result: {str(e)}")
+    
+    def _add(self, key: str, size: int, data: bytes, write):
+        """
+        Add an entry of size bytes: write(temp_path) fills a temporary file that
+        replaces the disk entry, and data (or None) goes to the memory tier. Only
+        the index updates run under the lock.
+        """
+        created = time.time()
+        with self._lock:
+            self._load_disk_index()
+            if data is not None:
+                self._remember(key, data, created)
+        if size <= self.disk_bytes:
+            temp_path = self._disk_path(key) + f".{uuid.uuid4().hex}.tmp"
+            try:
+                write(temp_path)
+                os.replace(temp_path, self._disk_path(key))
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.remove(temp_path)
+                raise
+            with self._lock:
+                if key in self._disk:
+                    self._disk_size -= self._disk.pop(key)[0]
+                self._disk[key] = (size, created)
+                self._disk_size += size
+                self._evict_disk()
+        with self._lock:
+            self._stats["stores"] += 1
+    
+    def clear(self):
+        """Remove all cached results from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self._load_disk_index()
+            for key in list(self._disk):
+                self._drop_disk_entry(key)
+    
+    def stats(self) -> dict:
+        """Return hit, miss and eviction counters and the size of both tiers."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "enabled": self.enabled,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": len(self._disk) if self._disk is not None else 0,
+                "disk_bytes": self._disk_size,
+            })
+            return stats
+
+# Shared cache for all tools
+conversion_cache = ConversionCache()
+
+def collect_runtime_metrics():
+    """Gauges and counters read from the executor, cache and workspace stats."""
+    executor = conversion_executor.stats()
+    for state in ("running", "queued", "rejected"):
+        metric_type = "counter" if state == "rejected" else "gauge"
+        name = f"file_converter_executor_{state}" + ("_total" if state == "rejected" else "")
+        for tool, count in executor[state].items():
+            yield name, metric_type, f"Tool calls {state} by the executor.", {"tool": tool}, count
+    cache = conversion_cache.stats()
+    for tier in ("memory", "disk"):
+        yield "file_converter_cache_entries", "gauge", "Cached results per tier.", {"tier": tier}, cache[f"{tier}_entries"]
+        yield "file_converter_cache_bytes", "gauge", "Size of cached results per tier.", {"tier": tier}, cache[f"{tier}_bytes"]
+        for event in ("hits", "evictions"):
+            yield f"file_converter_cache_{event}_total", "counter", f"Result cache {event} per tier.", {"tier": tier}, cache.get(f"{tier}_{event}", 0)
+    yield "file_converter_cache_misses_total", "counter", "Result cache misses.", {}, cache.get("misses", 0)
+    workspace = workspaces.stats()
+    for state in ("live", "pooled"):
+        yield "file_converter_workspaces", "gauge", "Workspaces in use or pooled.", {"state": state}, workspace[state]
+    yield "file_converter_workspace_usage_bytes", "gauge", "Space used below the workspace root.", {}, workspace["usage_bytes"]
+    fragments = markdown_fragments.stats()
+    yield "file_converter_markdown_fragment_hits_total", "counter", "Markdown sections reused from the fragment cache.", {}, fragments["hits"]
+    yield "file_converter_markdown_fragment_misses_total", "counter", "Markdown sections rendered.", {}, fragments["misses"]
+    upload = uploads.stats()
+    for state in ("open", "finished"):
+        yield "file_converter_uploads", "gauge", "Chunked uploads in progress or finished.", {"state": state}, upload[state]
+    yield "file_converter_upload_bytes", "gauge", "Space used by chunked uploads.", {}, upload["bytes"]
+    yield "file_converter_upload_chunks_total", "counter", "Chunks appended to uploads.", {}, upload.get("chunks", 0)
+    for event in ("checksum_failures", "offset_mismatches"):
+        yield f"file_converter_upload_{event}_total", "counter", f"Rejected upload chunks ({event.replace('_', ' ')}).", {}, upload.get(event, 0)
+    codec = base64_codec.stats()
+    for operation in ("encode", "decode"):
+        yield "file_converter_base64_calls_total", "counter", "Base64 codec calls.", {"operation": operation}, codec.get(f"{operation}_calls", 0)
+        yield "file_converter_base64_bytes_total", "counter", "Raw bytes processed by the base64 codec.", {"operation": operation}, codec.get(f"{operation}_bytes", 0)
+    yield "file_converter_base64_peak_buffer_bytes", "gauge", "Largest working buffer of the base64 codec.", {}, codec.get("peak_buffer_bytes", 0)
+    if "peak_rss_bytes" in codec:
+        yield "file_converter_peak_rss_bytes", "gauge", "Peak resident set size of the server process.", {}, codec["peak_rss_bytes"]
+    for name, backend in backends.stats().items():
+        if backend["import_seconds"] is not None:
+            yield "file_converter_backend_import_seconds", "gauge", "Seconds the first import of a backend took.", {"backend": name}, backend["import_seconds"]
+    index = file_index.stats()
+    yield "file_converter_file_index_directories", "gauge", "Directories in the file index.", {}, index["directories"]
+    yield "file_converter_file_index_files", "gauge", "Files in the file index.", {}, index["files"]
+    pool = libreoffice_pool.stats()
+    yield "file_converter_libreoffice_uno", "gauge", "1 if LibreOffice jobs run on warm UNO instances, 0 if each starts soffice.", {}, int(pool["mode"] == "uno")
+    yield "file_converter_libreoffice_workers", "gauge", "LibreOffice instances started.", {}, pool["workers"]
+    yield "file_converter_libreoffice_idle_workers", "gauge", "LibreOffice instances waiting for a job.", {}, pool["idle"]
+    yield "file_converter_libreoffice_restarts_total", "counter", "LibreOffice instances restarted.", {}, pool["restarts"]
+    for worker, jobs in pool["jobs"].items():
+        yield "file_converter_libreoffice_jobs", "gauge", "Jobs run by a LibreOffice instance since it started.", {"worker": str(worker)}, jobs
+
+metrics.add_collector(collect_runtime_metrics)
+
+# Metrics in the Prometheus text format
+@mcp.resource("metrics://prometheus", name="metrics", mime_type="text/plain")
+def read_metrics() -> str:
+    """
+    Tool call counts, stage durations, input and output sizes, errors and
+    in-flight calls in the Prometheus text exposition format.
+    """
+    return metrics.render()
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serve GET /metrics for Prometheus scrapes."""
+    
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        logger.debug(f"Metrics request: {format % args}")
+
+@functools.lru_cache(maxsize=None)
+def start_metrics_server(port: int = None, host: str = None):
+    """
+    Serve /metrics over HTTP on a daemon thread if METRICS_PORT (or port) is set.
+    Returns the server (the same one on repeated calls), or None when the endpoint is disabled.
+    """
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    server = http.server.ThreadingHTTPServer((host or METRICS_HOST, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    return server
+
+# Page-parallel PDF to DOCX configuration
+# PDFs with at least this many pages are parsed in parallel page ranges (0 disables)
+PDF2DOCX_PARALLEL_MIN_PAGES = int(os.environ.get("FILE_CONVERTER_PDF2DOCX_PARALLEL_MIN_PAGES", "50"))
+# Maximum number of pages parsed by one worker process at a time
+PDF2DOCX_CHUNK_PAGES = int(os.environ.get("FILE_CONVERTER_PDF2DOCX_CHUNK_PAGES", "25"))
+
+# Excel to CSV configuration
+# Rows written between two cancellation checks and progress updates
+EXCEL_ROWS_PER_CHECK = int(os.environ.get("FILE_CONVERTER_EXCEL_ROWS_PER_CHECK", "10000"))
+
+# Tabular conversion configuration
+# Rows buffered per record batch when writing Parquet and Feather
+TABLE_BATCH_ROWS = int(os.environ.get("FILE_CONVERTER_TABLE_BATCH_ROWS", "65536"))
+TABLE_INPUT_FORMATS = ("xlsx", "xls", "csv")
+TABLE_OUTPUT_FORMATS = ("parquet", "feather", "arrow", "jsonl", "csv")
+
+# Image processing configuration
+# Draft decoding stops at this multiple of the target size before resampling (0 disables it)
+IMAGE_REDUCING_GAP = float(os.environ.get("FILE_CONVERTER_IMAGE_REDUCING_GAP", "2.0"))
+# Metadata removed with strip_metadata
+IMAGE_METADATA_KEYS = ("exif", "icc_profile", "xmp", "XML:com.adobe.xmp", "photoshop", "comment")
+# Largest accepted frame in pixels (0 disables the limit); replaces Pillow's decompression bomb check
+IMAGE_MAX_PIXELS = int(os.environ.get("FILE_CONVERTER_IMAGE_MAX_PIXELS", "250000000"))
+# Largest accepted number of frames or pages (0 disables the limit)
+IMAGE_MAX_FRAMES = int(os.environ.get("FILE_CONVERTER_IMAGE_MAX_FRAMES", "1000"))
+# Images with more pixels than this are decoded in strips when the file layout allows it (0 disables it)
+IMAGE_STRIP_THRESHOLD = int(os.environ.get("FILE_CONVERTER_IMAGE_STRIP_THRESHOLD", "64000000"))
+# Rows decoded at a time in strip mode
+IMAGE_STRIP_ROWS = int(os.environ.get("FILE_CONVERTER_IMAGE_STRIP_ROWS", "512"))
+# Output formats that can hold several frames (animations or pages)
+IMAGE_MULTIFRAME_FORMATS = ("gif", "webp", "png", "tiff", "tif", "pdf")
+# PNG color types of the modes written directly in strip mode
+PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "LA": 4, "RGBA": 6}
+
+# Conversion backends run in the process pool. They take and produce file
+# paths only, so that nothing large has to be pickled between processes.
+def parse_pdf_pages(cv, settings: dict, channel: ProgressChannel = None):
+    """
+    Parse the pages of a loaded pdf2docx Converter that are not skipped,
+    reporting through channel after each page and stopping once it is cancelled.
+    """
+    cv.parse_document(**settings)
+    pages = [page for page in cv.pages if not page.skip_parsing]
+    for done, page in enumerate(pages, 1):
+        if channel is not None:
+            channel.check_cancelled()
+        try:
+            page.parse(**settings)
+        except Exception as e:
+            if settings["raw_exceptions"] or settings["debug"] or not settings["ignore_page_error"]:
+                raise
+            logger.warning(f"Ignoring page {page.id + 1} that failed to parse: {str(e)}")
+        if channel is not None:
+            channel.update(done, len(pages))
+
+def pdf_to_docx_backend(input_path: str, output_path: str, progress_path: str = None):
+    """
+    Convert a PDF file to DOCX with pdf2docx, page by page. With progress_path,
+    the number of parsed pages is reported through a ProgressChannel and the
+    conversion stops between pages once it is cancelled.
+    """
+    from pdf2docx import Converter
+    channel = ProgressChannel(progress_path) if progress_path else None
+    cv = Converter(input_path)
+    try:
+        settings = cv.default_settings
+        cv.load_pages()
+        parse_pdf_pages(cv, settings, channel)
+        cv.make_docx(output_path, **settings)
+    finally:
+        cv.close()
+
+def pdf_to_docx_parse_range(input_path: str, start: int, end: int, layout_path: str, progress_path: str = None):
+    """
+    Parse pages [start, end) of a PDF with pdf2docx and store their layout as
+    JSON in layout_path, to be assembled by pdf_to_docx_assemble.
+    """
+    from pdf2docx import Converter
+    channel = ProgressChannel(progress_path) if progress_path else None
+    cv = Converter(input_path)
+    try:
+        settings = cv.default_settings
+        # Load every page so that page ids match the whole document
+        cv.load_pages()
+        for page in cv.pages:
+            page.skip_parsing = not start <= page.id < end
+        parse_pdf_pages(cv, settings, channel)
+        cv.serialize(layout_path)
+    finally:
+        cv.close()
+
+def pdf_to_docx_assemble(input_path: str, layout_paths: list, output_path: str):
+    """
+    Build a single DOCX from the page layouts stored by pdf_to_docx_parse_range.
+    """
+    from pdf2docx import Converter
+    cv = Converter(input_path)
+    try:
+        for layout_path in layout_paths:
+            cv.deserialize(layout_path)
+        cv.make_docx(output_path, **cv.default_settings)
+    finally:
+        cv.close()
+
+def sheet_file_name(stem: str, sheet_name: str) -> str:
+    """File name for the CSV export of one sheet."""
+    safe_name = re.sub(r"[^\w.-]+", "_", sheet_name).strip("_") or "sheet"
+    return f"{stem}_{safe_name}.csv"
+
+def select_sheets(sheet_names: list, sheets: list = None, all_sheets: bool = False) -> list:
+    """
+    Resolve requested sheets (names, or 0-based indexes as strings) against the
+    workbook's sheet names. Defaults to the first sheet.
+    """
+    if all_sheets:
+        return list(sheet_names)
+    if not sheets:
+        return list(sheet_names[:1])
+    selected = []
+    for sheet in sheets:
+        sheet = str(sheet)
+        if sheet in sheet_names:
+            selected.append(sheet)
+        elif sheet.isdigit() and int(sheet) < len(sheet_names):
+            selected.append(sheet_names[int(sheet)])
+        else:
+            raise ValueError(f"Sheet not found: {sheet} (available: {', '.join(sheet_names)})")
+    return list(dict.fromkeys(selected))
+
+def iter_excel_rows(input_path: str, sheets: list = None, all_sheets: bool = False):
+    """
+    Yield (sheet_name, rows) for the selected sheets, where rows lazily yields
+    tuples of cell values. XLSX files are streamed with openpyxl in read-only
+    mode. XLS files are read with xlrd, which has no streaming mode: each sheet
+    is parsed whole when it is selected and unloaded before the next one, so
+    peak memory grows with the largest sheet rather than a single row.
+    """
+    if input_path.lower().endswith(".xls"):
+        xlrd = backends.load("xlrd")
+        book = xlrd.open_workbook(input_path, on_demand=True)
+        try:
+            for sheet_name in select_sheets(book.sheet_names(), sheets, all_sheets):
+                sheet = book.sheet_by_name(sheet_name)
+                yield sheet_name, (sheet.row_values(index) for index in range(sheet.nrows))
+                book.unload_sheet(sheet_name)
+        finally:
+            book.release_resources()
+        return
+    
+    workbook = backends.load("openpyxl").load_workbook(input_path, read_only=True, data_only=True)
+    try:
+        for sheet_name in select_sheets(workbook.sheetnames, sheets, all_sheets):
+            yield sheet_name, workbook[sheet_name].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def excel_to_csv_backend(input_path: str, output_dir: str, stem: str, sheets: list = None,
+                         all_sheets: bool = False, archive: bool = False, progress_path: str = None) -> dict:
+    """
+    Stream the selected sheets of an Excel workbook into one CSV file per sheet
+    in output_dir, holding a single row in memory at a time. With archive, the
+    CSV files are packed into a zip archive and removed.
+    
+    Returns a dict with "sheets" (sheet name, file and row count of each export)
+    and "archive" (the archive path, or None).
+    """
+    channel = ProgressChannel(progress_path) if progress_path else None
+    # A single sheet keeps the plain "<stem>.csv" name
+    name_by_sheet = archive or all_sheets or (sheets is not None and len(sheets) > 1)
+    exports = []
+    total_rows = 0
+    for sheet_name, rows in iter_excel_rows(input_path, sheets, all_sheets):
+        file_name = sheet_file_name(stem, sheet_name) if name_by_sheet else f"{stem}.csv"
+        csv_path = os.path.join(output_dir, file_name)
+        # Sheet names that differ only in replaced characters map to the same file name
+        if os.path.exists(csv_path):
+            csv_path = f"{os.path.splitext(csv_path)[0]}_{len(exports)}.csv"
+        count = 0
+        with open(csv_path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            for row in rows:
+                writer.writerow(["" if value is None else value for value in row])
+                count += 1
+                if channel is not None and count % EXCEL_ROWS_PER_CHECK == 0:
+                    channel.check_cancelled()
+                    channel.update(total_rows + count)
+        total_rows += count
+        exports.append({"sheet": sheet_name, "file": csv_path, "rows": count})
+    
+    archive_path = None
+    if archive:
+        archive_path = os.path.join(output_dir, f"{stem}.zip")
+        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            for export in exports:
+                zip_file.write(export["file"], os.path.basename(export["file"]))
+                os.remove(export["file"])
+                export["file"] = os.path.basename(export["file"])
+    return {"sheets": exports, "archive": archive_path}
+
+# Operators accepted in convert_table row filters
+TABLE_FILTER_OPERATORS = {
+    "==": lambda value, operand: value == operand,
+    "!=": lambda value, operand: value != operand,
+    "<": lambda value, operand: value is not None and value < operand,
+    "<=": lambda value, operand: value is not None and value <= operand,
+    ">": lambda value, operand: value is not None and value > operand,
+    ">=": lambda value, operand: value is not None and value >= operand,
+    "in": lambda value, operand: value in operand,
+    "not in": lambda value, operand: value not in operand,
+    "contains": lambda value, operand: value is not None and str(operand) in str(value),
+}
+
+def parse_csv_value(text: str):
+    """
+    Recover the type of a CSV field: empty fields become None, and numbers that
+    survive a round trip (so "007" stays a string) become int or float.
+    """
+    if text == "":
+        return None
+    try:
+        number = int(text)
+        return number if str(number) == text else text
+    except ValueError:
+        pass
+    try:
+        number = float(text)
+        return number if re.fullmatch(r"-?\d+\.\d+(?:[eE][-+]?\d+)?", text) else text
+    except ValueError:
+        return text
+
+def iter_table_rows(input_path: str, sheet: str = None):
+    """
+    Lazily yield the rows of a spreadsheet or CSV file as tuples of typed values.
+    For workbooks only the selected sheet (default: the first) is read.
+    """
+    if input_path.lower().endswith(".csv"):
+        with open(input_path, newline="", encoding="utf-8-sig") as file:
+            for row in csv.reader(file):
+                yield tuple(parse_csv_value(value) for value in row)
+        return
+    for _, rows in iter_excel_rows(input_path, [sheet] if sheet is not None else None):
+        yield from rows
+
+def table_header(row: tuple) -> list:
+    """Column names from the header row, with blanks and duplicates made unique."""
+    names = []
+    for index, value in enumerate(row):
+        name = str(value) if value not in (None, "") else f"column_{index}"
+        while name in names:
+            name = f"{name}_{index}"
+        names.append(name)
+    return names
+
+def compile_table_filters(filters: list, names: list) -> list:
+    """
+    Turn [column, operator, value] triples into (column index, predicate, value)
+    tuples, validating columns and operators up front.
+    """
+    compiled = []
+    for condition in filters or []:
+        if len(condition) != 3:
+            raise ValueError(f"Filters must be [column, operator, value] triples, got: {condition}")
+        column, operator, operand = condition
+        if column not in names:
+            raise ValueError(f"Filter column not found: {column}")
+        if operator not in TABLE_FILTER_OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {operator}. Supported operators: {', '.join(TABLE_FILTER_OPERATORS)}")
+        if operator in ("in", "not in"):
+            operand = set(operand)
+        compiled.append((names.index(column), TABLE_FILTER_OPERATORS[operator], operand))
+    return compiled
+
+def table_row_matches(row: tuple, predicates: list) -> bool:
+    """Whether row passes every filter; values that cannot be compared do not match."""
+    try:
+        return all(predicate(row[index], operand) for index, predicate, operand in predicates)
+    except TypeError:
+        return False
+
+class TableWriter:
+    """
+    Incremental writer for one tabular output format. Rows are appended one at a
+    time; CSV and JSON Lines are written directly, Parquet and Feather in record
+    batches of TABLE_BATCH_ROWS rows with the schema inferred from the first batch.
+    A later batch that does not fit the schema widens the changed columns to
+    float64 or string, and the batches already written are rewritten with it.
+    """
+    
+    def __init__(self, output_path: str, output_format: str, names: list):
+        self.output_path = output_path
+        self.output_format = output_format
+        self.names = names
+        self._rows = []
+        self._file = None
+        self._writer = None
+        self._schema = None
+        if output_format in ("csv", "jsonl"):
+            self._file = open(output_path, "w", newline="", encoding="utf-8")
+            if output_format == "csv":
+                self._writer = csv.writer(self._file)
+                self._writer.writerow(names)
+        else:
+            backends.require("pyarrow")
+    
+    def append(self, row: tuple):
+        if self.output_format == "csv":
+            self._writer.writerow(["" if value is None else value for value in row])
+        elif self.output_format == "jsonl":
+            self._file.write(json.dumps(dict(zip(self.names, row)), cls=SafeJSONEncoder, ensure_ascii=False))
+            self._file.write("\n")
+        else:
+            self._rows.append(row)
+            if len(self._rows) >= TABLE_BATCH_ROWS:
+                self._flush()
+    
+    def _flush(self):
+        import pyarrow as pa
+        columns = [list(column) for column in zip(*self._rows)] or [[] for _ in self.names]
+        self._rows = []
+        if self._schema is None:
+            self._open(pa.schema([pa.field(name, self._infer_type(values)) for name, values in zip(self.names, columns)]))
+        try:
+            batch = self._record_batch(columns, self._schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            schema = pa.schema([pa.field(field.name, self._widen_type(field.type, values))
+                                for field, values in zip(self._schema, columns)])
+            changed = [field.name for field, previous in zip(schema, self._schema) if field.type != previous.type]
+            logger.info(f"Widening column(s) {', '.join(changed)}; rewriting the batches written so far")
+            self._rewrite(schema)
+            batch = self._record_batch(columns, self._schema)
+        self._writer.write_batch(batch)
+    
+    def _open(self, schema):
+        import pyarrow as pa
+        self._schema = schema
+        if self.output_format == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self.output_path, schema)
+        else:
+            self._writer = pa.ipc.new_file(self.output_path, schema)
+    
+    @staticmethod
+    def _record_batch(columns: list, schema):
+        import pyarrow as pa
+        arrays = []
+        for field, values in zip(schema, columns):
+            if pa.types.is_string(field.type):
+                arrays.append(pa.array([None if value is None else str(value) for value in values], type=field.type))
+            else:
+                # A safe cast of the inferred array, as pa.array(values, type) truncates 2.5 to 2
+                arrays.append(pa.array(values).cast(field.type))
+        return pa.record_batch(arrays, schema=schema)
+    
+    @staticmethod
+    def _widen_type(current, values: list):
+        """
+        Type of a column that holds both the rows written as current and values:
+        current if they fit, float64 for numbers that no longer fit an integer
+        column, and string otherwise.
+        """
+        import pyarrow as pa
+        try:
+            inferred = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return pa.string()
+        candidates = [current]
+        if pa.types.is_integer(current) or pa.types.is_floating(current):
+            candidates.append(pa.float64())
+        for candidate in candidates:
+            try:
+                inferred.cast(candidate)
+                return candidate
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                continue
+        return pa.string()
+    
+    def _rewrite(self, schema):
+        """Rewrite the batches written so far with schema, one batch at a time, and continue with it."""
+        import pyarrow as pa
+        self._writer.close()
+        previous_path = f"{self.output_path}.previous"
+        os.replace(self.output_path, previous_path)
+        self._open(schema)
+        try:
+            if self.output_format == "parquet":
+                import pyarrow.parquet as pq
+                previous = pq.ParquetFile(previous_path)
+                for batch in previous.iter_batches(batch_size=TABLE_BATCH_ROWS):
+                    self._writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+                previous.close()
+            else:
+                with pa.memory_map(previous_path) as source:
+                    previous = pa.ipc.open_file(source)
+                    for index in range(previous.num_record_batches):
+                        self._writer.write_table(pa.Table.from_batches([previous.get_batch(index)]).cast(schema))
+        finally:
+            os.remove(previous_path)
+    
+    @staticmethod
+    def _infer_type(values: list):
+        """Arrow type of a column; empty and mixed-type columns fall back to string."""
+        import pyarrow as pa
+        try:
+            inferred = pa.array(values).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return pa.string()
+        return pa.string() if pa.types.is_null(inferred) else inferred
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            return
+        if self._rows or self._schema is None:
+            self._flush()
+        self._writer.close()
+
+def table_backend(input_path: str, output_path: str, output_format: str, columns: list = None,
+                  filters: list = None, sheet: str = None, progress_path: str = None) -> dict:
+    """
+    Convert a spreadsheet or CSV file to output_format, streaming rows from the
+    reader to the writer. Rows are filtered and projected as they are read, so
+    neither the input nor the output is held in memory.
+    
+    Returns the output column names and the number of rows read and written.
+    """
+    channel = ProgressChannel(progress_path) if progress_path else None
+    rows = iter_table_rows(input_path, sheet)
+    names = table_header(next(rows, ()))
+    if not names:
+        raise ValueError("The input table is empty")
+    predicates = compile_table_filters(filters, names)
+    missing = [column for column in columns or [] if column not in names]
+    if missing:
+        raise ValueError(f"Columns not found: {', '.join(map(str, missing))} (available: {', '.join(names)})")
+    selected = [names.index(column) for column in columns] if columns else list(range(len(names)))
+    
+    writer = TableWriter(output_path, output_format, [names[index] for index in selected])
+    read = written = 0
+    try:
+        for row in rows:
+            read += 1
+            if channel is not None and read % EXCEL_ROWS_PER_CHECK == 0:
+                channel.check_cancelled()
+                channel.update(read)
+            # Short rows (trailing empty cells in CSV) are padded with None
+            if len(row) < len(names):
+                row = tuple(row) + (None,) * (len(names) - len(row))
+            if table_row_matches(row, predicates):
+                writer.append(tuple(row[index] for index in selected))
+                written += 1
+    finally:
+        writer.close()
+    return {"columns": writer.names, "rows_read": read, "rows_written": written}
+
+def pdf_page_count(input_path: str) -> int:
+    from pdf2docx import Converter
+    cv = Converter(input_path)
+    try:
+        return len(cv.fitz_doc)
+    finally:
+        cv.close()
+
+def convert_pdf_to_docx_file(input_path: str, output_path: str):
+    """
+    Convert a PDF file to DOCX in the process pool. PDFs with at least
+    PDF2DOCX_PARALLEL_MIN_PAGES pages are split into ranges of
+    PDF2DOCX_CHUNK_PAGES pages that are parsed in parallel, and the parsed
+    layouts are assembled into one document in a final step.
+    """
+    page_count = pdf_page_count(input_path)
+    workers = conversion_executor.process_workers
+    if workers < 2 or PDF2DOCX_PARALLEL_MIN_PAGES <= 0 or page_count < PDF2DOCX_PARALLEL_MIN_PAGES:
+        conversion_executor.run_in_process(pdf_to_docx_backend, input_path, output_path, progress=True)
+        return
+    
+    # Use at least one range per worker so that small chunk sizes are not required
+    chunk_pages = min(PDF2DOCX_CHUNK_PAGES, -(-page_count // workers))
+    ranges = [(start, min(start + chunk_pages, page_count)) for start in range(0, page_count, chunk_pages)]
+    logger.info(f"Converting {page_count} pages in {len(ranges)} parallel ranges of up to {chunk_pages} pages")
+    with workspaces.workspace() as layout_dir:
+        layout_paths = [os.path.join(layout_dir, f"pages_{start}.json") for start, _ in ranges]
+        conversion_executor.map_in_process(
+            pdf_to_docx_parse_range,
+            [(input_path, start, end, layout_path) for (start, end), layout_path in zip(ranges, layout_paths)],
+            total=page_count)
+        report_status(page_count, page_count, message="Assembling DOCX")
+        conversion_executor.run_in_process(pdf_to_docx_assemble, input_path, layout_paths, output_path)
+
+def validate_image_options(max_width: int = None, max_height: int = None, quality: int = None,
+                           progressive: bool = False, optimize: bool = False, png_compress_level: int = None,
+                           strip_metadata: bool = False) -> dict:
+    """
+    Check image processing options and return the ones that are set, as passed
+    to the image backends. Raises ValueError for out-of-range values.
+    """
+    for name, value in (("max_width", max_width), ("max_height", max_height)):
+        if value is not None and value < 1:
+            raise ValueError(f"{name} must be a positive number of pixels, got: {value}")
+    if quality is not None and not 1 <= quality <= 100:
+        raise ValueError(f"quality must be between 1 and 100, got: {quality}")
+    if png_compress_level is not None and not 0 <= png_compress_level <= 9:
+        raise ValueError(f"png_compress_level must be between 0 and 9, got: {png_compress_level}")
+    options = {
+        "max_width": max_width, "max_height": max_height, "quality": quality, "progressive": progressive,
+        "optimize": optimize, "png_compress_level": png_compress_level, "strip_metadata": strip_metadata,
+    }
+    return {name: value for name, value in options.items() if value not in (None, False)}
+
+def image_target_box(img, options: dict):
+    """
+    Return the (width, height) box that img must be shrunk to fit from the
+    max_width/max_height options, or None if it already fits.
+    """
+    max_width, max_height = options.get("max_width"), options.get("max_height")
+    if not max_width and not max_height:
+        return None
+    # The limits apply to the image as displayed, so swap them for EXIF-rotated images
+    rotated = img.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+    shown_width, shown_height = (img.height, img.width) if rotated else img.size
+    box = (max_width or shown_width, max_height or shown_height)
+    if rotated:
+        box = (box[1], box[0])
+    if box[0] < img.width or box[1] < img.height:
+        return box
+    return None
+
+def resize_image(img, options: dict):
+    """
+    Shrink img in place to fit max_width x max_height, keeping its aspect ratio.
+    Must run before the pixels are loaded: thumbnail() first asks the decoder
+    for a reduced draft (DCT-domain scaling for JPEG) within IMAGE_REDUCING_GAP
+    of the target, then resamples the rest of the way.
+    """
+    box = image_target_box(img, options)
+    if box is not None:
+        from PIL import Image
+        img.thumbnail(box, resample=Image.Resampling.LANCZOS, reducing_gap=IMAGE_REDUCING_GAP or None)
+
+def prepare_image(img, output_format: str, options: dict = None):
+    """
+    Apply the processing options and adapt a Pillow image to what output_format
+    can store.
+    """
+    from PIL import Image, ImageOps
+    options = options or {}
+    resize_image(img, options)
+    # Bake the EXIF orientation into the pixels: the saved file does not keep the
+    # tag, and resize_image fitted the stored pixels to the box as displayed
+    if img.getexif().get(0x0112, 1) != 1:
+        img = ImageOps.exif_transpose(img)
+    if options.get("strip_metadata"):
+        for key in IMAGE_METADATA_KEYS:
+            img.info.pop(key, None)
+    
+    # Handle special cases for certain formats
+    if output_format.lower() in ['jpg', 'jpeg', 'pdf']:
+        # Convert to RGB if saving as JPEG or PDF (removes alpha channel)
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            logger.info(f"Converting image to RGB for {output_format.upper()} output")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
+            img = background
+        elif img.mode not in ('RGB', 'L', 'CMYK'):
+            img = img.convert('RGB')
+    return img
+
+def image_save_params(output_format: str, options: dict = None) -> dict:
+    """
+    Encoder parameters for img.save from the processing options; options that
+    output_format does not support are ignored.
+    """
+    options = options or {}
+    output_format = output_format.lower()
+    params = {}
+    if options.get("quality") is not None and output_format in ("jpg", "jpeg", "webp"):
+        params["quality"] = options["quality"]
+    if options.get("progressive") and output_format in ("jpg", "jpeg"):
+        params["progressive"] = True
+    if options.get("optimize") and output_format in ("jpg", "jpeg", "png", "gif"):
+        params["optimize"] = True
+    if options.get("png_compress_level") is not None and output_format == "png":
+        params["compress_level"] = options["png_compress_level"]
+    if options.get("strip_metadata") and output_format in ("jpg", "jpeg", "webp", "png"):
+        params.update({"exif": b"", "icc_profile": None})
+    return params
+
+def image_save_format(output_format: str) -> str:
+    """
+    Return the Pillow format name for output_format, the same one Pillow picks
+    when saving to a file with this extension.
+    """
+    from PIL import Image
+    save_format = Image.registered_extensions().get(f".{output_format.lower()}")
+    if save_format is None:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    return save_format
+
+def check_image_pixels(img):
+    """Raise ValueError if the current frame of img is above IMAGE_MAX_PIXELS."""
+    pixels = img.width * img.height
+    if IMAGE_MAX_PIXELS and pixels > IMAGE_MAX_PIXELS:
+        raise ValueError(f"Image is {img.width}x{img.height} ({pixels} pixels), above the limit of {IMAGE_MAX_PIXELS} pixels")
+
+# Serializes changes to Pillow's process-wide decompression bomb limit
+_pillow_limit_lock = threading.Lock()
+
+@contextlib.contextmanager
+def pillow_pixel_limit_lifted():
+    """
+    Disable Pillow's decompression bomb check for the duration of the block and
+    restore the previous limit afterwards. Pillow's check warns below and fails
+    above twice its own limit; callers apply IMAGE_MAX_PIXELS with
+    check_image_pixels instead. Other users of Pillow in the process keep
+    their limit outside the block.
+    """
+    from PIL import Image
+    with _pillow_limit_lock:
+        saved = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            yield
+        finally:
+            Image.MAX_IMAGE_PIXELS = saved
+
+def seek_frame(img, index: int):
+    """Move img to frame index, rejecting it if it is above IMAGE_MAX_PIXELS."""
+    with pillow_pixel_limit_lifted():
+        img.seek(index)
+    check_image_pixels(img)
+
+def open_image(source):
+    """
+    Open an image from a file path or bytes without decoding it, rejecting
+    frames above IMAGE_MAX_PIXELS and files with more than IMAGE_MAX_FRAMES frames.
+    """
+    from PIL import Image
+    with pillow_pixel_limit_lifted():
+        img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        # Counting GIF frames seeks through them
+        frame_count = getattr(img, "n_frames", 1)
+    check_image_pixels(img)
+    if IMAGE_MAX_FRAMES and frame_count > IMAGE_MAX_FRAMES:
+        raise ValueError(f"Image has {frame_count} frames, more than the limit of {IMAGE_MAX_FRAMES}")
+    return img
+
+def image_strip_layout(img, rows: int = None) -> list:
+    """
+    Split the undecoded data of img into horizontal bands that can be decoded on
+    their own, as (top, bottom, tiles) with raw tiles (box, offset, rawmode,
+    stride, orientation). Uncompressed data is cut every rows (default
+    IMAGE_STRIP_ROWS) rows;
+    tiled or stripped TIFFs are grouped by tile row. Returns None when the
+    layout does not allow it, e.g. PNG or compressed TIFF, whose data is a
+    single compressed stream.
+    """
+    from PIL import Image
+    rows = rows or IMAGE_STRIP_ROWS
+    width, height = img.size
+    bands = {}
+    for codec, (x0, y0, x1, y1), offset, args in img.tile:
+        if codec != "raw":
+            return None
+        rawmode, stride, orientation = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+        if not stride:
+            if rawmode != img.mode:
+                return None
+            stride = len(Image.new(img.mode, (x1 - x0, 1)).tobytes())
+        if (x0, x1) != (0, width):
+            bands.setdefault((y0, min(y1, height)), []).append(((x0, y0, x1, y1), offset, rawmode, stride, orientation))
+            continue
+        for top in range(y0, y1, rows):
+            bottom = min(top + rows, y1)
+            # Bottom-up data (orientation -1, e.g. BMP) stores the last row first
+            first_row = top - y0 if orientation > 0 else y1 - bottom
+            bands.setdefault((top, bottom), []).append(
+                ((x0, top, x1, bottom), offset + first_row * stride, rawmode, stride, orientation))
+    layout = [(top, bottom, tiles) for (top, bottom), tiles in sorted(bands.items())]
+    if len(layout) < 2 or layout[0][0] != 0 or layout[-1][1] != height:
+        return None
+    if any(previous[1] != band[0] for previous, band in zip(layout, layout[1:])):
+        return None
+    return layout
+
+def iter_image_strips(source, img, layout: list, row_multiple: int = 1):
+    """
+    Decode the image at source band by band from image_strip_layout, yielding
+    (top, strip) with strips of at least IMAGE_STRIP_ROWS rows. Every strip
+    but the last has a multiple of row_multiple rows. Only the bytes of one
+    strip are read at a time.
+    """
+    from PIL import Image
+    with (contextlib.nullcontext(io.BytesIO(source)) if isinstance(source, bytes) else open(source, "rb")) as file:
+        start = 0
+        while start < len(layout):
+            end = start + 1
+            while end < len(layout) and (layout[end - 1][1] - layout[start][0] < IMAGE_STRIP_ROWS
+                                         or layout[end - 1][1] % row_multiple):
+                end += 1
+            top, bottom = layout[start][0], layout[end - 1][1]
+            strip = Image.new(img.mode, (img.width, bottom - top))
+            if img.mode == "P":
+                strip.putpalette(img.getpalette())
+            for _, _, tiles in layout[start:end]:
+                for (x0, y0, x1, y1), offset, rawmode, stride, orientation in tiles:
+                    file.seek(offset)
+                    data = file.read(stride * (y1 - y0))
+                    tile = Image.frombytes(img.mode, (x1 - x0, y1 - y0), data, "raw", rawmode, stride, orientation)
+                    strip.paste(tile, (x0, y0 - top))
+            strip.info = dict(img.info)
+            yield top, strip
+            start = end
+
+def strip_working_mode(img) -> str:
+    """Mode that strips of img are converted to before reducing or encoding them."""
+    if img.mode == "P":
+        return "RGBA" if "transparency" in img.info else "RGB"
+    if img.mode in ("1", "I;16", "I;16B", "I;16L"):
+        return "L"
+    return img.mode
+
+def reduce_image_strips(source, img, box: tuple):
+    """
+    Shrink a large image to fit box one strip at a time: each strip is reduced
+    by an integer factor with Image.reduce (a box filter, so strips join without
+    seams) into a small canvas, which is then resampled to the final size.
+    Peak memory is one strip plus the reduced image.
+    """
+    from PIL import Image
+    scale = max(img.width / box[0], img.height / box[1])
+    factor = max(1, int(scale / max(IMAGE_REDUCING_GAP, 1.0)))
+    # Cut uncompressed data at multiples of the factor so strips need no merging
+    layout = image_strip_layout(img, -(-IMAGE_STRIP_ROWS // factor) * factor)
+    mode = strip_working_mode(img)
+    canvas = Image.new(mode, (-(-img.width // factor), -(-img.height // factor)))
+    for top, strip in iter_image_strips(source, img, layout, factor):
+        if strip.mode != mode:
+            strip = strip.convert(mode)
+        canvas.paste(strip.reduce(factor) if factor > 1 else strip, (0, top // factor))
+    canvas.info = dict(img.info)
+    canvas.thumbnail(box, resample=Image.Resampling.LANCZOS)
+    return canvas
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+def write_png_strips(source, img, layout: list, output, options: dict):
+    """
+    Encode a large image as PNG one strip at a time, streaming the IDAT data
+    through a single zlib compressor, so the full image is never held in memory.
+    Rows use PNG filter type 0 (none).
+    """
+    mode = strip_working_mode(img)
+    if mode not in PNG_COLOR_TYPES:
+        mode = "RGBA" if "A" in mode else "RGB"
+    width, height = img.size
+    row_bytes = width * len(mode)
+    compressor = zlib.compressobj(options.get("png_compress_level", 6))
+    with (open(output, "wb") if isinstance(output, str) else contextlib.nullcontext(output)) as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, PNG_COLOR_TYPES[mode], 0, 0, 0)))
+        for _, strip in iter_image_strips(source, img, layout):
+            if strip.mode != mode:
+                strip = strip.convert(mode)
+            data = strip.tobytes()
+            compressed = compressor.compress(b"".join(
+                b"\x00" + data[start:start + row_bytes] for start in range(0, len(data), row_bytes)))
+            if compressed:
+                file.write(png_chunk(b"IDAT", compressed))
+        file.write(png_chunk(b"IDAT", compressor.flush()))
+        file.write(png_chunk(b"IEND", b""))
+
+def save_all_frames(img, output, output_format: str, options: dict):
+    """
+    Save every frame of a multi-frame image, keeping frame durations and the
+    loop count of animations.
+    """
+    frames, durations = [], []
+    for index in range(img.n_frames):
+        seek_frame(img, index)
+        durations.append(img.info.get("duration", 0))
+        frames.append(prepare_image(img.copy(), output_format, options))
+    # Pillow decodes GIF frames after the first as RGB(A); give all frames one mode
+    if len({frame.mode for frame in frames}) > 1:
+        alpha = any(frame.mode in ("RGBA", "LA", "PA") or "transparency" in frame.info for frame in frames)
+        frames = [frame.convert("RGBA" if alpha else "RGB") for frame in frames]
+    params = image_save_params(output_format, options)
+    params.update(save_all=True, append_images=frames[1:])
+    if any(durations):
+        params["duration"] = durations
+    if "loop" in img.info:
+        params["loop"] = img.info["loop"]
+    frames[0].save(output, format=image_save_format(output_format), **params)
+
+def write_image(source, output, output_format: str, options: dict = None):
+    """
+    Convert the image at source (a file path or bytes) to output_format and save
+    it to output (a file path or file object). Multi-frame images keep all their
+    frames when output_format can hold them. Images above IMAGE_STRIP_THRESHOLD
+    pixels are resized or written as PNG in strips when their layout allows it.
+    """
+    options = options or {}
+    img = open_image(source)
+    save_format = image_save_format(output_format)
+    frame_count = getattr(img, "n_frames", 1)
+    layout = None
+    if IMAGE_STRIP_THRESHOLD and frame_count == 1 and img.width * img.height > IMAGE_STRIP_THRESHOLD:
+        layout = image_strip_layout(img)
+        if layout is None:
+            logger.info(f"Decoding {img.width}x{img.height} image whole: its layout cannot be read in strips")
+    box = image_target_box(img, options) if layout else None
+    
+    if box is not None:
+        logger.info(f"Reducing {img.width}x{img.height} image in {len(layout)} bands")
+        canvas = reduce_image_strips(source, img, box)
+        options = {name: value for name, value in options.items() if name not in ("max_width", "max_height")}
+        img = prepare_image(canvas, output_format, options)
+        img.save(output, format=save_format, **image_save_params(output_format, options))
+    elif layout and save_format == "PNG" and img.getexif().get(0x0112, 1) == 1:
+        logger.info(f"Writing {img.width}x{img.height} image as PNG in {len(layout)} bands")
+        write_png_strips(source, img, layout, output, options)
+    elif frame_count > 1 and output_format.lower() in IMAGE_MULTIFRAME_FORMATS:
+        save_all_frames(img, output, output_format, options)
+    else:
+        img = prepare_image(img, output_format, options)
+        img.save(output, format=save_format, **image_save_params(output_format, options))
+
+def image_backend(input_path: str, output_path: str, output_format: str, options: dict = None):
+    """
+    Convert an image file to output_format with Pillow.
+    """
+    write_image(input_path, output_path, output_format, options)
+
+def image_bytes_backend(data: bytes, output_format: str, options: dict = None) -> bytes:
+    """
+    Convert an image held in memory to output_format with Pillow, decoding from
+    and encoding into memory buffers. The output is byte-identical to image_backend.
+    """
+    buffer = io.BytesIO()
+    write_image(data, buffer, output_format, options)
+    return buffer.getvalue()
+
+def image_frames_backend(source, output_dir: str, output_format: str, frames: list, options: dict = None) -> list:
+    """
+    Write each selected frame (0-based; negative indexes count from the end) of
+    a multi-frame image to its own file in output_dir. A frame selected more
+    than once is written once.
+    Returns [{"frame", "file"}] in the order of frames.
+    """
+    img = open_image(source)
+    frame_count = getattr(img, "n_frames", 1)
+    save_format = image_save_format(output_format)
+    indexes = []
+    for frame in frames:
+        index = frame + frame_count if frame < 0 else frame
+        if not 0 <= index < frame_count:
+            raise ValueError(f"Frame {frame} is out of range: the image has {frame_count} frame(s)")
+        indexes.append(index)
+    exports = []
+    for index in dict.fromkeys(indexes):
+        seek_frame(img, index)
+        output_path = os.path.join(output_dir, f"frame_{index}.{output_format.lower()}")
+        prepare_image(img.copy(), output_format, options).save(
+            output_path, format=save_format, **image_save_params(output_format, options))
+        exports.append({"frame": index, "file": output_path})
+    return exports
+
+# DOCX to PDF engine configuration
+# "docx2pdf", "libreoffice", or "auto" (LibreOffice if soffice is installed, except on Windows/macOS)
+DOCX2PDF_ENGINE = os.environ.get("FILE_CONVERTER_DOCX2PDF_ENGINE", "auto").lower()
+SOFFICE_BINARY = os.environ.get("FILE_CONVERTER_SOFFICE") or shutil.which("soffice") or shutil.which("libreoffice")
+# Number of LibreOffice instances kept running
+LIBREOFFICE_POOL_SIZE = int(os.environ.get("FILE_CONVERTER_LIBREOFFICE_POOL_SIZE", "2"))
+# Jobs after which an instance is recycled
+LIBREOFFICE_MAX_JOBS = int(os.environ.get("FILE_CONVERTER_LIBREOFFICE_MAX_JOBS", "200"))
+# Seconds before a conversion is considered hung and its instance restarted
+LIBREOFFICE_TIMEOUT = float(os.environ.get("FILE_CONVERTER_LIBREOFFICE_TIMEOUT", "120"))
+LIBREOFFICE_STARTUP_TIMEOUT = float(os.environ.get("FILE_CONVERTER_LIBREOFFICE_STARTUP_TIMEOUT", "30"))
+LIBREOFFICE_PROFILE_DIR = os.environ.get(
+    "FILE_CONVERTER_LIBREOFFICE_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "file_converter_libreoffice"))
+file_index.exclude(LIBREOFFICE_PROFILE_DIR)
+
+class LibreOfficeWorker:
+    """
+    One headless LibreOffice instance with its own user profile.
+    
+    If the UNO Python bindings are available, the instance is started once and
+    listens on a local socket; documents are loaded and exported through it, so
+    no process is started per document. Without UNO, each job runs
+    "soffice --convert-to pdf" against the worker's profile, which is initialized
+    once up front so that jobs skip the first-start profile creation.
+    """
+    
+    def __init__(self, index: int, binary: str = SOFFICE_BINARY, profile_root: str = LIBREOFFICE_PROFILE_DIR):
+        self.index = index
+        self.binary = binary
+        self.profile_dir = os.path.join(profile_root, f"profile_{index}")
+        self.process = None
+        self.port = None
+        self.jobs = 0
+        self._desktop = None
+        self._timed_out = False
+    
+    @staticmethod
+    def uno_available() -> bool:
+        return importlib.util.find_spec("uno") is not None
+    
+    def _profile_arg(self) -> str:
+        return f"-env:UserInstallation={Path(self.profile_dir).resolve().as_uri()}"
+    
+    def start(self):
+        """Start the instance and wait until it accepts work."""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self.jobs = 0
+        if not self.uno_available():
+            # Initialize the profile once so that every --convert-to run finds it ready
+            subprocess.run([self.binary, "--headless", "--terminate_after_init", self._profile_arg()],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           timeout=LIBREOFFICE_STARTUP_TIMEOUT, check=False)
+            logger.info(f"LibreOffice worker {self.index} ready (command line mode)")
+            return
+        
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.process = subprocess.Popen(
+            [self.binary, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+             "--nolockcheck", self._profile_arg(),
+             f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        
+        import uno
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context)
+        deadline = time.monotonic() + LIBREOFFICE_STARTUP_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext")
+                self._desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+                break
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"LibreOffice worker {self.index} failed to start")
+                time.sleep(0.2)
+        logger.info(f"LibreOffice worker {self.index} ready on port {self.port} (pid {self.process.pid})")
+    
+    def alive(self) -> bool:
+        if not self.uno_available():
+            return True
+        return self.process is not None and self.process.poll() is None
+    
+    def stop(self, wipe_profile: bool = False):
+        """Stop the instance, optionally discarding its (possibly corrupted) profile."""
+        if self._desktop is not None:
+            try:
+                self._desktop.terminate()
+            except Exception:
+                pass
+            self._desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+        if wipe_profile:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+    
+    def _kill(self):
+        self._timed_out = True
+        if self.process is not None:
+            self.process.kill()
+    
+    def convert(self, input_path: str, output_path: str, timeout: float = LIBREOFFICE_TIMEOUT):
+        """Convert input_path to a PDF at output_path."""
+        self.jobs += 1
+        if not self.uno_available():
+            output_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_path)))
+            try:
+                subprocess.run([self.binary, "--headless", "--norestore", self._profile_arg(),
+                                "--convert-to", "pdf", "--outdir", output_dir, os.path.abspath(input_path)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout, check=True)
+                produced = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + ".pdf")
+                os.replace(produced, output_path)
+            finally:
+                shutil.rmtree(output_dir, ignore_errors=True)
+            return
+        
+        import uno
+        from com.sun.star.beans import PropertyValue
+        
+        def prop(name, value):
+            value_prop = PropertyValue()
+            value_prop.Name = name
+            value_prop.Value = value
+            return value_prop
+        
+        # Kill the instance if the job hangs; the blocked UNO call then fails
+        self._timed_out = False
+        watchdog = threading.Timer(timeout, self._kill)
+        watchdog.start()
+        try:
+            document = self._desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(input_path)), "_blank", 0,
+                (prop("Hidden", True), prop("ReadOnly", True)))
+            if document is None:
+                raise RuntimeError(f"LibreOffice could not open {input_path}")
+            try:
+                document.storeToURL(uno.systemPathToFileUrl(os.path.abspath(output_path)),
+                                    (prop("FilterName", "writer_pdf_Export"),))
+            finally:
+                document.close(True)
+        except Exception:
+            if self._timed_out:
+                raise TimeoutError(f"LibreOffice conversion timed out after {timeout} seconds")
+            raise
+        finally:
+            watchdog.cancel()
+
+class LibreOfficePool:
+    """
+    Pool of warm LibreOffice workers for DOCX to PDF conversion.
+    
+    Jobs are handed to idle workers. A worker that crashed or hung is restarted
+    with a fresh profile, and every worker is recycled after max_jobs jobs to
+    bound memory growth.
+    """
+    
+    def __init__(self, size: int = LIBREOFFICE_POOL_SIZE, max_jobs: int = LIBREOFFICE_MAX_JOBS):
+        self.size = size
+        self.max_jobs = max_jobs
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._restarts = 0
+    
+    def mode(self) -> str:
+        """"uno" when documents go through warm instances, "cli" when each job starts soffice."""
+        return "uno" if LibreOfficeWorker.uno_available() else "cli"
+    
+    def start(self):
+        """Start all workers; called on first use or for pre-warming."""
+        with self._lock:
+            if self._workers:
+                return
+            if self.mode() == "cli":
+                logger.warning("LibreOffice UNO bindings (python3-uno) are not importable: every DOCX to PDF job "
+                               "starts a cold soffice process. Install them to convert through warm instances")
+            for index in range(self.size):
+                worker = LibreOfficeWorker(index)
+                worker.start()
+                self._workers.append(worker)
+                self._idle.put(worker)
+    
+    def _restart(self, worker: LibreOfficeWorker, wipe_profile: bool):
+        worker.stop(wipe_profile=wipe_profile)
+        worker.start()
+        with self._lock:
+            self._restarts += 1
+    
+    def convert(self, input_path: str, output_path: str):
+        """Convert a document to PDF on the next idle worker."""
+        self.start()
+        worker = self._idle.get()
+        try:
+            worker.convert(input_path, output_path)
+        except Exception as e:
+            if not worker.alive() or isinstance(e, (TimeoutError, subprocess.TimeoutExpired)):
+                logger.warning(f"LibreOffice worker {worker.index} crashed or hung, restarting it: {str(e)}")
+                self._restart(worker, wipe_profile=True)
+            raise
+        finally:
+            try:
+                if worker.jobs >= self.max_jobs:
+                    logger.info(f"Recycling LibreOffice worker {worker.index} after {worker.jobs} jobs")
+                    self._restart(worker, wipe_profile=False)
+            finally:
+                self._idle.put(worker)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode(),
+                "workers": len(self._workers),
+                "idle": self._idle.qsize(),
+                "restarts": self._restarts,
+                "jobs": {worker.index: worker.jobs for worker in self._workers},
+            }
+    
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+
+# Shared LibreOffice pool, started on first use
+libreoffice_pool = LibreOfficePool()
+atexit.register(libreoffice_pool.shutdown)
+
+def get_docx2pdf_engine() -> str:
+    """
+    Return the DOCX to PDF engine to use: "libreoffice" or "docx2pdf".
+    docx2pdf needs Microsoft Word (Windows/macOS), so "auto" prefers LibreOffice elsewhere.
+    """
+    if DOCX2PDF_ENGINE in ("libreoffice", "docx2pdf"):
+        return DOCX2PDF_ENGINE
+    if SOFFICE_BINARY and sys.platform not in ("win32", "darwin"):
+        return "libreoffice"
+    return "docx2pdf"
+
+@timed_stage("convert")
+def docx_to_pdf_backend(input_path: str, output_path: str):
+    """
+    Convert a DOCX file to PDF with the configured engine.
+    """
+    if get_docx2pdf_engine() == "libreoffice":
+        if not SOFFICE_BINARY:
+            raise RuntimeError("LibreOffice engine selected but soffice was not found")
+        libreoffice_pool.convert(input_path, output_path)
+    else:
+        from docx2pdf import convert
+        convert(input_path, output_path)
+
+# DOCX to PDF conversion tool
+@async_tool("docx2pdf")
+def convert_docx_to_pdf(input_file: str = None, file_content_base64: str = None, output_mode: str = None) -> dict:
+    """
+    Convert a DOCX file to PDF format. Supports both file path and direct file content input.
+    
+    Args:
+        input_file: Path to the DOCX file to convert, or an upload:// handle from finish_upload. Optional if providing file_content_base64.
+        file_content_base64: Base64 encoded content of the DOCX file. Optional if providing input_file.
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
         
-        # Perform conversion
-        logger.info(f"Starting conversion from {actual_file_path} to {temp_output_file}")
-        try:
-            convert(actual_file_path, temp_output_file)
-            logger.info("Conversion completed successfully")
-        except Exception as e:
-            logger.error(f"Conversion error: {str(e)}")
-            
-            # Clean up temp directory before returning
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response(f"Error during DOCX to PDF conversion: {str(e)}"))
+    Returns:
+        Dictionary containing success status and either the converted PDF (base64 encoded or as a file reference) or error message.
+    """
+    try:
+        logger.info(f"Starting DOCX to PDF conversion")
+        logger.info(f"Received parameters: input_file={input_file}, file_content_base64={'[BASE64 content]' if file_content_base64 else 'None'}")
         
-        # Verify the output file exists
-        if not os.path.exists(temp_output_file):
-            logger.error(f"Output file not found after conversion: {temp_output_file}")
-            
-            # Clean up temp directory before returning
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response(f"Conversion failed: Output file not found"))
+        # Log more debug information
+        if input_file:
+            logger.info(f"Input file type: {type(input_file)}")
+            logger.info(f"Input file length: {len(input_file) if isinstance(input_file, str) else 'not a string'}")
+            logger.info(f"Input file first 20 chars: {input_file[:20] if isinstance(input_file, str) else 'not a string'}")
         
-        # Return base64 encoded PDF
-        logger.info("Encoding PDF file as base64")
+        # Validate that at least one input method is provided
+        if input_file is None and file_content_base64 is None:
+            logger.error("No input provided: both input_file and file_content_base64 are None")
+            return debug_json_response(format_error_response("You must provide either input_file or file_content_base64"))
+        
+        # Validate the output mode before doing any work
         try:
-            encoded_data = get_base64_encoded_file(temp_output_file)
-            logger.info("Successfully encoded PDF file")
+            output_mode = resolve_output_mode(output_mode)
+        except ValueError as e:
+            return debug_json_response(format_error_response(str(e)))
+        
+        # The workspace is released on every return path below
+        with workspaces.workspace() as temp_dir:
+            logger.info(f"Using workspace: {temp_dir}")
+            temp_input_file = os.path.join(temp_dir, "input.docx")
+            temp_output_file = os.path.join(temp_dir, "output.pdf")
             
-            # Clean up temp directory
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-                logger.info(f"Cleaned up temporary directory: {temp_dir}")
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary directory: {str(e)}")
+            # Handle direct content mode
+            if file_content_base64:
+                logger.info("Using direct content mode (base64 input)")
+                try:
+                    # Decode base64 content straight to a temporary file
+                    decode_base64_to_file(file_content_base64, temp_input_file)
+                    logger.info(f"Successfully wrote input file from base64: {temp_input_file}")
+                    
+                    # Set actual file path to our temporary file
+                    actual_file_path = temp_input_file
+                except Exception as e:
+                    logger.error(f"Failed to decode or write base64 input: {str(e)}")
+                    return debug_json_response(format_error_response(f"Error processing input file content: {str(e)}"))
+                    
+            # Handle file path mode
+            else:
+                logger.info(f"Using file path mode with input: {input_file}")
                 
-            return debug_json_response(format_success_response(encoded_data))
-        except Exception as e:
-            logger.error(f"Error encoding PDF file: {str(e)}")
+                # List files in current directory for debugging
+                try:
+                    current_files = os.listdir(".")
+                    logger.info(f"Files in current directory: {current_files}")
+                except Exception as e:
+                    logger.warning(f"Error listing files in current directory: {str(e)}")
+                
+                # Try to locate the file
+                try:
+                    actual_file_path = validate_file_exists(input_file, ".docx")
+                    logger.info(f"File validated, using path: {actual_file_path}")
+                except Exception as e:
+                    logger.error(f"File validation error: {str(e)}")
+                    return debug_json_response(format_error_response(f"Error finding DOCX file: {str(e)}"))
             
-            # Clean up temp directory before returning
+            # Check docx2pdf without importing it; the LibreOffice engine does not use it
+            engine = get_docx2pdf_engine()
+            logger.info(f"Using DOCX to PDF engine: {engine}")
+            if engine == "docx2pdf" and not backends.available("docx2pdf"):
+                logger.error("docx2pdf is not installed")
+                return debug_json_response(format_error_response("Error importing docx2pdf library. Please ensure it's installed."))
+            
+            # Reuse the cached result if this input was converted before
+            cache_key = conversion_cache.make_key(actual_file_path, "docx", "pdf", {"engine": engine})
+            if conversion_cache.fetch(cache_key, temp_output_file):
+                logger.info("Using cached conversion result")
+            else:
+                # Perform conversion
+                logger.info(f"Starting conversion from {actual_file_path} to {temp_output_file}")
+                try:
+                    docx_to_pdf_backend(actual_file_path, temp_output_file)
+                    logger.info("Conversion completed successfully")
+                    conversion_cache.store(cache_key, temp_output_file)
+                except Exception as e:
+                    logger.error(f"Conversion error: {str(e)}")
+                    return debug_json_response(format_error_response(f"Error during DOCX to PDF conversion: {str(e)}"))
+            
+            # Verify the output file exists
+            if not os.path.exists(temp_output_file):
+                logger.error(f"Output file not found after conversion: {temp_output_file}")
+                return debug_json_response(format_error_response(f"Conversion failed: Output file not found"))
+            
+            # Return base64 encoded PDF
+            logger.info("Delivering converted PDF file")
             try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response(f"Error reading converted PDF file: {str(e)}"))
+                response = deliver_output(temp_output_file, output_mode)
+                logger.info("Successfully delivered converted PDF file")
+                return debug_json_response(response)
+            except Exception as e:
+                logger.error(f"Error encoding PDF file: {str(e)}")
+                return debug_json_response(format_error_response(f"Error reading converted PDF file: {str(e)}"))
     
     except Exception as e:
         logger.error(f"Unexpected error in convert_docx_to_pdf: {str(e)}")
         return debug_json_response(format_error_response(f"Error converting DOCX to PDF: {str(e)}"))
 
 # PDF to DOCX conversion tool
-@mcp.tool("pdf2docx")
-def convert_pdf_to_docx(input_file: str = None, file_content_base64: str = None) -> dict:
+@async_tool("pdf2docx")
+def convert_pdf_to_docx(input_file: str = None, file_content_base64: str = None, output_mode: str = None) -> dict:
     """
     Convert a PDF file to DOCX format. Supports both file path and direct file content input.
     
     Args:
-        input_file: Path to the PDF file to convert. Optional if providing file_content_base64.
+        input_file: Path to the PDF file to convert, or an upload:// handle from finish_upload. Optional if providing file_content_base64.
         file_content_base64: Base64 encoded content of the PDF file. Optional if providing input_file.
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
         
     Returns:
-        Dictionary containing success status and either base64 encoded DOCX or error message.
+        Dictionary containing success status and either the converted DOCX (base64 encoded or as a file reference) or error message.
     """
     try:
         logger.info(f"Starting PDF to DOCX conversion")
@@ -442,469 +3782,1191 @@ def convert_pdf_to_docx(input_file: str = None, file_content_base64: str = None)
             logger.error("No input provided: both input_file and file_content_base64 are None")
             return debug_json_response(format_error_response("You must provide either input_file or file_content_base64"))
         
-        # Create temporary directory for processing files
-        temp_dir = tempfile.mkdtemp()
-        logger.info(f"Created temporary directory: {temp_dir}")
-        
-        # Create a unique filename with timestamp
-        temp_input_file = os.path.join(temp_dir, f"input_{int(time.time())}.pdf")
-        temp_output_file = os.path.join(temp_dir, f"output_{int(time.time())}.docx")
+        # Validate the output mode before doing any work
+        try:
+            output_mode = resolve_output_mode(output_mode)
+        except ValueError as e:
+            return debug_json_response(format_error_response(str(e)))
         
-        # Handle direct content mode
-        if file_content_base64:
-            logger.info("Using direct content mode (base64 input)")
-            try:
-                # Decode base64 content
-                file_content = base64.b64decode(file_content_base64)
-                
-                # Write to temporary file
-                with open(temp_input_file, "wb") as f:
-                    f.write(file_content)
-                logger.info(f"Successfully wrote input file from base64: {temp_input_file}")
-                
-                # Set actual file path to our temporary file
-                actual_file_path = temp_input_file
-            except Exception as e:
-                logger.error(f"Failed to decode or write base64 input: {str(e)}")
-                
-                # Clean up temp directory before returning
+        # The workspace is released on every return path below
+        with workspaces.workspace() as temp_dir:
+            logger.info(f"Using workspace: {temp_dir}")
+            temp_input_file = os.path.join(temp_dir, "input.pdf")
+            temp_output_file = os.path.join(temp_dir, "output.docx")
+            
+            # Handle direct content mode
+            if file_content_base64:
+                logger.info("Using direct content mode (base64 input)")
                 try:
-                    import shutil
-                    shutil.rmtree(temp_dir)
-                except:
-                    pass
+                    # Decode base64 content straight to a temporary file
+                    decode_base64_to_file(file_content_base64, temp_input_file)
+                    logger.info(f"Successfully wrote input file from base64: {temp_input_file}")
                     
-                return debug_json_response(format_error_response(f"Error processing input file content: {str(e)}"))
+                    # Set actual file path to our temporary file
+                    actual_file_path = temp_input_file
+                except Exception as e:
+                    logger.error(f"Failed to decode or write base64 input: {str(e)}")
+                    return debug_json_response(format_error_response(f"Error processing input file content: {str(e)}"))
+                    
+            # Handle file path mode
+            else:
+                logger.info(f"Using file path mode with input: {input_file}")
                 
-        # Handle file path mode
-        else:
-            logger.info(f"Using file path mode with input: {input_file}")
+                # Try to locate the file
+                try:
+                    actual_file_path = validate_file_exists(input_file, ".pdf")
+                    logger.info(f"File validated, using path: {actual_file_path}")
+                except Exception as e:
+                    logger.error(f"File validation error: {str(e)}")
+                    return debug_json_response(format_error_response(f"Error finding PDF file: {str(e)}"))
+            
+            # Check pdf2docx without importing it; the conversion itself imports it
+            # in the worker process
+            if not backends.available("pdf2docx"):
+                logger.error("pdf2docx is not installed")
+                return debug_json_response(format_error_response("Error importing pdf2docx library. Please ensure it's installed."))
+            
+            # Reuse the cached result if this input was converted before
+            cache_key = conversion_cache.make_key(actual_file_path, "pdf", "docx")
+            if conversion_cache.fetch(cache_key, temp_output_file):
+                logger.info("Using cached conversion result")
+            else:
+                # Perform conversion
+                logger.info(f"Starting conversion from {actual_file_path} to {temp_output_file}")
+                try:
+                    convert_pdf_to_docx_file(actual_file_path, temp_output_file)
+                    logger.info("Conversion completed successfully")
+                    conversion_cache.store(cache_key, temp_output_file)
+                except Exception as e:
+                    logger.error(f"Conversion error: {str(e)}")
+                    return debug_json_response(format_error_response(f"Error during PDF to DOCX conversion: {str(e)}"))
             
-            # Try to locate the file
+            # Verify the output file exists
+            if not os.path.exists(temp_output_file):
+                logger.error(f"Output file not found after conversion: {temp_output_file}")
+                return debug_json_response(format_error_response(f"Conversion failed: Output file not found"))
+            
+            # Return base64 encoded DOCX
+            logger.info("Delivering converted DOCX file")
             try:
-                actual_file_path = validate_file_exists(input_file, ".pdf")
-                logger.info(f"File validated, using path: {actual_file_path}")
+                response = deliver_output(temp_output_file, output_mode)
+                logger.info("Successfully delivered converted DOCX file")
+                return debug_json_response(response)
             except Exception as e:
-                logger.error(f"File validation error: {str(e)}")
-                
-                # Clean up temp directory before returning
-                try:
-                    import shutil
-                    shutil.rmtree(temp_dir)
-                except:
-                    pass
-                    
-                return debug_json_response(format_error_response(f"Error finding PDF file: {str(e)}"))
+                logger.error(f"Error encoding DOCX file: {str(e)}")
+                return debug_json_response(format_error_response(f"Error reading converted DOCX file: {str(e)}"))
+    
+    except Exception as e:
+        logger.error(f"Unexpected error in convert_pdf_to_docx: {str(e)}")
+        return debug_json_response(format_error_response(f"Error converting PDF to DOCX: {str(e)}"))
+
+# In-memory image conversion configuration
+# Images up to this many bytes are decoded, converted and encoded in memory; larger ones use temp files
+IMAGE_MEMORY_THRESHOLD = int(os.environ.get("FILE_CONVERTER_IMAGE_MEMORY_THRESHOLD", str(16 * 1024 * 1024)))
+
+def convert_image_in_memory(input_file: str, file_content_base64: str, input_format: str,
+                            output_format: str, output_mode: str, options: dict = None) -> dict:
+    """
+    Convert a small image without touching disk for intermediate data: base64
+    input is decoded into memory (or a small file read once), converted from and
+    into BytesIO buffers, and the result is encoded or stored straight from memory.
+    
+    Returns the response, or None if the image is above IMAGE_MEMORY_THRESHOLD or
+    the input cannot be read directly, in which case the file-based path applies.
+    """
+    if file_content_base64:
+        if not input_format or len(file_content_base64) // 4 * 3 > IMAGE_MEMORY_THRESHOLD:
+            return None
+        data = base64_codec.decode_bytes(file_content_base64)
+    else:
+        try:
+            actual_file_path = validate_file_exists(input_file)
+            if os.path.getsize(actual_file_path) > IMAGE_MEMORY_THRESHOLD:
+                return None
+            with open(actual_file_path, "rb") as file:
+                data = file.read()
+        except Exception:
+            return None
+        input_format = input_format or os.path.splitext(actual_file_path)[1].lstrip(".")
+    
+    cache_key = conversion_cache.make_bytes_key(data, input_format, output_format, options)
+    converted = conversion_cache.get(cache_key)
+    if converted is not None:
+        logger.info("Using cached conversion result")
+    else:
+        converted = conversion_executor.run_in_process(image_bytes_backend, data, output_format, options)
+        conversion_cache.put(cache_key, converted)
+    logger.info(f"Converted {len(data)} byte image to {output_format} in memory")
+    return deliver_bytes(converted, output_format, output_mode)
+
+# Image format conversion tool
+@async_tool("convert_image")
+def convert_image(input_file: str = None, file_content_base64: str = None, output_format: str = None, input_format: str = None, output_mode: str = None,
+                  max_width: int = None, max_height: int = None, quality: int = None, progressive: bool = False,
+                  optimize: bool = False, png_compress_level: int = None, strip_metadata: bool = False,
+                  frames: list[int] = None) -> dict:
+    """
+    Convert an image file to another format, optionally resizing and re-encoding it.
+    Supports both file path and direct file content input. Animated GIF/WebP/PNG and
+    multi-page TIFF keep all their frames when the output format can hold several;
+    PDF output gets one page per frame.
+    
+    Args:
+        input_file: Path to the image file to convert, or an upload:// handle from finish_upload. Optional if providing file_content_base64.
+        file_content_base64: Base64 encoded content of the image file. Optional if providing input_file.
+        output_format: Target format (e.g., "png", "jpg", "webp", "pdf").
+        input_format: Source format (e.g., "png", "jpg"). Only required when using file_content_base64.
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
+        max_width: Maximum width in pixels; the image is shrunk to fit, keeping its aspect ratio.
+        max_height: Maximum height in pixels; the image is shrunk to fit, keeping its aspect ratio.
+        quality: JPEG/WebP quality from 1 to 100.
+        progressive: Write a progressive JPEG.
+        optimize: Let the JPEG/PNG/GIF encoder optimize its output (slower, smaller).
+        png_compress_level: PNG zlib compression level from 0 (none) to 9 (smallest).
+        strip_metadata: Remove EXIF, ICC, XMP and comments, applying the EXIF orientation first.
+        frames: 0-based indexes of frames (or pages) to convert, each to its own output. Negative
+            indexes count from the end, and a frame selected twice is converted once. Defaults to the whole image.
+        
+    Returns:
+        Dictionary containing success status and either the converted image (base64 encoded or as a file reference) or error message.
+        When several frames are selected, "frames" lists one result per frame.
+    """
+    try:
+        logger.info(f"Starting image conversion to {output_format}")
+        
+        # Validate that at least one input method is provided
+        if input_file is None and file_content_base64 is None:
+            logger.error("No input provided: both input_file and file_content_base64 are None")
+            return debug_json_response(format_error_response("You must provide either input_file or file_content_base64"))
         
-        # Import pdf2docx here to avoid dependency if not needed
+        # Validate the output mode before doing any work
         try:
-            from pdf2docx import Converter
-            logger.info("Successfully imported pdf2docx")
-        except ImportError as e:
-            logger.error(f"Failed to import pdf2docx: {str(e)}")
+            output_mode = resolve_output_mode(output_mode)
+        except ValueError as e:
+            return debug_json_response(format_error_response(str(e)))
             
-            # Clean up temp directory before returning
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response("Error importing pdf2docx library. Please ensure it's installed."))
+        # Check if output format is valid
+        valid_formats = ["jpg", "jpeg", "png", "webp", "gif", "bmp", "tiff", "pdf"]
+        if not output_format or output_format.lower() not in valid_formats:
+            logger.error(f"Invalid output format: {output_format}")
+            return debug_json_response(format_error_response(f"Unsupported output format: {output_format}. Supported formats: {', '.join(valid_formats)}"))
         
-        # Perform conversion
-        logger.info(f"Starting conversion from {actual_file_path} to {temp_output_file}")
+        # Check processing options before doing any work
         try:
-            cv = Converter(actual_file_path)
-            cv.convert(temp_output_file)
-            cv.close()
-            logger.info("Conversion completed successfully")
-        except Exception as e:
-            logger.error(f"Conversion error: {str(e)}")
-            
-            # Clean up temp directory before returning
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response(f"Error during PDF to DOCX conversion: {str(e)}"))
+            options = validate_image_options(max_width, max_height, quality, progressive, optimize,
+                                             png_compress_level, strip_metadata)
+        except ValueError as e:
+            return debug_json_response(format_error_response(str(e)))
         
-        # Verify the output file exists
-        if not os.path.exists(temp_output_file):
-            logger.error(f"Output file not found after conversion: {temp_output_file}")
-            
-            # Clean up temp directory before returning
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response(f"Conversion failed: Output file not found"))
+        # Small images are converted in memory, without temporary files
+        if not frames:
+            response = convert_image_in_memory(input_file, file_content_base64, input_format, output_format, output_mode, options)
+            if response is not None:
+                return debug_json_response(response)
         
-        # Return base64 encoded DOCX
-        logger.info("Encoding DOCX file as base64")
-        try:
-            encoded_data = get_base64_encoded_file(temp_output_file)
-            logger.info("Successfully encoded DOCX file")
+        # Need input format when using content mode
+        if file_content_base64 and not input_format:
+            logger.error("input_format is required when using file_content_base64")
+            return debug_json_response(format_error_response("input_format is required when using file_content_base64"))
+        
+        # The workspace is released on every return path below
+        with workspaces.workspace() as temp_dir:
+            logger.info(f"Using workspace: {temp_dir}")
+            temp_output_file = os.path.join(temp_dir, f"output.{output_format.lower()}")
             
-            # Clean up temp directory
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-                logger.info(f"Cleaned up temporary directory: {temp_dir}")
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary directory: {str(e)}")
+            # Handle direct content mode
+            if file_content_base64:
+                logger.info("Using direct content mode (base64 input)")
+                temp_input_file = os.path.join(temp_dir, f"input.{input_format.lower()}")
+                try:
+                    # Decode base64 content straight to a temporary file
+                    decode_base64_to_file(file_content_base64, temp_input_file)
+                    logger.info(f"Successfully wrote input file from base64: {temp_input_file}")
+                    
+                    # Set actual file path to our temporary file
+                    actual_file_path = temp_input_file
+                except Exception as e:
+                    logger.error(f"Failed to decode or write base64 input: {str(e)}")
+                    return debug_json_response(format_error_response(f"Error processing input file content: {str(e)}"))
+                    
+            # Handle file path mode
+            else:
+                logger.info(f"Using file path mode with input: {input_file}")
                 
-            return debug_json_response(format_success_response(encoded_data))
-        except Exception as e:
-            logger.error(f"Error encoding DOCX file: {str(e)}")
+                # Try to locate the file
+                try:
+                    actual_file_path = validate_file_exists(input_file)
+                    logger.info(f"File validated, using path: {actual_file_path}")
+                    
+                    # Detect input format from file extension if not explicitly provided
+                    if not input_format:
+                        input_format = os.path.splitext(actual_file_path)[1].lstrip('.')
+                        logger.info(f"Detected input format from file extension: {input_format}")
+                except Exception as e:
+                    logger.error(f"File validation error: {str(e)}")
+                    return debug_json_response(format_error_response(f"Error finding input image file: {str(e)}"))
+            
+            # Check PIL without importing it; the conversion itself imports it in
+            # the worker process
+            if not backends.available("PIL"):
+                logger.error("PIL is not installed")
+                return debug_json_response(format_error_response("Error importing PIL library. Please ensure pillow is installed."))
             
-            # Clean up temp directory before returning
+            # Selected frames are written to separate outputs
+            if frames:
+                try:
+                    exports = conversion_executor.run_in_process(
+                        image_frames_backend, actual_file_path, temp_dir, output_format, frames, options)
+                    logger.info(f"Converted {len(exports)} frame(s) of {actual_file_path}")
+                    if len(exports) == 1:
+                        return debug_json_response(
+                            dict(deliver_output(exports[0]["file"], output_mode), frame=exports[0]["frame"]))
+                    return debug_json_response({
+                        "success": True,
+                        "frames": [dict(deliver_output(export["file"], output_mode), frame=export["frame"])
+                                   for export in exports],
+                    })
+                except Exception as e:
+                    logger.error(f"Conversion error: {str(e)}")
+                    return debug_json_response(format_error_response(f"Error during image conversion: {str(e)}"))
+            
+            # Reuse the cached result if this input was converted before
+            cache_key = conversion_cache.make_key(actual_file_path, input_format, output_format, options)
+            if conversion_cache.fetch(cache_key, temp_output_file):
+                logger.info("Using cached conversion result")
+            else:
+                # Perform conversion
+                logger.info(f"Starting image conversion from {actual_file_path} to {temp_output_file}")
+                try:
+                    conversion_executor.run_in_process(image_backend, actual_file_path, temp_output_file, output_format, options)
+                    logger.info("Conversion completed successfully")
+                    conversion_cache.store(cache_key, temp_output_file)
+                except Exception as e:
+                    logger.error(f"Conversion error: {str(e)}")
+                    return debug_json_response(format_error_response(f"Error during image conversion: {str(e)}"))
+            
+            # Verify the output file exists
+            if not os.path.exists(temp_output_file):
+                logger.error(f"Output file not found after conversion: {temp_output_file}")
+                return debug_json_response(format_error_response(f"Conversion failed: Output file not found"))
+            
+            # Return base64 encoded image
+            logger.info("Delivering converted image")
             try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response(f"Error reading converted DOCX file: {str(e)}"))
+                response = deliver_output(temp_output_file, output_mode)
+                logger.info("Successfully delivered converted image")
+                return debug_json_response(response)
+            except Exception as e:
+                logger.error(f"Error encoding output image: {str(e)}")
+                return debug_json_response(format_error_response(f"Error reading converted image file: {str(e)}"))
     
     except Exception as e:
-        logger.error(f"Unexpected error in convert_pdf_to_docx: {str(e)}")
-        return debug_json_response(format_error_response(f"Error converting PDF to DOCX: {str(e)}"))
+        logger.error(f"Unexpected error in convert_image: {str(e)}")
+        return debug_json_response(format_error_response(f"Error converting image: {str(e)}"))
 
-# Image format conversion tool
-@mcp.tool("convert_image")
-def convert_image(input_file: str = None, file_content_base64: str = None, output_format: str = None, input_format: str = None) -> dict:
+# Excel to CSV conversion tool
+@async_tool("excel2csv")
+def convert_excel_to_csv(input_file: str, output_mode: str = None, sheets: list[str] = None,
+                         all_sheets: bool = False, archive: bool = False) -> dict:
+    """
+    Convert an Excel file (XLS/XLSX) to CSV format. Rows are streamed, so memory use
+    does not grow with the size of the workbook.
+    
+    Args:
+        input_file: Path to the Excel file to convert, or an upload:// handle from finish_upload.
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
+        sheets: Names (or 0-based indexes) of the sheets to export. Defaults to the first sheet.
+        all_sheets: Export every sheet of the workbook.
+        archive: Return the CSV files of all exported sheets as a single zip archive.
+        
+    Returns:
+        Dictionary containing success status and either the converted CSV (base64 encoded or as a file reference) or error message.
+        When several sheets are exported without archive, "sheets" lists one result per sheet.
+    """
+    try:
+        output_mode = resolve_output_mode(output_mode)
+        
+        # Validate input file
+        if is_upload_handle(input_file):
+            input_file = uploads.resolve(input_file)
+        if not input_file.lower().endswith(('.xls', '.xlsx')):
+            raise ValueError(f"File must be an Excel file (.xls or .xlsx), got: {input_file}")
+        actual_file_path = validate_file_exists(input_file)
+        stem = os.path.splitext(os.path.basename(actual_file_path))[0]
+        single_output = archive or not (all_sheets or (sheets and len(sheets) > 1))
+        
+        # Reuse the cached result if this input was converted before
+        input_format = os.path.splitext(actual_file_path)[1].lstrip(".")
+        output_format = "zip" if archive else "csv"
+        cache_key = conversion_cache.make_key(actual_file_path, input_format, output_format,
+                                              {"sheets": sheets, "all_sheets": all_sheets})
+        temp_dir = make_temp_dir()
+        output_file = os.path.join(temp_dir, f"{stem}.{output_format}")
+        if single_output and conversion_cache.fetch(cache_key, output_file):
+            logger.info("Using cached conversion result")
+            return debug_json_response(deliver_output(output_file, output_mode))
+        
+        # Perform conversion
+        result = conversion_executor.run_in_process(
+            excel_to_csv_backend, actual_file_path, temp_dir, stem, sheets, all_sheets, archive, progress=True)
+        logger.info(f"Exported {len(result['sheets'])} sheet(s) from {actual_file_path}")
+        
+        if result["archive"]:
+            conversion_cache.store(cache_key, result["archive"])
+            response = deliver_output(result["archive"], output_mode)
+            response["sheets"] = result["sheets"]
+            return debug_json_response(response)
+        if single_output:
+            export = result["sheets"][0]
+            conversion_cache.store(cache_key, export["file"])
+            response = deliver_output(export["file"], output_mode)
+            response.update({"sheet": export["sheet"], "rows": export["rows"]})
+            return debug_json_response(response)
+        
+        return debug_json_response({
+            "success": True,
+            "sheets": [dict(deliver_output(export["file"], output_mode), sheet=export["sheet"], rows=export["rows"])
+                       for export in result["sheets"]],
+        })
+    
+    except Exception as e:
+        return debug_json_response(format_error_response(f"Error converting Excel to CSV: {str(e)}"))
+
+# Tabular conversion tool
+@async_tool("convert_table")
+def convert_table(input_file: str = None, file_content_base64: str = None, input_format: str = None,
+                  output_format: str = "parquet", columns: list[str] = None, filters: list[list] = None,
+                  sheet: str = None, output_mode: str = None) -> dict:
+    """
+    Convert a spreadsheet or CSV file (XLSX/XLS/CSV) to Parquet, Feather (Arrow IPC),
+    JSON Lines or CSV. The first row holds the column names. Rows are streamed, and
+    column selection and row filters are applied while reading.
+    
+    Args:
+        input_file: Path to the file to convert, or an upload:// handle from finish_upload. Optional if providing file_content_base64.
+        file_content_base64: Base64 encoded content of the file. Optional if providing input_file.
+        input_format: Source format ("xlsx", "xls" or "csv"). Only required when using file_content_base64.
+        output_format: Target format: "parquet" (default), "feather"/"arrow", "jsonl" or "csv".
+        columns: Names of the columns to keep, in output order. Defaults to all columns.
+        filters: Row filters as [column, operator, value] triples that must all match, e.g.
+            [["country", "==", "NL"], ["amount", ">", 100]]. Operators: ==, !=, <, <=, >, >=,
+            in, not in, contains.
+        sheet: Name (or 0-based index) of the sheet to read from a workbook. Defaults to the first sheet.
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
+        
+    Returns:
+        Dictionary containing success status and either the converted table (base64 encoded or as a
+        file reference) with its columns and row counts, or error message.
+    """
+    try:
+        output_mode = resolve_output_mode(output_mode)
+        
+        # Validate that at least one input method is provided
+        if input_file is None and file_content_base64 is None:
+            return debug_json_response(format_error_response("You must provide either input_file or file_content_base64"))
+        output_format = (output_format or "").lower()
+        if output_format not in TABLE_OUTPUT_FORMATS:
+            return debug_json_response(format_error_response(
+                f"Unsupported output format: {output_format}. Supported formats: {', '.join(TABLE_OUTPUT_FORMATS)}"))
+        
+        temp_dir = make_temp_dir()
+        if file_content_base64:
+            if not input_format:
+                return debug_json_response(format_error_response("input_format is required when using file_content_base64"))
+            actual_file_path = os.path.join(temp_dir, f"input.{input_format.lower()}")
+            decode_base64_to_file(file_content_base64, actual_file_path)
+        else:
+            actual_file_path = validate_file_exists(input_file)
+            input_format = os.path.splitext(actual_file_path)[1].lstrip(".")
+        input_format = input_format.lower()
+        if input_format not in TABLE_INPUT_FORMATS:
+            return debug_json_response(format_error_response(
+                f"Unsupported input format: {input_format}. Supported formats: {', '.join(TABLE_INPUT_FORMATS)}"))
+        
+        stem = os.path.splitext(os.path.basename(actual_file_path if is_upload_handle(input_file) else input_file or "table"))[0]
+        output_file = os.path.join(temp_dir, f"{stem}.{output_format}")
+        options = {"columns": columns, "filters": filters, "sheet": sheet}
+        cache_key = conversion_cache.make_key(actual_file_path, input_format, output_format, options)
+        if conversion_cache.fetch(cache_key, output_file):
+            logger.info("Using cached conversion result")
+            return debug_json_response(deliver_output(output_file, output_mode))
+        
+        # Perform conversion
+        result = conversion_executor.run_in_process(
+            table_backend, actual_file_path, output_file, output_format, columns, filters, sheet, progress=True)
+        logger.info(f"Wrote {result['rows_written']} of {result['rows_read']} rows to {output_format}")
+        conversion_cache.store(cache_key, output_file)
+        
+        response = deliver_output(output_file, output_mode)
+        response.update(result)
+        return debug_json_response(response)
+    
+    except Exception as e:
+        return debug_json_response(format_error_response(f"Error converting table: {str(e)}"))
+
+# Markdown rendering configuration
+# Python-Markdown extensions enabled when rendering Markdown
+MARKDOWN_EXTENSIONS = [name.strip() for name in os.environ.get(
+    "FILE_CONVERTER_MARKDOWN_EXTENSIONS", "tables,fenced_code,toc").split(",") if name.strip()]
+# CSS file replacing the built-in stylesheet of rendered Markdown
+MARKDOWN_CSS_FILE = os.environ.get("FILE_CONVERTER_MARKDOWN_CSS", "")
+# Render Markdown section by section, reusing the HTML of sections that did not change
+MARKDOWN_INCREMENTAL = os.environ.get("FILE_CONVERTER_MARKDOWN_INCREMENTAL", "1").lower() not in ("0", "false", "no", "off")
+# Size limit of the in-memory cache of rendered sections
+MARKDOWN_FRAGMENT_CACHE_BYTES = int(os.environ.get("FILE_CONVERTER_MARKDOWN_FRAGMENT_CACHE_BYTES", str(32 * 1024 * 1024)))
+# Markdown documents with at least this many sections are composed from cached per-section PDFs (0 disables)
+MARKDOWN_SECTION_PAGES = int(os.environ.get("FILE_CONVERTER_MARKDOWN_SECTION_PAGES", "0"))
+
+# Stylesheet of rendered Markdown
+MARKDOWN_STYLESHEET = """
+body { font-family: Arial, sans-serif; line-height: 1.6; max-width: 800px; margin: 0 auto; padding: 20px; }
+h1, h2, h3, h4, h5, h6 { color: #333; margin-top: 24px; }
+code { background-color: #f0f0f0; padding: 2px 4px; border-radius: 3px; }
+pre { background-color: #f0f0f0; padding: 10px; border-radius: 5px; overflow-x: auto; }
+blockquote { border-left: 4px solid #ddd; padding-left: 16px; margin-left: 0; }
+img { max-width: 100%; }
+table { border-collapse: collapse; width: 100%; }
+th, td { border: 1px solid #ddd; padding: 8px; }
+tr:nth-child(even) { background-color: #f2f2f2; }
+"""
+
+# HTML page wrapping rendered Markdown
+MARKDOWN_HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Converted Markdown</title>
+    <style>{stylesheet}</style>
+</head>
+<body>
+{html_content}
+</body>
+</html>
+"""
+
+# HTML to PDF engine configuration
+# "weasyprint" or "xhtml2pdf" (rendered in-process), "wkhtmltopdf" (one process per document),
+# or "auto" (the first installed in-process engine, else wkhtmltopdf)
+HTML2PDF_ENGINE = os.environ.get("FILE_CONVERTER_HTML2PDF_ENGINE", "auto").lower()
+# Render in the long-lived process pool workers instead of the calling thread
+HTML2PDF_POOLED = os.environ.get("FILE_CONVERTER_HTML2PDF_POOLED", "0").lower() not in ("0", "false", "no", "off")
+
+# Per-thread WeasyPrint font configuration and parsed stylesheets, kept between documents
+weasyprint_state = threading.local()
+
+def html_with_head(html: str, markup: str) -> str:
+    """Insert markup at the start of the document's <head>, adding one if needed."""
+    match = re.search(r"<head(\s[^>]*)?>", html, re.IGNORECASE)
+    if match:
+        return html[:match.end()] + markup + html[match.end():]
+    return f"<head>{markup}</head>{html}"
+
+def document_base_path(input_path: str) -> str:
+    """
+    Return input_path as the base that a document's relative links resolve
+    against, or None when it is client-supplied content or an upload, which
+    may not read local files.
+    """
+    directory = os.path.realpath(os.path.dirname(os.path.abspath(input_path)))
+    for root in (WORKSPACE_DIR, UPLOAD_DIR):
+        root = os.path.realpath(root)
+        if directory == root or directory.startswith(root + os.sep):
+            return None
+    return input_path
+
+def local_read_allowed(url: str, base_path: str = None) -> bool:
+    """Return whether a document rendered with base_path may read a file: URL."""
+    if not base_path:
+        return False
+    base_dir = os.path.realpath(os.path.dirname(os.path.abspath(base_path)))
+    path = os.path.realpath(urllib.request.url2pathname(urllib.parse.urlsplit(url).path))
+    return path == base_dir or path.startswith(base_dir.rstrip(os.sep) + os.sep)
+
+# Link targets in HTML attributes, CSS url() and Markdown links or images
+LINKED_ASSET_PATTERN = re.compile(r"""(?:\b(?:src|href)\s*=\s*["']|\burl\(\s*["']?|\]\(\s*<?)([^"'()<>\s]+)""", re.IGNORECASE)
+
+def linked_asset_stamps(input_path: str) -> list:
+    """
+    Return [path, mtime_ns, size] of every local file that the document at
+    input_path links to and may read when rendered, so that its cache key
+    changes when an image or stylesheet beside it is edited. Remote and
+    missing links are skipped.
+    """
+    base_path = document_base_path(input_path)
+    if base_path is None:
+        return []
+    base_dir = os.path.dirname(os.path.abspath(input_path))
+    with open(input_path, encoding="utf-8", errors="replace") as file:
+        links = LINKED_ASSET_PATTERN.findall(file.read())
+    stamps = {}
+    for link in links:
+        parts = urllib.parse.urlsplit(link)
+        if parts.scheme == "file":
+            path = urllib.request.url2pathname(parts.path)
+        elif not parts.scheme and not parts.netloc and parts.path:
+            path = os.path.join(base_dir, urllib.request.url2pathname(parts.path))
+        else:
+            continue
+        path = os.path.realpath(path)
+        if path in stamps or not os.path.isfile(path) or not local_read_allowed(Path(path).as_uri(), base_path):
+            continue
+        stat = os.stat(path)
+        stamps[path] = [stat.st_mtime_ns, stat.st_size]
+    return [[path] + stamp for path, stamp in sorted(stamps.items())]
+
+def weasyprint_url_fetcher(weasyprint, base_path: str = None):
+    """Return a WeasyPrint URL fetcher that reads local files only under the directory of base_path."""
+    def check(url):
+        if url.lower().startswith("file:") and not local_read_allowed(url, base_path):
+            raise ValueError(f"Local file access is not allowed: {url}")
+    if not hasattr(weasyprint, "URLFetcher"):
+        # Older WeasyPrint releases take a plain function
+        def fetch(url, *args, **kwargs):
+            check(url)
+            return weasyprint.default_url_fetcher(url, *args, **kwargs)
+        return fetch
+    class RestrictedURLFetcher(weasyprint.URLFetcher):
+        def fetch(self, url, headers=None):
+            check(url)
+            return super().fetch(url, headers)
+    return RestrictedURLFetcher()
+
+def load_weasyprint():
+    # WeasyPrint prints missing system library hints to stdout, which carries the MCP stdio protocol
+    with contextlib.redirect_stdout(sys.stderr):
+        return backends.load("weasyprint")
+
+def render_html_weasyprint(html: str, output_path: str, base_path: str = None, stylesheet: str = None):
+    weasyprint = load_weasyprint()
+    from weasyprint.text.fonts import FontConfiguration
+    if not hasattr(weasyprint_state, "font_config"):
+        weasyprint_state.font_config = FontConfiguration()
+        weasyprint_state.stylesheets = {}
+    stylesheets = []
+    if stylesheet:
+        css = weasyprint_state.stylesheets.get(stylesheet)
+        if css is None:
+            css = weasyprint.CSS(string=stylesheet, font_config=weasyprint_state.font_config)
+            weasyprint_state.stylesheets[stylesheet] = css
+        stylesheets.append(css)
+    url_fetcher = weasyprint_url_fetcher(weasyprint, base_path)
+    weasyprint.HTML(string=html, base_url=base_path, url_fetcher=url_fetcher).write_pdf(
+        output_path, stylesheets=stylesheets, font_config=weasyprint_state.font_config)
+
+def render_html_xhtml2pdf(html: str, output_path: str, base_path: str = None, stylesheet: str = None):
+    backends.load("xhtml2pdf")
+    from xhtml2pdf import pisa
+    from xhtml2pdf.config.resources import ResourceAccessPolicy
+    if stylesheet:
+        html = html_with_head(html, f"<style>{stylesheet}</style>")
+    # Local reads are confined to the source directory, and denied without one
+    base_dir = os.path.dirname(os.path.abspath(base_path)) if base_path else None
+    policy = ResourceAccessPolicy(base_dir=Path(base_dir) if base_dir else None)
+    with open(output_path, "wb") as output:
+        status = pisa.CreatePDF(html, dest=output, path=base_path, encoding="utf-8", resource_policy=policy)
+    if status.err:
+        raise RuntimeError(f"xhtml2pdf failed to render the document ({status.err} errors)")
+
+def render_html_wkhtmltopdf(html: str, output_path: str, base_path: str = None, stylesheet: str = None):
+    pdfkit = backends.load("pdfkit")
+    options = {"disable-local-file-access": ""}
+    if stylesheet:
+        html = html_with_head(html, f"<style>{stylesheet}</style>")
+    if base_path:
+        # The document is piped to wkhtmltopdf, so relative links need a base, and
+        # file access is allowed for the source directory only
+        html = html_with_head(html, f'<base href="{Path(base_path).resolve().as_uri()}">')
+        options["allow"] = str(Path(base_path).resolve().parent)
+    pdfkit.from_string(html, output_path, options=options)
+
+# Renderers by engine name
+HTML2PDF_RENDERERS = {
+    "weasyprint": render_html_weasyprint,
+    "xhtml2pdf": render_html_xhtml2pdf,
+    "wkhtmltopdf": render_html_wkhtmltopdf,
+}
+
+@functools.lru_cache(maxsize=None)
+def get_html2pdf_engine() -> str:
+    """
+    Return the HTML to PDF engine to use. "auto" prefers an in-process engine,
+    which avoids starting a wkhtmltopdf process for every document.
+    """
+    if HTML2PDF_ENGINE in HTML2PDF_RENDERERS:
+        return HTML2PDF_ENGINE
+    for engine in ("weasyprint", "xhtml2pdf"):
+        if backends.available(engine):
+            try:
+                load_weasyprint() if engine == "weasyprint" else backends.load(engine)
+                return engine
+            except OSError as e:
+                # WeasyPrint is importable only with the Pango system libraries installed
+                logger.warning(f"Skipping HTML to PDF engine {engine}: {str(e)}")
+    return "wkhtmltopdf"
+
+def render_html_to_pdf(engine: str, html: str, output_path: str, base_path: str = None, stylesheet: str = None):
+    HTML2PDF_RENDERERS[engine](html, output_path, base_path, stylesheet)
+
+@timed_stage("convert")
+def html_to_pdf_backend(html: str, output_path: str, base_path: str = None, stylesheet: str = None):
+    """
+    Render an HTML document held in memory to a PDF at output_path with the
+    configured engine. Relative links resolve against base_path (the source
+    file), and local files can be read only from its directory, or not at all
+    without one; stylesheet is extra CSS applied to the document.
+    """
+    engine = get_html2pdf_engine()
+    if HTML2PDF_POOLED:
+        conversion_executor.run_in_process(render_html_to_pdf, engine, html, output_path, base_path, stylesheet)
+    else:
+        render_html_to_pdf(engine, html, output_path, base_path, stylesheet)
+
+@functools.lru_cache(maxsize=None)
+def markdown_stylesheet() -> str:
+    """Return the stylesheet of rendered Markdown, read once from MARKDOWN_CSS_FILE if set."""
+    if MARKDOWN_CSS_FILE:
+        with open(MARKDOWN_CSS_FILE, encoding="utf-8") as css_file:
+            return css_file.read()
+    return MARKDOWN_STYLESHEET
+
+@functools.lru_cache(maxsize=None)
+def markdown_page_parts(inline_stylesheet: bool) -> tuple:
+    """
+    Return the page template formatted once and split around the content, so
+    that a page is built by concatenation instead of formatting the template.
+    """
+    page = MARKDOWN_HTML_TEMPLATE.format(
+        html_content="\0", stylesheet=markdown_stylesheet() if inline_stylesheet else "")
+    prefix, suffix = page.split("\0")
+    return prefix, suffix
+
+# Per-thread Markdown converter, reset between documents instead of rebuilt with its extensions
+markdown_state = threading.local()
+
+def markdown_converter():
+    converter = getattr(markdown_state, "converter", None)
+    if converter is None:
+        converter = backends.load("markdown").Markdown(extensions=MARKDOWN_EXTENSIONS)
+        markdown_state.converter = converter
+    return converter.reset()
+
+class FragmentCache:
+    """
+    In-memory LRU of rendered HTML fragments keyed by a hash of their Markdown
+    source, bounded in bytes.
+    """
+    
+    def __init__(self, max_bytes: int = MARKDOWN_FRAGMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+    
+    def get(self, key: str) -> str:
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return html
+    
+    def put(self, key: str, html: str):
+        if len(html) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = html
+            self._size += len(html)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "hits": self._hits, "misses": self._misses}
+
+# Shared cache of rendered Markdown sections
+markdown_fragments = FragmentCache()
+
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})[ \t]+(.*?)[ \t#]*$")
+# Underline of a setext heading, which makes the line before it a heading
+MARKDOWN_SETEXT_UNDERLINE = re.compile(r"^[=-]+[ ]*$")
+MARKDOWN_FENCE = re.compile(r"^[ \t]{0,3}(`{3,}|~{3,})")
+# Constructs whose rendering depends on other sections: link references, footnotes,
+# abbreviations, a [TOC] marker and raw HTML blocks (which may contain headings)
+MARKDOWN_CROSS_SECTION = re.compile(r"^ {0,3}(\[[^\]]+\]:|\[\^|\*\[|\[TOC\]|<[A-Za-z!/])", re.MULTILINE)
+MARKDOWN_ELEMENT_ID = re.compile(r"""\sid=["']([^"']*)["']""")
+
+def split_markdown_sections(md_content: str) -> list:
+    """
+    Split Markdown at its ATX and setext headings (outside fenced code) into
+    sections that render to the same HTML on their own as within the document.
+    Returns None if the document cannot be split that way or has a single section.
+    """
+    if MARKDOWN_CROSS_SECTION.search(md_content):
+        return None
+    slugify = importlib.import_module("markdown.extensions.toc").slugify
+    sections, current, fence, slugs = [], [], None, set()
+    # Whether the previous line could be the text of a setext heading, which must
+    # start a block, and whether the current line starts one
+    previous_text, block_start = False, True
+    
+    def start_section(text: str, lines: list) -> bool:
+        # Repeated heading ids are numbered in document order, which only a full render does
+        slug = slugify(text, "-")
+        if slug in slugs:
+            return False
+        slugs.add(slug)
+        if lines:
+            sections.append("".join(lines))
+        return True
+    
+    for line in md_content.splitlines(keepends=True):
+        fence_match = MARKDOWN_FENCE.match(line)
+        stripped = line.rstrip("\r\n")
+        if fence is not None:
+            if fence_match and fence_match.group(1)[0] == fence[0] and len(fence_match.group(1)) >= len(fence):
+                fence = None
+            previous_text, block_start = False, False
+        elif fence_match:
+            fence = fence_match.group(1)
+            previous_text, block_start = False, False
+        elif MARKDOWN_HEADING.match(stripped):
+            if not start_section(MARKDOWN_HEADING.match(stripped).group(2), current):
+                return None
+            current = []
+            previous_text, block_start = False, True
+        elif previous_text and MARKDOWN_SETEXT_UNDERLINE.match(stripped):
+            # The heading text line moves to the new section
+            text_line = current.pop()
+            if not start_section(text_line.strip(), current):
+                return None
+            current = [text_line]
+            previous_text, block_start = False, False
+        else:
+            blank = not stripped.strip()
+            previous_text = block_start and not blank and not stripped.startswith(("    ", "\t"))
+            block_start = blank
+        current.append(line)
+    if current:
+        sections.append("".join(current))
+    return sections if len(sections) > 1 else None
+
+def render_markdown_fragment(section: str) -> str:
+    """Render one Markdown section to HTML, reusing the cached fragment if it is unchanged."""
+    key = hashlib.sha256(section.encode("utf-8")).hexdigest()
+    html = markdown_fragments.get(key)
+    if html is None:
+        html = markdown_converter().convert(section)
+        markdown_fragments.put(key, html)
+    return html
+
+def render_markdown_sections(sections: list) -> list:
+    """
+    Render the sections of a document to HTML fragments. Returns None if two
+    fragments share an element id: a full render would have numbered the second
+    one, so the document has to be rendered as a whole.
+    """
+    fragments = [render_markdown_fragment(section) for section in sections]
+    ids = set()
+    for fragment in fragments:
+        for element_id in MARKDOWN_ELEMENT_ID.findall(fragment):
+            if element_id in ids:
+                return None
+            ids.add(element_id)
+    return fragments
+
+def markdown_sections_to_pdf(sections: list, fragments: list, output_path: str, base_path: str = None):
+    """
+    Render each section (given as Markdown and as its HTML fragment) to PDF pages
+    of its own and merge them, reusing the pages of unchanged sections from the
+    result cache. Every section starts on a new page.
+    """
+    pymupdf = backends.load("pymupdf")
+    engine = get_html2pdf_engine()
+    stylesheet = markdown_stylesheet()
+    prefix, suffix = markdown_page_parts(False)
+    base_dir = os.path.dirname(os.path.abspath(base_path)) if base_path else None
+    options = {
+        "engine": engine,
+        "extensions": MARKDOWN_EXTENSIONS,
+        "stylesheet": hashlib.sha256(stylesheet.encode("utf-8")).hexdigest(),
+        "base": base_dir,
+    }
+    rendered = 0
+    merged = pymupdf.open()
+    try:
+        with workspaces.workspace() as temp_dir:
+            for index, section in enumerate(sections):
+                check_cancelled()
+                key = conversion_cache.make_bytes_key(section.encode("utf-8"), "md", "pdf", options)
+                data = conversion_cache.get(key)
+                if data is None:
+                    section_path = os.path.join(temp_dir, f"section_{index}.pdf")
+                    html_to_pdf_backend(prefix + fragments[index] + suffix, section_path,
+                                        base_path=base_path, stylesheet=stylesheet)
+                    with open(section_path, "rb") as section_file:
+                        data = section_file.read()
+                    conversion_cache.put(key, data)
+                    rendered += 1
+                with pymupdf.open(stream=data, filetype="pdf") as part:
+                    merged.insert_pdf(part)
+                report_status(index + 1, len(sections), f"Section {index + 1}/{len(sections)} composed")
+        # Sections embed the same fonts; drop the duplicates
+        merged.save(output_path, garbage=3, deflate=True)
+    finally:
+        merged.close()
+    logger.info(f"Composed PDF from {len(sections)} sections, {rendered} rendered and {len(sections) - rendered} cached")
+
+def markdown_to_html(md_content: str, inline_stylesheet: bool = True, standalone: bool = True) -> str:
+    """
+    Render Markdown text to a complete HTML page, optionally with the stylesheet
+    inlined, or with standalone=False to just the HTML of the content. In
+    incremental mode only sections that changed since an earlier render are
+    converted.
+    """
+    sections = split_markdown_sections(md_content) if MARKDOWN_INCREMENTAL else None
+    fragments = render_markdown_sections(sections) if sections is not None else None
+    if fragments is not None:
+        html_content = "\n".join(fragments)
+    else:
+        html_content = markdown_converter().convert(md_content)
+    if not standalone:
+        return html_content
+    prefix, suffix = markdown_page_parts(inline_stylesheet)
+    return prefix + html_content + suffix
+
+def markdown_to_pdf_backend(input_path: str, output_path: str):
+    """Render a Markdown file to PDF from memory, without writing next to the source."""
+    with open(input_path, encoding="utf-8") as md_file:
+        md_content = md_file.read()
+    if MARKDOWN_SECTION_PAGES and backends.available("pymupdf"):
+        sections = split_markdown_sections(md_content)
+        if sections is not None and len(sections) >= MARKDOWN_SECTION_PAGES:
+            fragments = render_markdown_sections(sections)
+            if fragments is not None:
+                markdown_sections_to_pdf(sections, fragments, output_path, base_path=document_base_path(input_path))
+                return
+    html = markdown_to_html(md_content, inline_stylesheet=False)
+    html_to_pdf_backend(html, output_path, base_path=document_base_path(input_path), stylesheet=markdown_stylesheet())
+
+def html_file_to_pdf_backend(input_path: str, output_path: str):
+    with open(input_path, encoding="utf-8", errors="replace") as html_file:
+        html = html_file.read()
+    html_to_pdf_backend(html, output_path, base_path=document_base_path(input_path))
+
+# HTML to PDF conversion tool
+@async_tool("html2pdf")
+def convert_html_to_pdf(input_file: str, output_mode: str = None) -> dict:
     """
-    Convert an image file to another format. Supports both file path and direct file content input.
+    Convert an HTML file to PDF format.
     
     Args:
-        input_file: Path to the image file to convert. Optional if providing file_content_base64.
-        file_content_base64: Base64 encoded content of the image file. Optional if providing input_file.
-        output_format: Target format (e.g., "png", "jpg", "webp").
-        input_format: Source format (e.g., "png", "jpg"). Only required when using file_content_base64.
+        input_file: Path to the HTML file to convert, or an upload:// handle from finish_upload.
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
         
     Returns:
-        Dictionary containing success status and either base64 encoded image or error message.
+        Dictionary containing success status and either the converted PDF (base64 encoded or as a file reference) or error message.
     """
     try:
-        logger.info(f"Starting image conversion to {output_format}")
+        output_mode = resolve_output_mode(output_mode)
         
-        # Validate that at least one input method is provided
-        if input_file is None and file_content_base64 is None:
-            logger.error("No input provided: both input_file and file_content_base64 are None")
-            return debug_json_response(format_error_response("You must provide either input_file or file_content_base64"))
-            
-        # Check if output format is valid
-        valid_formats = ["jpg", "jpeg", "png", "webp", "gif", "bmp", "tiff"]
-        if not output_format or output_format.lower() not in valid_formats:
-            logger.error(f"Invalid output format: {output_format}")
-            return debug_json_response(format_error_response(f"Unsupported output format: {output_format}. Supported formats: {', '.join(valid_formats)}"))
+        # Validate input file - for HTML, be more flexible with extensions
+        # since we might be handling Markdown files too
+        actual_file_path = validate_file_exists(input_file)
         
-        # Create temporary directory for processing files
-        temp_dir = tempfile.mkdtemp()
-        logger.info(f"Created temporary directory: {temp_dir}")
+        # Reuse the cached result if this input was converted before
+        input_format = os.path.splitext(actual_file_path)[1].lstrip(".")
+        cache_key = conversion_cache.make_key(actual_file_path, input_format, "pdf", {
+            "engine": get_html2pdf_engine(), "assets": linked_asset_stamps(actual_file_path)})
+        output_file = os.path.join(make_temp_dir(), "output.pdf")
+        if conversion_cache.fetch(cache_key, output_file):
+            logger.info("Using cached conversion result")
+            return debug_json_response(deliver_output(output_file, output_mode))
         
-        # Handle direct content mode
-        if file_content_base64:
-            logger.info("Using direct content mode (base64 input)")
-            
-            # Need input format when using content mode
-            if not input_format:
-                logger.error("input_format is required when using file_content_base64")
-                
-                # Clean up temp directory before returning
-                try:
-                    import shutil
-                    shutil.rmtree(temp_dir)
-                except:
-                    pass
-                    
-                return debug_json_response(format_error_response("input_format is required when using file_content_base64"))
-                
-            # Create a unique filename with timestamp
-            temp_input_file = os.path.join(temp_dir, f"input_{int(time.time())}.{input_format.lower()}")
-            temp_output_file = os.path.join(temp_dir, f"output_{int(time.time())}.{output_format.lower()}")
-            
-            try:
-                # Decode base64 content
-                file_content = base64.b64decode(file_content_base64)
-                
-                # Write to temporary file
-                with open(temp_input_file, "wb") as f:
-                    f.write(file_content)
-                logger.info(f"Successfully wrote input file from base64: {temp_input_file}")
-                
-                # Set actual file path to our temporary file
-                actual_file_path = temp_input_file
-            except Exception as e:
-                logger.error(f"Failed to decode or write base64 input: {str(e)}")
-                
-                # Clean up temp directory before returning
-                try:
-                    import shutil
-                    shutil.rmtree(temp_dir)
-                except:
-                    pass
-                    
-                return debug_json_response(format_error_response(f"Error processing input file content: {str(e)}"))
-                
-        # Handle file path mode
+        # Markdown is rendered from memory, so nothing is written next to the source
+        if actual_file_path.lower().endswith(('.md', '.markdown')):
+            markdown_to_pdf_backend(actual_file_path, output_file)
         else:
-            logger.info(f"Using file path mode with input: {input_file}")
-            
-            # Try to locate the file
-            try:
-                actual_file_path = validate_file_exists(input_file)
-                logger.info(f"File validated, using path: {actual_file_path}")
-                
-                # Detect input format from file extension if not explicitly provided
-                if not input_format:
-                    input_format = os.path.splitext(actual_file_path)[1].lstrip('.')
-                    logger.info(f"Detected input format from file extension: {input_format}")
-                
-                # Create output file path
-                temp_output_file = os.path.join(temp_dir, f"output_{int(time.time())}.{output_format.lower()}")
-            except Exception as e:
-                logger.error(f"File validation error: {str(e)}")
-                
-                # Clean up temp directory before returning
-                try:
-                    import shutil
-                    shutil.rmtree(temp_dir)
-                except:
-                    pass
-                    
-                return debug_json_response(format_error_response(f"Error finding input image file: {str(e)}"))
-        
-        # Import PIL here to avoid dependency if not needed
-        try:
-            from PIL import Image
-            logger.info("Successfully imported PIL")
-        except ImportError as e:
-            logger.error(f"Failed to import PIL: {str(e)}")
-            
-            # Clean up temp directory before returning
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response("Error importing PIL library. Please ensure pillow is installed."))
-        
-        # Perform conversion
-        logger.info(f"Starting image conversion from {actual_file_path} to {temp_output_file}")
-        try:
-            img = Image.open(actual_file_path)
-            
-            # Handle special cases for certain formats
-            if output_format.lower() in ['jpg', 'jpeg']:
-                # Convert to RGB if saving as JPEG (removes alpha channel)
-                if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                    logger.info("Converting image to RGB for JPEG output")
-                    background = Image.new("RGB", img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
-                    img = background
-            
-            img.save(temp_output_file)
-            logger.info("Conversion completed successfully")
-        except Exception as e:
-            logger.error(f"Conversion error: {str(e)}")
-            
-            # Clean up temp directory before returning
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response(f"Error during image conversion: {str(e)}"))
-        
-        # Verify the output file exists
-        if not os.path.exists(temp_output_file):
-            logger.error(f"Output file not found after conversion: {temp_output_file}")
-            
-            # Clean up temp directory before returning
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response(f"Conversion failed: Output file not found"))
+            html_file_to_pdf_backend(actual_file_path, output_file)
+        conversion_cache.store(cache_key, output_file)
         
-        # Return base64 encoded image
-        logger.info("Encoding output image as base64")
-        try:
-            encoded_data = get_base64_encoded_file(temp_output_file)
-            logger.info("Successfully encoded output image")
-            
-            # Clean up temp directory
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-                logger.info(f"Cleaned up temporary directory: {temp_dir}")
-            except Exception as e:
-                logger.warning(f"Failed to clean up temporary directory: {str(e)}")
-                
-            return debug_json_response(format_success_response(encoded_data))
-        except Exception as e:
-            logger.error(f"Error encoding output image: {str(e)}")
-            
-            # Clean up temp directory before returning
-            try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-                
-            return debug_json_response(format_error_response(f"Error reading converted image file: {str(e)}"))
+        # Return base64 encoded PDF
+        return debug_json_response(deliver_output(output_file, output_mode))
     
     except Exception as e:
-        logger.error(f"Unexpected error in convert_image: {str(e)}")
-        return debug_json_response(format_error_response(f"Error converting image: {str(e)}"))
+        return debug_json_response(format_error_response(f"Error converting HTML to PDF: {str(e)}"))
 
-# Excel to CSV conversion tool
-@mcp.tool("excel2csv")
-def convert_excel_to_csv(input_file: str) -> dict:
+# Markdown to HTML conversion tool
+@async_tool("markdown2html")
+def convert_markdown_to_html(input_file: str = None, file_content_base64: str = None, output_mode: str = None,
+                             standalone: bool = True) -> dict:
     """
-    Convert an Excel file (XLS/XLSX) to CSV format.
+    Convert Markdown to HTML without rendering a PDF. Supports both file path and
+    direct file content input.
     
     Args:
-        input_file: Path to the Excel file to convert.
+        input_file: Path to the Markdown file to convert, or an upload:// handle from finish_upload. Optional if providing file_content_base64.
+        file_content_base64: Base64 encoded content of the Markdown file. Optional if providing input_file.
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
+        standalone: Return a complete HTML page with the stylesheet (default), or only the
+            HTML of the content when False.
         
     Returns:
-        Dictionary containing success status and either base64 encoded CSV or error message.
+        Dictionary containing success status and either the converted HTML (base64 encoded or as a file reference) or error message.
     """
     try:
-        # Validate input file
-        if not input_file.lower().endswith(('.xls', '.xlsx')):
-            raise ValueError(f"File must be an Excel file (.xls or .xlsx), got: {input_file}")
-        actual_file_path = validate_file_exists(input_file)
-        
-        # Generate output file path
-        output_file = os.path.splitext(actual_file_path)[0] + ".csv"
-        
-        # Import pandas here to avoid dependency if not needed
-        import pandas as pd
+        output_mode = resolve_output_mode(output_mode)
+        if input_file is None and file_content_base64 is None:
+            return debug_json_response(format_error_response("You must provide either input_file or file_content_base64"))
         
-        # Perform conversion
-        df = pd.read_excel(actual_file_path)
-        df.to_csv(output_file, index=False)
+        if file_content_base64:
+            md_content = base64_codec.decode_bytes(file_content_base64).decode("utf-8")
+        else:
+            with open(validate_file_exists(input_file), encoding="utf-8") as md_file:
+                md_content = md_file.read()
         
-        # Return base64 encoded CSV
-        return debug_json_response(format_success_response(get_base64_encoded_file(output_file)))
+        with metrics.stage("convert"):
+            html = markdown_to_html(md_content, standalone=standalone)
+        return debug_json_response(deliver_bytes(html.encode("utf-8"), "html", output_mode))
     
     except Exception as e:
-        return debug_json_response(format_error_response(f"Error converting Excel to CSV: {str(e)}"))
+        return debug_json_response(format_error_response(f"Error converting Markdown to HTML: {str(e)}"))
 
-# HTML to PDF conversion tool
-@mcp.tool("html2pdf")
-def convert_html_to_pdf(input_file: str) -> dict:
+# Converter registry configuration
+# Alternative spellings of format names
+FORMAT_ALIASES = {"jpeg": "jpg", "markdown": "md", "htm": "html", "tif": "tiff", "arrow": "feather"}
+IMAGE_FORMATS = ("jpg", "png", "webp", "gif", "bmp", "tiff")
+
+def normalize_format(name: str) -> str:
+    name = (name or "").lower().lstrip(".")
+    return FORMAT_ALIASES.get(name, name)
+
+class ConverterRegistry:
     """
-    Convert an HTML file to PDF format.
+    Graph of formats whose edges are conversion steps. Each step converts a file
+    at one path into a file at another and declares a relative cost; a conversion
+    follows the cheapest route through the graph (Dijkstra), so that pairs
+    without a direct converter, such as md -> pdf or png -> pdf, work in steps.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._edges = collections.defaultdict(dict)
+        self._routes = {}
+    
+    def register(self, input_format: str, output_format: str, func, cost: float = 1.0, name: str = None):
+        """
+        Register func(input_path, output_path, input_format, output_format) as a
+        step; it may return a dict of details to add to the response. A step
+        registered again for the same pair replaces the previous one.
+        """
+        with self._lock:
+            self._edges[normalize_format(input_format)][normalize_format(output_format)] = {
+                "func": func, "cost": cost, "name": name or func.__name__}
+            self._routes.clear()
+    
+    def converter(self, input_formats, output_formats, cost: float = 1.0):
+        """Decorator registering a step for every pair of differing input and output formats."""
+        def decorator(func):
+            for input_format in ([input_formats] if isinstance(input_formats, str) else input_formats):
+                for output_format in ([output_formats] if isinstance(output_formats, str) else output_formats):
+                    if normalize_format(input_format) != normalize_format(output_format):
+                        self.register(input_format, output_format, func, cost)
+            return func
+        return decorator
+    
+    def formats(self) -> list:
+        with self._lock:
+            return sorted(set(self._edges) | {output for edges in self._edges.values() for output in edges})
+    
+    def _shortest_routes(self, source: str) -> dict:
+        """Cheapest route from source to every reachable format: {format: (cost, [(input, output), ...])}."""
+        with self._lock:
+            if source in self._routes:
+                return self._routes[source]
+            best = {source: (0.0, [])}
+            heap = [(0.0, source, [])]
+            while heap:
+                cost, current, route = heapq.heappop(heap)
+                if cost > best[current][0]:
+                    continue
+                for target, edge in self._edges.get(current, {}).items():
+                    total = cost + edge["cost"]
+                    if target not in best or total < best[target][0]:
+                        best[target] = (total, route + [(current, target)])
+                        heapq.heappush(heap, (total, target, best[target][1]))
+            del best[source]
+            self._routes[source] = best
+            return best
+    
+    def find_route(self, input_format: str, output_format: str) -> list:
+        """Steps of the cheapest route as (input, output, step) tuples, or None if there is none."""
+        input_format, output_format = normalize_format(input_format), normalize_format(output_format)
+        found = self._shortest_routes(input_format).get(output_format)
+        if found is None:
+            return None
+        return [(source, target, self._edges[source][target]) for source, target in found[1]]
+    
+    def supported_pairs(self, input_format: str = None, output_format: str = None) -> list:
+        """All reachable (input, output) pairs with the cost and formats of their route."""
+        pairs = []
+        sources = [normalize_format(input_format)] if input_format else self.formats()
+        for source in sources:
+            for target, (cost, route) in sorted(self._shortest_routes(source).items()):
+                if output_format and target != normalize_format(output_format):
+                    continue
+                pairs.append({"input": source, "output": target, "cost": cost,
+                              "route": [source] + [step[1] for step in route]})
+        return pairs
+    
+    def convert(self, input_path: str, input_format: str, output_format: str) -> tuple:
+        """
+        Convert input_path along the cheapest route. Intermediate files are kept
+        in a workspace that is released when the tool call ends. Returns the
+        output path and the details reported by the steps.
+        """
+        route = self.find_route(input_format, output_format)
+        if route is None:
+            raise ValueError(f"Unsupported conversion: {input_format} to {output_format}")
+        work_dir = make_temp_dir()
+        details = {"route": [normalize_format(input_format)] + [target for _, target, _ in route]}
+        current_path = input_path
+        for index, (source, target, step) in enumerate(route, 1):
+            check_cancelled()
+            report_status(index - 1, len(route), message=f"Step {index}/{len(route)}: {source} to {target} ({step['name']})")
+            output_path = os.path.join(work_dir, f"step_{index}.{target}")
+            result = step["func"](current_path, output_path, source, target)
+            if not os.path.exists(output_path):
+                raise RuntimeError(f"Conversion step {source} to {target} produced no output")
+            if current_path != input_path:
+                os.remove(current_path)
+            if isinstance(result, dict):
+                details.update(result)
+            current_path = output_path
+        return current_path, details
+
+# Shared registry of conversion steps
+converter_registry = ConverterRegistry()
+
+@converter_registry.converter("docx", "pdf", cost=5)
+def docx_to_pdf_step(input_path: str, output_path: str, input_format: str, output_format: str):
+    docx_to_pdf_backend(input_path, output_path)
+
+@converter_registry.converter("pdf", "docx", cost=8)
+def pdf_to_docx_step(input_path: str, output_path: str, input_format: str, output_format: str):
+    convert_pdf_to_docx_file(input_path, output_path)
+
+@converter_registry.converter(IMAGE_FORMATS, IMAGE_FORMATS + ("pdf",), cost=1)
+def image_step(input_path: str, output_path: str, input_format: str, output_format: str):
+    conversion_executor.run_in_process(image_backend, input_path, output_path, output_format)
+
+@converter_registry.converter(TABLE_INPUT_FORMATS, ("csv", "jsonl", "parquet", "feather"), cost=2)
+def table_step(input_path: str, output_path: str, input_format: str, output_format: str) -> dict:
+    return conversion_executor.run_in_process(table_backend, input_path, output_path, output_format, progress=True)
+
+@converter_registry.converter("jsonl", "json", cost=1)
+@timed_stage("convert")
+def jsonl_to_json_step(input_path: str, output_path: str, input_format: str, output_format: str):
+    """Wrap JSON Lines records into a JSON array, one record at a time."""
+    with open(input_path, encoding="utf-8") as lines, open(output_path, "w", encoding="utf-8") as output:
+        output.write("[")
+        first = True
+        for line in lines:
+            if not line.strip():
+                continue
+            output.write(("" if first else ",\n") + line.strip())
+            first = False
+        output.write("]\n")
+
+@converter_registry.converter("md", "html", cost=1)
+@timed_stage("convert")
+def markdown_to_html_step(input_path: str, output_path: str, input_format: str, output_format: str):
+    with open(input_path, encoding="utf-8") as md_file:
+        html = markdown_to_html(md_file.read())
+    with open(output_path, "w", encoding="utf-8") as html_file:
+        html_file.write(html)
+
+@converter_registry.converter("html", "pdf", cost=5)
+def html_to_pdf_step(input_path: str, output_path: str, input_format: str, output_format: str):
+    html_file_to_pdf_backend(input_path, output_path)
+
+@converter_registry.converter("md", "pdf", cost=5)
+def markdown_to_pdf_step(input_path: str, output_path: str, input_format: str, output_format: str):
+    markdown_to_pdf_backend(input_path, output_path)
+
+def route_cache_options(route: list, input_path: str) -> dict:
+    """
+    Return what, besides the input, decides the result of a route: the engines
+    of its DOCX and HTML/Markdown to PDF steps, and the local files a first
+    HTML/Markdown step reads next to the input.
+    """
+    options = {}
+    for index, (source, target, _) in enumerate(route):
+        if (source, target) == ("docx", "pdf"):
+            options["docx2pdf_engine"] = get_docx2pdf_engine()
+        elif source in ("html", "md") and target == "pdf":
+            options["html2pdf_engine"] = get_html2pdf_engine()
+            # Later steps render a workspace copy, which reads no local files
+            if index == 0:
+                options["assets"] = linked_asset_stamps(input_path)
+    return options
+
+# Supported conversions tool
+@async_tool("list_conversions")
+def list_conversions(input_format: str = None, output_format: str = None) -> dict:
+    """
+    List the conversions convert_file supports, including multi-step routes.
     
     Args:
-        input_file: Path to the HTML file to convert.
+        input_format: Only list conversions from this format (e.g., "md").
+        output_format: Only list conversions to this format (e.g., "pdf").
         
     Returns:
-        Dictionary containing success status and either base64 encoded PDF or error message.
+        Dictionary containing success status, the known formats and the supported pairs with
+        the cost and formats of their cheapest route.
     """
     try:
-        # Validate input file - for HTML, be more flexible with extensions
-        # since we might be handling Markdown files too
-        actual_file_path = validate_file_exists(input_file)
-        
-        # Determine if this is Markdown and convert to HTML first if needed
-        if actual_file_path.lower().endswith(('.md', '.markdown')):
-            # Import markdown module if needed
-            try:
-                import markdown
-                with open(actual_file_path, 'r', encoding='utf-8') as md_file:
-                    md_content = md_file.read()
-                
-                html_content = markdown.markdown(md_content)
-                
-                # Create a temporary HTML file
-                html_temp = os.path.splitext(actual_file_path)[0] + '.temp.html'
-                with open(html_temp, 'w', encoding='utf-8') as html_file:
-                    html_file.write(f"""
-                    <!DOCTYPE html>
-                    <html>
-                    <head>
-                        <meta charset="UTF-8">
-                        <title>Converted Markdown</title>
-                        <style>
-                            body {{ font-family: Arial, sans-serif; line-height: 1.6; max-width: 800px; margin: 0 auto; padding: 20px; }}
-                            h1, h2, h3, h4, h5, h6 {{ color: #333; margin-top: 24px; }}
-                            code {{ background-color: #f0f0f0; padding: 2px 4px; border-radius: 3px; }}
-                            pre {{ background-color: #f0f0f0; padding: 10px; border-radius: 5px; overflow-x: auto; }}
-                            blockquote {{ border-left: 4px solid #ddd; padding-left: 16px; margin-left: 0; }}
-                            img {{ max-width: 100%; }}
-                            table {{ border-collapse: collapse; width: 100%; }}
-                            th, td {{ border: 1px solid #ddd; padding: 8px; }}
-                            tr:nth-child(even) {{ background-color: #f2f2f2; }}
-                        </style>
-                    </head>
-                    <body>
-                        {html_content}
-                    </body>
-                    </html>
-                    """)
-                
-                actual_file_path = html_temp
-            except ImportError:
-                raise ValueError("Markdown conversion requires the 'markdown' module. Please install it with 'pip install markdown'")
-        
-        # Generate output file path
-        output_file = os.path.splitext(os.path.splitext(actual_file_path)[0])[0] + ".pdf"
-        if actual_file_path.endswith('.temp.html'):
-            output_file = os.path.splitext(os.path.splitext(actual_file_path)[0])[0] + ".pdf"
-        
-        # Import here to avoid dependency if not needed
-        import pdfkit
-        
-        # Perform conversion
-        pdfkit.from_file(actual_file_path, output_file)
-        
-        # Remove temporary file if it was created
-        if actual_file_path.endswith('.temp.html'):
-            try:
-                os.remove(actual_file_path)
-            except:
-                pass
-        
-        # Return base64 encoded PDF
-        return debug_json_response(format_success_response(get_base64_encoded_file(output_file)))
-    
+        return debug_json_response({
+            "success": True,
+            "formats": converter_registry.formats(),
+            "pairs": converter_registry.supported_pairs(input_format, output_format),
+        })
     except Exception as e:
-        return debug_json_response(format_error_response(f"Error converting HTML to PDF: {str(e)}"))
+        return debug_json_response(format_error_response(f"Error listing conversions: {str(e)}"))
 
 # Generic file conversion tool using file paths
-@mcp.tool("convert_file")
-def convert_file(input_file: str = None, file_content_base64: str = None, input_format: str = None, output_format: str = None, ctx: Context = None) -> dict:
+@async_tool("convert_file")
+def convert_file(input_file: str = None, file_content_base64: str = None, input_format: str = None, output_format: str = None, output_mode: str = None) -> dict:
     """
-    Generic file conversion tool that attempts to convert between various formats.
-    Supports both file path and direct file content input.
+    Generic file conversion tool that converts between any two formats connected in
+    the converter registry, in several steps if there is no direct converter
+    (e.g. md -> html -> pdf). Supports both file path and direct file content input.
     
     Args:
-        input_file: Path to the file to convert. Optional if providing file_content_base64.
+        input_file: Path to the file to convert, or an upload:// handle from finish_upload. Optional if providing file_content_base64.
         file_content_base64: Base64 encoded content of the file. Optional if providing input_file.
-        input_format: Source format (e.g., "docx", "pdf", "png").
+        input_format: Source format (e.g., "docx", "pdf", "png"). Defaults to the file extension of an upload.
         output_format: Target format (e.g., "pdf", "docx", "jpg").
-        ctx: Optional context object for progress reporting.
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
         
     Returns:
-        Dictionary containing success status and either base64 encoded file or error message.
+        Dictionary containing success status and either the converted file (base64 encoded or as a file reference) or error message.
     """
     try:
-        # Log progress if context is provided
-        if ctx:
-            ctx.info(f"Converting from {input_format} to {output_format}")
+        report_status(0, message=f"Converting from {input_format} to {output_format}")
         
         logger.info(f"Starting generic file conversion from {input_format} to {output_format}")
         
@@ -912,58 +4974,58 @@ def convert_file(input_file: str = None, file_content_base64: str = None, input_
         if input_file is None and file_content_base64 is None:
             logger.error("No input provided: both input_file and file_content_base64 are None")
             return debug_json_response(format_error_response("You must provide either input_file or file_content_base64"))
+        
+        # Validate the output mode before doing any work
+        try:
+            output_mode = resolve_output_mode(output_mode)
+        except ValueError as e:
+            return debug_json_response(format_error_response(str(e)))
             
+        # Uploads carry their format in the file name
+        if not input_format and is_upload_handle(input_file):
+            input_format = os.path.splitext(uploads.resolve(input_file))[1].lstrip(".")
+        
         # Check that formats are specified
         if not input_format or not output_format:
             logger.error(f"Missing format specification: input_format={input_format}, output_format={output_format}")
             return debug_json_response(format_error_response("You must specify both input_format and output_format"))
             
-        # Define conversion mapping: {(source_format, target_format): conversion_function}
-        conversion_map = {
-            ("docx", "pdf"): convert_docx_to_pdf,
-            ("pdf", "docx"): convert_pdf_to_docx,
-            ("markdown", "pdf"): convert_html_to_pdf,
-            ("md", "pdf"): convert_html_to_pdf,
-            # Additional format conversions can be added here
-        }
-            
-        # Look up the appropriate conversion function
-        conversion_key = (input_format.lower(), output_format.lower())
-        if conversion_key in conversion_map:
-            # Call the specific conversion function with the correct parameters
-            conversion_func = conversion_map[conversion_key]
-            
-            # Check if the function accepts file_content_base64 parameter (our updated ones do)
-            if file_content_base64:
-                return conversion_func(file_content_base64=file_content_base64)
-            else:
-                return conversion_func(input_file=input_file)
-        else:
-            # For image conversions
-            if input_format.lower() in ["jpg", "jpeg", "png", "webp", "gif", "bmp", "tiff"]:
-                if file_content_base64:
-                    return convert_image(
-                        file_content_base64=file_content_base64,
-                        input_format=input_format,
-                        output_format=output_format
-                    )
-                else:
-                    return convert_image(
-                        input_file=input_file,
-                        output_format=output_format
-                    )
-            
-            # If we got here, the conversion is not supported
+        # Find the cheapest route before doing any work
+        route = converter_registry.find_route(input_format, output_format)
+        if route is None:
             logger.error(f"Unsupported conversion: {input_format} to {output_format}")
             return debug_json_response(format_error_response(f"Unsupported conversion: {input_format} to {output_format}"))
+        
+        # Materialize the input as a file
+        if file_content_base64:
+            temp_dir = make_temp_dir()
+            actual_file_path = os.path.join(temp_dir, f"input.{normalize_format(input_format)}")
+            decode_base64_to_file(file_content_base64, actual_file_path)
+        else:
+            actual_file_path = validate_file_exists(input_file)
+        
+        # Reuse the cached result if this input was converted before
+        cache_key = conversion_cache.make_key(actual_file_path, normalize_format(input_format), normalize_format(output_format),
+                                              route_cache_options(route, actual_file_path))
+        cached_output_file = os.path.join(make_temp_dir(), f"output.{normalize_format(output_format)}")
+        if conversion_cache.fetch(cache_key, cached_output_file):
+            logger.info("Using cached conversion result")
+            return debug_json_response(deliver_output(cached_output_file, output_mode))
+        
+        logger.info(f"Converting along route: {' -> '.join([normalize_format(input_format)] + [target for _, target, _ in route])}")
+        output_file, details = converter_registry.convert(actual_file_path, input_format, output_format)
+        conversion_cache.store(cache_key, output_file)
+        response = deliver_output(output_file, output_mode)
+        response.update(details)
+        return debug_json_response(response)
     
     except Exception as e:
         logger.error(f"Unexpected error in convert_file: {str(e)}")
         return debug_json_response(format_error_response(f"Error converting file: {str(e)}"))
 
 # Function to handle direct file content input
-@mcp.tool("convert_content")
-def convert_content(file_content_base64: str, input_format: str, output_format: str) -> dict:
+@async_tool("convert_content")
+def convert_content(file_content_base64: str, input_format: str, output_format: str, output_mode: str = None) -> dict:
     """
     Convert a file directly from its base64 content, without needing a file path.
     This is useful when the file path approach fails or when working with content
@@ -973,9 +5035,11 @@ def convert_content(file_content_base64: str, input_format: str, output_format:
         file_content_base64: Base64 encoded content of the input file
         input_format: Source format (e.g., "docx", "pdf", "md")
         output_format: Target format (e.g., "pdf", "docx")
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
         
     Returns:
-        Dictionary containing success status and either base64 encoded file or error message.
+        Dictionary containing success status and either the converted file (base64 encoded or as a file reference) or error message.
     """
     try:
         logger.info(f"Starting direct content conversion from {input_format} to {output_format}")
@@ -984,7 +5048,8 @@ def convert_content(file_content_base64: str, input_format: str, output_format:
         return convert_file(
             file_content_base64=file_content_base64,
             input_format=input_format,
-            output_format=output_format
+            output_format=output_format,
+            output_mode=output_mode
         )
     
     except Exception as e:
@@ -992,49 +5057,458 @@ def convert_content(file_content_base64: str, input_format: str, output_format:
         return debug_json_response(format_error_response(f"Error converting content: {str(e)}"))
 
 # Direct DOCX to PDF conversion with content
-@mcp.tool("docx2pdf_content")
-def convert_docx_to_pdf_content(file_content_base64: str) -> dict:
+@async_tool("docx2pdf_content")
+def convert_docx_to_pdf_content(file_content_base64: str, output_mode: str = None) -> dict:
     """
     Convert a DOCX file directly from its base64 content to PDF format.
     
     Args:
         file_content_base64: Base64 encoded content of the DOCX file
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
         
     Returns:
-        Dictionary containing success status and either base64 encoded PDF or error message.
+        Dictionary containing success status and either the converted PDF (base64 encoded or as a file reference) or error message.
     """
-    result = convert_docx_to_pdf(file_content_base64=file_content_base64)
+    result = convert_docx_to_pdf(file_content_base64=file_content_base64, output_mode=output_mode)
     return debug_json_response(result)
 
 # Direct PDF to DOCX conversion with content
-@mcp.tool("pdf2docx_content")
-def convert_pdf_to_docx_content(file_content_base64: str) -> dict:
+@async_tool("pdf2docx_content")
+def convert_pdf_to_docx_content(file_content_base64: str, output_mode: str = None) -> dict:
     """
     Convert a PDF file directly from its base64 content to DOCX format.
     
     Args:
         file_content_base64: Base64 encoded content of the PDF file
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
         
     Returns:
-        Dictionary containing success status and either base64 encoded DOCX or error message.
+        Dictionary containing success status and either the converted DOCX (base64 encoded or as a file reference) or error message.
     """
-    result = convert_pdf_to_docx(file_content_base64=file_content_base64)
+    result = convert_pdf_to_docx(file_content_base64=file_content_base64, output_mode=output_mode)
     return debug_json_response(result)
 
 # Direct Markdown to PDF conversion with content
-@mcp.tool("markdown2pdf_content")
-def convert_markdown_to_pdf_content(file_content_base64: str) -> dict:
+@async_tool("markdown2pdf_content")
+def convert_markdown_to_pdf_content(file_content_base64: str, output_mode: str = None) -> dict:
     """
     Convert a Markdown file directly from its base64 content to PDF format.
     
     Args:
         file_content_base64: Base64 encoded content of the Markdown file
+        output_mode: How to return the result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
         
     Returns:
-        Dictionary containing success status and either base64 encoded PDF or error message.
+        Dictionary containing success status and either the converted PDF (base64 encoded or as a file reference) or error message.
     """
-    result = convert_file(file_content_base64=file_content_base64, input_format="md", output_format="pdf")
+    result = convert_file(file_content_base64=file_content_base64, input_format="md", output_format="pdf", output_mode=output_mode)
     return debug_json_response(result)
 
+# Chunked upload tools
+@async_tool("begin_upload")
+def begin_upload(filename: str = None, total_size: int = None, checksum: str = None) -> dict:
+    """
+    Start a chunked upload of a file too large to send as one base64 argument.
+    Send the content with append_chunk, then call finish_upload for a handle
+    that the conversion tools accept as input_file.
+    
+    Args:
+        filename: Name of the file (e.g. "report.docx"). Its extension tells the conversion tools the format.
+        total_size: Size of the file in bytes. Optional; checked by finish_upload if given.
+        checksum: Checksum of the whole file, as a SHA-256 hex digest or "algorithm:hexdigest".
+            Optional; checked by finish_upload if given.
+        
+    Returns:
+        Dictionary containing success status and the upload_id, the offset of the first chunk (0)
+        and max_chunk_bytes, or error message.
+    """
+    try:
+        return debug_json_response(dict(uploads.begin(filename, total_size, checksum), success=True))
+    except Exception as e:
+        logger.error(f"Error starting upload: {str(e)}")
+        return debug_json_response(format_error_response(f"Error starting upload: {str(e)}"))
+
+@async_tool("append_chunk")
+def append_chunk(upload_id: str, offset: int, chunk_base64: str, checksum: str = None) -> dict:
+    """
+    Append one chunk to an upload. Chunks must be sent in order: offset is the
+    number of bytes already uploaded, as returned by the previous call or by upload_status.
+    
+    Args:
+        upload_id: Upload id returned by begin_upload.
+        offset: Position of the chunk in the file, in bytes.
+        chunk_base64: Base64 encoded chunk of at most max_chunk_bytes bytes.
+        checksum: Checksum of the decoded chunk, as a SHA-256 hex digest or "algorithm:hexdigest".
+            Optional; a chunk that does not match is rejected and can be sent again.
+        
+    Returns:
+        Dictionary containing success status and the offset of the next chunk, or error message.
+        If offset was wrong, the error response carries the offset to resume at.
+    """
+    try:
+        data = base64_codec.decode_bytes(chunk_base64)
+        return debug_json_response(dict(uploads.append(upload_id, offset, data, checksum), success=True))
+    except UploadOffsetMismatch as e:
+        logger.warning(str(e))
+        return debug_json_response(dict(format_error_response(str(e)), offset=e.expected))
+    except Exception as e:
+        logger.error(f"Error appending chunk: {str(e)}")
+        return debug_json_response(format_error_response(f"Error appending chunk: {str(e)}"))
+
+@async_tool("upload_status")
+def upload_status(upload_id: str) -> dict:
+    """
+    Return the state of an upload, e.g. to resume an interrupted transfer at the returned offset.
+    
+    Args:
+        upload_id: Upload id returned by begin_upload.
+        
+    Returns:
+        Dictionary containing success status, the offset of the next chunk and whether the
+        upload is finished (with its handle), or error message.
+    """
+    try:
+        return debug_json_response(dict(uploads.status(upload_id), success=True))
+    except Exception as e:
+        logger.error(f"Error reading upload status: {str(e)}")
+        return debug_json_response(format_error_response(f"Error reading upload status: {str(e)}"))
+
+@async_tool("finish_upload")
+def finish_upload(upload_id: str, checksum: str = None) -> dict:
+    """
+    Complete an upload and return its handle. The handle ("upload://<id>") can be
+    passed as input_file to the conversion tools until the upload expires.
+    
+    Args:
+        upload_id: Upload id returned by begin_upload.
+        checksum: Checksum of the whole file, as a SHA-256 hex digest or "algorithm:hexdigest".
+            Optional; overrides the checksum given to begin_upload.
+        
+    Returns:
+        Dictionary containing success status, the handle, size and SHA-256 of the upload, or error message.
+    """
+    try:
+        return debug_json_response(dict(uploads.finish(upload_id, checksum), success=True))
+    except Exception as e:
+        logger.error(f"Error finishing upload: {str(e)}")
+        return debug_json_response(format_error_response(f"Error finishing upload: {str(e)}"))
+
+@async_tool("abort_upload")
+def abort_upload(upload_id: str) -> dict:
+    """
+    Delete an upload, finished or not, instead of waiting for it to expire.
+    
+    Args:
+        upload_id: Upload id returned by begin_upload.
+        
+    Returns:
+        Dictionary containing success status or error message.
+    """
+    try:
+        uploads.abort(upload_id)
+        return debug_json_response({"success": True, "upload_id": upload_id})
+    except Exception as e:
+        logger.error(f"Error aborting upload: {str(e)}")
+        return debug_json_response(format_error_response(f"Error aborting upload: {str(e)}"))
+
+# Chunked download tool
+@async_tool("download_chunk")
+def download_chunk(uri: str, offset: int = 0, length: int = None) -> dict:
+    """
+    Read one chunk of a converted file returned with output_mode "file" or "resource",
+    so that large results can be fetched piece by piece and resumed after an interruption.
+    
+    Args:
+        uri: The uri (converted:// or file://) or path of the converted file.
+        offset: Position of the chunk in the file, in bytes.
+        length: Number of bytes to read. Defaults to, and is capped at, the maximum chunk size.
+        
+    Returns:
+        Dictionary containing success status, the base64 encoded chunk with its offset and SHA-256,
+        the size of the file and whether the chunk ends it, or error message.
+    """
+    try:
+        chunk = read_output_chunk(uri, offset, length)
+        data = chunk.pop("data")
+        record_output(id(data), len(data))
+        return debug_json_response(dict(chunk, success=True, data=base64_codec.encode_bytes(data),
+                                        length=len(data), sha256=hashlib.sha256(data).hexdigest()))
+    except Exception as e:
+        logger.error(f"Error reading converted file chunk: {str(e)}")
+        return debug_json_response(format_error_response(f"Error reading converted file chunk: {str(e)}"))
+
+# Batch configuration
+# Items of one batch converted at the same time, and the largest batch accepted
+BATCH_CONCURRENCY = int(os.environ.get("FILE_CONVERTER_BATCH_CONCURRENCY", str(THREAD_WORKERS)))
+BATCH_MAX_ITEMS = int(os.environ.get("FILE_CONVERTER_BATCH_MAX_ITEMS", "1000"))
+# Output formats that are already compressed and are stored in archives as is
+COMPRESSED_FORMATS = {"pdf", "docx", "xlsx", "jpg", "jpeg", "png", "webp", "gif", "zip", "parquet"}
+
+def expand_batch_items(items: list, output_format: str = None, limit: int = None) -> list:
+    """
+    Normalize batch items and expand glob patterns in input_file into one item per
+    matching file. Input formats default to the file extension and output formats
+    to the batch-level output_format. With limit, expansion stops as soon as there
+    are more than limit items, so a pattern matching a whole filesystem is not walked.
+    """
+    expanded = []
+    for item in items:
+        if limit is not None and len(expanded) > limit:
+            break
+        if not isinstance(item, dict):
+            expanded.append({"error": f"Batch item must be an object, got: {item!r}"})
+            continue
+        item = dict(item)
+        item.setdefault("output_format", output_format)
+        input_file = item.get("input_file")
+        if input_file and glob.has_magic(input_file):
+            matches = (path for path in glob.iglob(input_file, recursive=True) if os.path.isfile(path))
+            if limit is not None:
+                matches = itertools.islice(matches, limit - len(expanded) + 1)
+            matches = sorted(matches)
+            if not matches:
+                expanded.append(dict(item, error=f"No files match pattern: {input_file}"))
+            for path in matches:
+                expanded.append(dict(item, input_file=path))
+        else:
+            expanded.append(item)
+    
+    for item in expanded:
+        if not item.get("input_format") and item.get("input_file"):
+            item["input_format"] = os.path.splitext(item["input_file"])[1].lstrip(".").lower()
+    return expanded
+
+def convert_batch_item(item: dict, output_mode: str) -> dict:
+    """
+    Convert a single batch item with convert_file. Never raises, so that one bad
+    item does not fail the batch.
+    """
+    if item.get("error"):
+        return format_error_response(item["error"])
+    try:
+        return convert_file(
+            input_file=item.get("input_file"),
+            file_content_base64=item.get("file_content_base64"),
+            input_format=item.get("input_format"),
+            output_format=item.get("output_format"),
+            output_mode=output_mode
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error converting batch item: {str(e)}")
+        return format_error_response(f"Error converting file: {str(e)}")
+
+def batch_item_tool(item: dict) -> str:
+    """Name of the tool whose concurrency limit applies to a batch item."""
+    formats = (normalize_format(item.get("input_format") or ""), normalize_format(item.get("output_format") or ""))
+    if formats == ("docx", "pdf"):
+        return "docx2pdf"
+    if formats == ("pdf", "docx"):
+        return "pdf2docx"
+    if formats[0] in IMAGE_FORMATS and formats[1] in IMAGE_FORMATS:
+        return "convert_image"
+    return "convert_file"
+
+def describe_batch_item(index: int, item: dict) -> dict:
+    """Identify a batch item in the results without echoing its content."""
+    return {
+        "index": index,
+        "input": item.get("input_file") or item.get("name") or f"item_{index}",
+        "input_format": item.get("input_format"),
+        "output_format": item.get("output_format"),
+    }
+
+def build_batch_archive(items: list, results: list) -> str:
+    """
+    Pack the successful results of a batch (stored with output_mode="file") into a
+    zip archive and remove the individual files. Returns the archive path, in a
+    workspace that the caller releases.
+    """
+    archive_dir = workspaces.acquire()
+    archive_path = os.path.join(archive_dir, f"batch_{uuid.uuid4().hex}.zip")
+    try:
+        with zipfile.ZipFile(archive_path, "w") as archive:
+            for index, (item, result) in enumerate(zip(items, results)):
+                if not result.get("success"):
+                    continue
+                stem = os.path.splitext(os.path.basename(item.get("input_file") or item.get("name") or "item"))[0]
+                output_format = (item.get("output_format") or "").lower()
+                arcname = f"{index:04d}_{stem}.{output_format}"
+                compression = zipfile.ZIP_STORED if output_format in COMPRESSED_FORMATS else zipfile.ZIP_DEFLATED
+                archive.write(result["path"], arcname, compress_type=compression)
+                os.remove(result["path"])
+                result.clear()
+                result.update({"success": True, "archive_name": arcname})
+    except BaseException:
+        workspaces.release(archive_dir)
+        raise
+    return archive_path
+
+# Batch conversion tool
+@mcp.tool("convert_batch")
+async def convert_batch(items: list[dict], output_format: str = None, output_mode: str = None, return_archive: bool = False, ctx: Context = None) -> dict:
+    """
+    Convert many files in one call. Items are converted in parallel, and a failing
+    item is reported in its own result without failing the batch.
+    
+    Args:
+        items: List of objects, each with either input_file (a path or a glob pattern
+            such as "reports/*.docx") or file_content_base64, plus optional
+            input_format (defaults to the file extension) and output_format.
+        output_format: Target format for items that do not set their own.
+        output_mode: How to return each result: "base64" (default) embeds it, "file" returns a path
+            in the output directory, "resource" returns a converted:// resource URI.
+            With return_archive it applies to the archive instead.
+        return_archive: Pack all converted files into one zip archive instead of returning them one by one.
+        ctx: Optional context object; progress is reported as items finish.
+        
+    Returns:
+        Dictionary containing success status, item counts and a per-item list of results
+        (and the archive, with return_archive), or error message.
+    """
+    with metrics.tool_call("convert_batch") as call:
+        try:
+            logger.info(f"Starting batch conversion of {len(items)} items")
+            output_mode = resolve_output_mode(output_mode)
+            # Glob patterns walk directories; keep that off the event loop
+            loop = asyncio.get_running_loop()
+            expanded = await loop.run_in_executor(
+                conversion_executor.thread_pool, expand_batch_items, items, output_format, BATCH_MAX_ITEMS)
+            if not expanded:
+                call.status = "error"
+                return serialize_response(format_error_response("The batch contains no items"))
+            if len(expanded) > BATCH_MAX_ITEMS:
+                call.status = "error"
+                return serialize_response(format_error_response(
+                    f"Batch too large: more than {BATCH_MAX_ITEMS} items, at most {BATCH_MAX_ITEMS} are allowed"))
+            
+            # Archived results are collected as files first
+            item_output_mode = "file" if return_archive else output_mode
+            semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+            results = [None] * len(expanded)
+            
+            async def run_item(index: int):
+                # Items share the concurrency limits and queues of the tools they stand for
+                async with semaphore:
+                    results[index] = await conversion_executor.run_tool(
+                        batch_item_tool(expanded[index]), convert_batch_item, expanded[index], item_output_mode)
+                return index
+            
+            # Stream progress as items finish; cancelling the batch cancels every item
+            tasks = [asyncio.ensure_future(run_item(index)) for index in range(len(expanded))]
+            done = 0
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    index = await finished
+                    done += 1
+                    status = "converted" if results[index].get("success") else f"failed: {results[index].get('error')}"
+                    await report_progress(ctx, done, len(expanded),
+                                          f"Item {index} ({describe_batch_item(index, expanded[index])['input']}) {status}")
+            except asyncio.CancelledError:
+                logger.info(f"Batch conversion cancelled after {done}/{len(expanded)} items")
+                for task in tasks:
+                    task.cancel()
+                raise
+            
+            response = {"success": True}
+            if return_archive:
+                archive_path = await loop.run_in_executor(
+                    conversion_executor.thread_pool, build_batch_archive, expanded, results)
+                # Run in a copy of the context so the archive counts as the batch output
+                try:
+                    archive = await loop.run_in_executor(
+                        conversion_executor.thread_pool,
+                        functools.partial(contextvars.copy_context().run, deliver_output, archive_path, output_mode))
+                finally:
+                    workspaces.release(os.path.dirname(archive_path))
+                response["archive"] = archive
+            
+            succeeded = sum(1 for result in results if result.get("success"))
+            response.update({
+                "total": len(expanded),
+                "succeeded": succeeded,
+                "failed": len(expanded) - succeeded,
+                "results": [dict(describe_batch_item(index, item), **result)
+                            for index, (item, result) in enumerate(zip(expanded, results))],
+            })
+            logger.info(f"Batch conversion finished: {succeeded}/{len(expanded)} items converted")
+            with metrics.stage("serialize"):
+                return serialize_response(debug_json_response(response))
+        
+        except Exception as e:
+            logger.error(f"Unexpected error in convert_batch: {str(e)}")
+            call.status = "error"
+            return serialize_response(format_error_response(f"Error converting batch: {str(e)}"))
+
+# Health, readiness and metrics routes of the HTTP transports
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request):
+    """Liveness: the process is up and serving requests."""
+    from starlette.responses import JSONResponse
+    return JSONResponse({"status": "ok", "pid": os.getpid()})
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready(request):
+    """
+    Readiness: answers 503 while backends are still being prewarmed, so that a
+    load balancer only sends conversions to replicas that have warmed up.
+    """
+    from starlette.responses import JSONResponse
+    warming = backends.warming()
+    loaded = {name: state["loaded"] for name, state in backends.stats().items() if state["available"]}
+    executor = conversion_executor.stats()
+    return JSONResponse({
+        "status": "warming" if warming else "ready",
+        "backends": loaded,
+        "running": sum(executor["running"].values()),
+        "queued": sum(executor["queued"].values()),
+    }, status_code=503 if warming else 200)
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def http_metrics(request):
+    """Prometheus metrics of this worker process."""
+    from starlette.responses import PlainTextResponse
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@functools.lru_cache(maxsize=None)
+def http_app(transport: str = None):
+    """
+    Build the ASGI app of the HTTP transport: streamable HTTP, or SSE if
+    configured or if the installed MCP SDK has no streamable HTTP support.
+    Backends are prewarmed in every process that serves the app.
+    """
+    transport = transport or TRANSPORT
+    prewarm_backends()
+    if transport == "sse" or not hasattr(mcp, "streamable_http_app"):
+        return mcp.sse_app()
+    return mcp.streamable_http_app()
+
+def __getattr__(name: str):
+    # "app" (as in "uvicorn file_converter_server:app") is built on first access, so stdio runs never build it
+    if name == "app":
+        return http_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def run_server(transport: str = None):
+    """Run the server over stdio, or over HTTP under uvicorn with HTTP_WORKERS processes."""
+    transport = transport or TRANSPORT
+    if transport == "stdio":
+        prewarm_backends()
+        start_metrics_server()
+        mcp.run()
+        return
+    if transport not in ("streamable-http", "sse"):
+        raise ValueError(f"Unknown transport: {transport}. Use stdio, streamable-http or sse")
+    import uvicorn
+    logger.info(f"Serving MCP over {transport} on http://{HTTP_HOST}:{HTTP_PORT} with {HTTP_WORKERS} worker(s)")
+    if HTTP_WORKERS > 1:
+        # Each worker process imports the module and builds its own app
+        os.environ["FILE_CONVERTER_TRANSPORT"] = transport
+        uvicorn.run("file_converter_server:app", host=HTTP_HOST, port=HTTP_PORT, workers=HTTP_WORKERS)
+    else:
+        uvicorn.run(http_app(transport), host=HTTP_HOST, port=HTTP_PORT)
+
 if __name__ == "__main__":
-    mcp.run() 
\ No newline at end of file
+    run_server() 
\ No newline at end of file
@@ -9,6 +9,7 @@ with proper configuration and error handling.
 import sys
 import os
 import logging
+import time
 from pathlib import Path
 
 # Add current directory to Python path
@@ -31,21 +32,18 @@ def setup_logging():
     return logging.getLogger("file_converter_mcp")
 
 def check_dependencies():
-    """Check if all required dependencies are available"""
-    try:
-        import mcp
-        import docx2pdf
-        import pdf2docx
-        from PIL import Image
-        import pandas
-        import pdfkit
-        import markdown
-        print("✓ All dependencies are available")
-        return True
-    except ImportError as e:
-        print(f"✗ Missing dependency: {e}")
+    """Check if all required dependencies are available without importing them"""
+    import importlib.util
+    # Conversion libraries are imported on first use (or by FILE_CONVERTER_PREWARM)
+    required = ["mcp", "docx2pdf", "pdf2docx", "PIL", "openpyxl", "pdfkit", "markdown"]
+    started = time.perf_counter()
+    missing = [name for name in required if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"✗ Missing dependency: {', '.join(missing)}")
         print("Please run: python -m pip install -e .")
         return False
+    print(f"✓ All dependencies are available (checked in {time.perf_counter() - started:.3f}s)")
+    return True
 
 def main():
     """Main entry point for the MCP server"""
@@ -60,21 +58,31 @@ def main():
     
     try:
         # Import and run the MCP server
-        from file_converter_server import mcp
+        started = time.perf_counter()
+        from file_converter_server import backends, run_server
         
-        print("✓ MCP server initialized successfully")
+        print(f"✓ MCP server initialized successfully in {time.perf_counter() - started:.3f}s")
+        available = [name for name, state in backends.stats().items() if state["available"]]
+        print(f"✓ Backends imported on first use: {', '.join(available)}")
         print("✓ Available tools:")
         print("  - docx2pdf: Convert Word documents to PDF")
         print("  - pdf2docx: Convert PDF to Word documents")
         print("  - convert_image: Convert between image formats")
         print("  - excel2csv: Convert Excel files to CSV")
+        print("  - convert_table: Convert tables to Parquet/Feather/JSON Lines/CSV")
         print("  - html2pdf: Convert HTML/Markdown to PDF")
+        print("  - markdown2html: Convert Markdown to HTML")
         print("  - convert_file: Generic file conversion")
         print("  - convert_content: Convert from base64 content")
+        print("  - convert_batch: Convert many files in one call")
+        print("  - list_conversions: List supported conversion pairs")
+        print("  - begin_upload/append_chunk/finish_upload: Upload large files in chunks")
+        print("  - download_chunk: Download large results in chunks")
         print("\nStarting server...")
         
-        # Run the MCP server
-        mcp.run()
+        # Run the MCP server over stdio, or over HTTP with FILE_CONVERTER_TRANSPORT; prewarm
+        # and the metrics endpoint are started there
+        run_server()
         
     except KeyboardInterrupt:
         print("\n✓ Server stopped by user")
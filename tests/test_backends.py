@@ -0,0 +1,34 @@
+import sys
+
+import file_converter_server as server
+
+
+def test_import_time_is_exported_as_a_metric(tmp_path, monkeypatch):
+    (tmp_path / "fake_backend_module.py").write_text("VALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "fake_backend_module", raising=False)
+    registry = server.BackendRegistry()
+    registry.register("fake", "fake_backend_module")
+    monkeypatch.setattr(server, "backends", registry)
+
+    def import_samples():
+        return [sample for sample in server.collect_runtime_metrics() if sample[0] == "file_converter_backend_import_seconds"]
+
+    assert import_samples() == []
+    assert registry.load("fake").VALUE == 1
+    samples = import_samples()
+    assert [sample[3] for sample in samples] == [{"backend": "fake"}]
+    assert samples[0][4] >= 0
+    monkeypatch.delitem(sys.modules, "fake_backend_module")
+
+
+def test_libreoffice_pool_reports_command_line_mode(monkeypatch, caplog):
+    monkeypatch.setattr(server.LibreOfficeWorker, "uno_available", staticmethod(lambda: False))
+    monkeypatch.setattr(server.LibreOfficeWorker, "start", lambda self: None)
+    pool = server.LibreOfficePool(size=1)
+    with caplog.at_level("WARNING", logger=server.logger.name):
+        pool.start()
+    assert "cold soffice process" in caplog.text
+    assert pool.stats()["mode"] == "cli"
+    monkeypatch.setattr(server.LibreOfficeWorker, "uno_available", staticmethod(lambda: True))
+    assert pool.stats()["mode"] == "uno"
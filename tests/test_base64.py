@@ -0,0 +1,41 @@
+import base64
+import os
+
+import pytest
+
+import file_converter_server as server
+
+
+@pytest.fixture
+def codec():
+    return server.StreamingBase64Codec(chunk_size=12)
+
+
+@pytest.mark.parametrize("size", [0, 1, 11, 12, 13, 24, 25, 100])
+def test_round_trip_across_chunk_boundaries(codec, size, tmp_path):
+    data = os.urandom(size)
+    source = tmp_path / "source.bin"
+    source.write_bytes(data)
+    encoded = codec.encode_file(str(source))
+    assert encoded == base64.b64encode(data).decode("ascii")
+    decoded = tmp_path / "decoded.bin"
+    assert codec.decode_to_file(encoded, str(decoded)) == size
+    assert decoded.read_bytes() == data
+
+
+def test_decode_ignores_whitespace_split_across_chunks(codec, tmp_path):
+    data = os.urandom(50)
+    encoded = base64.encodebytes(data).decode("ascii")
+    # Line breaks every 76 characters, and a chunk is 16 characters
+    encoded = " " + encoded.replace("A", "A\n", 3)
+    output = tmp_path / "decoded.bin"
+    codec.decode_to_file(encoded, str(output))
+    assert output.read_bytes() == data
+    assert codec.decode_bytes(encoded) == data
+
+
+def test_stats_are_exported_as_metrics():
+    names = {sample[0] for sample in server.collect_runtime_metrics()}
+    for name in ("file_converter_base64_peak_buffer_bytes", "file_converter_file_index_files",
+                 "file_converter_libreoffice_restarts_total", "file_converter_libreoffice_uno"):
+        assert name in names
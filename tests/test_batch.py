@@ -0,0 +1,33 @@
+import asyncio
+import json
+
+import pytest
+
+import file_converter_server as server
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def test_expansion_stops_past_the_limit(tmp_path):
+    for index in range(20):
+        (tmp_path / f"file_{index}.txt").write_text("x")
+    expanded = server.expand_batch_items([{"input_file": str(tmp_path / "**" / "*")}], "pdf", limit=5)
+    assert len(expanded) == 6
+    assert len(server.expand_batch_items([{"input_file": str(tmp_path / "*")}], "pdf")) == 20
+
+
+def test_items_use_the_limits_of_their_tool(tmp_path, monkeypatch):
+    for index in range(2):
+        Image.new("RGB", (8, 8)).save(tmp_path / f"image_{index}.png")
+    executor = server.ConversionExecutor(thread_workers=4, process_workers=0,
+                                         concurrency_limits={"convert_image": 1}, max_queue_depth=0)
+    monkeypatch.setattr(server, "conversion_executor", executor)
+    try:
+        response = json.loads(asyncio.run(server.convert_batch(
+            [{"input_file": str(tmp_path / "*.png")}], output_format="webp", output_mode="file")))
+    finally:
+        executor.shutdown()
+    assert response["total"] == 2
+    assert response["succeeded"] == 1
+    assert any("Server busy" in result.get("error", "") for result in response["results"])
+    assert executor.stats()["rejected"] == {"convert_image": 1}
@@ -0,0 +1,74 @@
+import pytest
+
+import file_converter_server as server
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return server.ConversionCache(directory=str(tmp_path / "cache"), memory_bytes=100, disk_bytes=250,
+                                  ttl=3600, enabled=True)
+
+
+def test_hit_and_miss(cache, tmp_path):
+    key = cache.make_bytes_key(b"input", "docx", "pdf")
+    output = tmp_path / "output.pdf"
+    assert not cache.fetch(key, str(output))
+    source = tmp_path / "result.pdf"
+    source.write_bytes(b"converted")
+    cache.store(key, str(source))
+    assert cache.fetch(key, str(output))
+    assert output.read_bytes() == b"converted"
+    assert cache.get(key) == b"converted"
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["memory_hits"] == 2
+
+
+def test_key_depends_on_content_formats_and_options(cache, tmp_path):
+    path = tmp_path / "input.docx"
+    path.write_bytes(b"input")
+    key = cache.make_key(str(path), "docx", "pdf")
+    assert key == cache.make_bytes_key(b"input", "docx", "pdf")
+    assert key != cache.make_bytes_key(b"other", "docx", "pdf")
+    assert key != cache.make_bytes_key(b"input", "docx", "png")
+    assert key != cache.make_bytes_key(b"input", "docx", "pdf", {"engine": "libreoffice"})
+
+
+def test_large_results_stay_on_disk(cache, tmp_path):
+    source = tmp_path / "large.pdf"
+    source.write_bytes(b"x" * 150)
+    cache.store("large", str(source))
+    stats = cache.stats()
+    assert stats["memory_entries"] == 0
+    assert stats["disk_entries"] == 1
+    output = tmp_path / "output.pdf"
+    assert cache.fetch("large", str(output))
+    assert output.read_bytes() == b"x" * 150
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.stats()["memory_entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    for key in ("a", "b", "c"):
+        cache.put(key, key.encode() * 90)
+    stats = cache.stats()
+    assert stats["memory_evictions"] == 2
+    assert stats["disk_evictions"] == 1
+    assert cache.get("a") is None
+    assert cache.get("b") == b"b" * 90
+    assert cache.get("c") == b"c" * 90
+
+
+def test_disk_tier_survives_restart(cache):
+    cache.put("key", b"result")
+    reopened = server.ConversionCache(directory=cache.directory, memory_bytes=100, disk_bytes=250, enabled=True)
+    assert reopened.get("key") == b"result"
+    assert reopened.stats()["disk_hits"] == 1
+
+
+def test_expired_entries_are_misses(cache, monkeypatch):
+    cache.put("key", b"result")
+    now = server.time.time()
+    monkeypatch.setattr(server.time, "time", lambda: now + 7200)
+    assert cache.get("key") is None
+    assert cache.stats()["expired"] >= 1
@@ -0,0 +1,59 @@
+import csv
+import zipfile
+
+import pytest
+
+import file_converter_server as server
+
+openpyxl = pytest.importorskip("openpyxl")
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "report.xlsx"
+    book = openpyxl.Workbook()
+    book.active.title = "Sales"
+    book.active.append(["region", "amount"])
+    for index in range(5):
+        book.active.append([f"region {index}", index * 10])
+    costs = book.create_sheet("Q1 - Costs")
+    costs.append(["item", "cost"])
+    costs.append(["rent", 1200])
+    costs.append(["power", None])
+    book.save(path)
+    return str(path)
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as file:
+        return list(csv.reader(file))
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setattr(server.conversion_cache, "enabled", False)
+
+
+def test_all_sheets_are_exported_one_file_each(workbook):
+    result = server.convert_excel_to_csv(workbook, output_mode="file", all_sheets=True)
+    assert result["success"], result
+    assert [(export["sheet"], export["rows"]) for export in result["sheets"]] == [("Sales", 6), ("Q1 - Costs", 3)]
+    sales, costs = (read_csv(export["path"]) for export in result["sheets"])
+    assert sales[0] == ["region", "amount"]
+    assert sales[-1] == ["region 4", "40"]
+    assert costs == [["item", "cost"], ["rent", "1200"], ["power", ""]]
+
+
+def test_sheets_are_selected_by_name_or_index(workbook):
+    result = server.convert_excel_to_csv(workbook, output_mode="file", sheets=["1"])
+    assert result["success"], result
+    assert (result["sheet"], result["rows"]) == ("Q1 - Costs", 3)
+    result = server.convert_excel_to_csv(workbook, output_mode="file", sheets=["Missing"])
+    assert not result["success"]
+
+
+def test_archive_holds_every_sheet(workbook):
+    result = server.convert_excel_to_csv(workbook, output_mode="file", all_sheets=True, archive=True)
+    assert result["success"], result
+    with zipfile.ZipFile(result["path"]) as archive:
+        assert sorted(archive.namelist()) == ["report_Q1_-_Costs.csv", "report_Sales.csv"]
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+import file_converter_server as server
+
+
+def crash(marker: str = None, progress_path: str = None):
+    """Kill the worker process, or only the first time if marker is given."""
+    if marker is None or not os.path.exists(marker):
+        if marker is not None:
+            open(marker, "w").close()
+        os._exit(1)
+    return os.getpid()
+
+
+@pytest.fixture
+def executor():
+    executor = server.ConversionExecutor(thread_workers=2, process_workers=1)
+    yield executor
+    executor.shutdown()
+
+
+def test_crashing_backend_does_not_run_in_server_process(executor):
+    with pytest.raises(server.WorkerCrashed):
+        executor.run_in_process(crash)
+    with pytest.raises(server.WorkerCrashed):
+        executor.map_in_process(crash, [(), ()])
+
+
+def test_crashed_job_is_retried_in_new_worker(executor, tmp_path):
+    pid = executor.run_in_process(crash, str(tmp_path / "crashed"))
+    assert pid != os.getpid()
+    assert executor.map_in_process(crash, [(str(tmp_path / "crashed_map"),)])[0] != os.getpid()
+
+
+def test_job_scope_releases_workspaces():
+    live = server.workspaces.stats()["live"]
+    with server.job_scope():
+        temp_dir = server.make_temp_dir()
+        leftover = os.path.join(temp_dir, "output.pdf")
+        open(leftover, "wb").close()
+        assert server.workspaces.stats()["live"] == live + 1
+    assert server.workspaces.stats()["live"] == live
+    assert not os.path.exists(leftover)
+
+
+def test_direct_tool_call_releases_workspaces():
+    live = server.workspaces.stats()["live"]
+    response = server.convert_file(file_content_base64=server.base64_codec.encode_bytes(b"# Title\n"),
+                                   input_format="md", output_format="html")
+    assert response["success"]
+    assert server.workspaces.stats()["live"] == live
+
+
+def test_cancelled_call_keeps_its_slot_until_the_thread_stops():
+    executor = server.ConversionExecutor(thread_workers=2, process_workers=0,
+                                         concurrency_limits={"slow": 1}, max_queue_depth=0)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(10)
+        return {"success": True}
+
+    async def scenario():
+        task = asyncio.create_task(executor.run_tool("slow", slow))
+        await asyncio.to_thread(started.wait, 10)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        busy = await executor.run_tool("slow", slow)
+        release.set()
+        while executor.stats()["running"]["slow"]:
+            await asyncio.sleep(0.01)
+        return busy, await executor.run_tool("slow", slow)
+
+    try:
+        busy, after = asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown()
+    assert "Server busy" in busy["error"]
+    assert after == {"success": True}
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+from PIL import Image
+
+import file_converter_server as server
+
+
+def write_document(directory, image_path):
+    html_path = os.path.join(directory, "page.html")
+    with open(html_path, "w", encoding="utf-8") as html_file:
+        html_file.write(f'<html><body><p>Picture</p><img src="{image_path}"></body></html>')
+    return html_path
+
+
+def image_count(pdf_path):
+    pymupdf = pytest.importorskip("pymupdf")
+    with pymupdf.open(pdf_path) as document:
+        return sum(len(page.get_images()) for page in document)
+
+
+@pytest.fixture
+def outside_image(tmp_path):
+    path = tmp_path / "outside.png"
+    Image.new("RGB", (20, 20), "red").save(path)
+    return str(path)
+
+
+def test_uploads_and_content_have_no_base_path(tmp_path):
+    assert server.document_base_path(str(tmp_path / "page.html")) == str(tmp_path / "page.html")
+    with server.workspaces.workspace() as temp_dir:
+        assert server.document_base_path(os.path.join(temp_dir, "input.html")) is None
+    assert server.document_base_path(os.path.join(server.UPLOAD_DIR, "upload", "page.html")) is None
+
+
+def test_local_reads_are_confined_to_the_source_directory(tmp_path, outside_image):
+    base_path = str(tmp_path / "docs" / "page.html")
+    inside = (tmp_path / "docs" / "picture.png").as_uri()
+    outside = (tmp_path / "docs" / ".." / "outside.png").as_uri()
+    assert server.local_read_allowed(inside, base_path)
+    assert not server.local_read_allowed(outside, base_path)
+    assert not server.local_read_allowed(inside, None)
+
+
+@pytest.mark.parametrize("engine", ["xhtml2pdf"])
+def test_client_content_cannot_read_local_files(engine, tmp_path, outside_image, monkeypatch):
+    if not server.backends.available(engine):
+        pytest.skip(f"{engine} is not installed")
+    monkeypatch.setattr(server, "HTML2PDF_POOLED", False)
+    monkeypatch.setattr(server, "get_html2pdf_engine", lambda: engine)
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    output_path = str(tmp_path / "output.pdf")
+    # A file the caller named reads images beside it, and nothing outside its directory
+    Image.open(outside_image).save(source_dir / "inside.png")
+    server.html_file_to_pdf_backend(write_document(str(source_dir), "inside.png"), output_path)
+    assert image_count(output_path) == 1
+    server.html_file_to_pdf_backend(write_document(str(source_dir), outside_image), output_path)
+    assert image_count(output_path) == 0
+    # Content decoded into a workspace reads no local files at all
+    with server.workspaces.workspace() as temp_dir:
+        Image.open(outside_image).save(os.path.join(temp_dir, "inside.png"))
+        server.html_file_to_pdf_backend(write_document(temp_dir, "inside.png"), output_path)
+    assert image_count(output_path) == 0
+
+
+def test_linked_assets_are_part_of_the_cache_options(tmp_path, outside_image):
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    (source_dir / "style.css").write_text("body { color: red; }")
+    Image.open(outside_image).save(source_dir / "inside.png")
+    html_path = source_dir / "page.html"
+    html_path.write_text('<link rel="stylesheet" href="style.css"><img src="inside.png">'
+                         f'<img src="{outside_image}"><img src="https://example.com/remote.png"><img src="missing.png">')
+    stamps = server.linked_asset_stamps(str(html_path))
+    assert [os.path.basename(stamp[0]) for stamp in stamps] == ["inside.png", "style.css"]
+    route = server.converter_registry.find_route("html", "pdf")
+    options = server.route_cache_options(route, str(html_path))
+    (source_dir / "style.css").write_text("body { color: blue; background: white; }")
+    assert server.route_cache_options(route, str(html_path)) != options
+    assert options["html2pdf_engine"] == server.get_html2pdf_engine()
+    # Content decoded into a workspace reads no local files
+    with server.workspaces.workspace() as temp_dir:
+        assert server.linked_asset_stamps(os.path.join(temp_dir, "page.html")) == []
+
+
+def test_docx_routes_are_keyed_by_engine(monkeypatch):
+    route = server.converter_registry.find_route("docx", "pdf")
+    monkeypatch.setattr(server, "get_docx2pdf_engine", lambda: "libreoffice")
+    libreoffice = server.route_cache_options(route, "input.docx")
+    monkeypatch.setattr(server, "get_docx2pdf_engine", lambda: "docx2pdf")
+    assert server.route_cache_options(route, "input.docx") != libreoffice
@@ -0,0 +1,105 @@
+import io
+
+import pytest
+
+import file_converter_server as server
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def rotated_jpeg(width: int = 400, height: int = 200, orientation: int = 6) -> bytes:
+    """A JPEG stored width x height that displays rotated by its EXIF orientation."""
+    img = Image.new("RGB", (width, height), (200, 40, 40))
+    img.paste((40, 40, 200), (0, 0, width // 2, height))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+def displayed_size(data: bytes) -> tuple:
+    with Image.open(io.BytesIO(data)) as img:
+        rotated = img.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+        return (img.height, img.width) if rotated else img.size
+
+
+@pytest.mark.parametrize("output_format", ["jpg", "png", "webp"])
+def test_resize_respects_exif_orientation(output_format):
+    output = server.image_bytes_backend(rotated_jpeg(), output_format, {"max_width": 100})
+    assert displayed_size(output) == (100, 200)
+
+
+def test_orientation_is_applied_without_resize():
+    output = server.image_bytes_backend(rotated_jpeg(), "png")
+    assert displayed_size(output) == (200, 400)
+
+
+def test_duplicate_frames_are_written_once(tmp_path):
+    source = tmp_path / "single.png"
+    Image.new("RGB", (10, 10), "red").save(source)
+    exports = server.image_frames_backend(str(source), str(tmp_path), "png", [0, -1, 0])
+    assert [export["frame"] for export in exports] == [0]
+    assert exports[0]["file"] == str(tmp_path / "frame_0.png")
+
+
+def sample_image(output_format: str) -> bytes:
+    img = Image.new("RGB", (64, 48), (30, 120, 200))
+    img.paste((240, 200, 10), (8, 8, 40, 30))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG" if output_format == "jpg" else output_format.upper())
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("input_format", ["png", "jpg"])
+@pytest.mark.parametrize("output_format", ["png", "jpg", "webp"])
+def test_memory_and_file_paths_produce_the_same_bytes(input_format, output_format, tmp_path):
+    data = sample_image(input_format)
+    source = tmp_path / f"source.{input_format}"
+    source.write_bytes(data)
+    output = tmp_path / f"output.{output_format}"
+    options = {"quality": 80, "max_width": 32}
+    server.image_backend(str(source), str(output), output_format, options)
+    assert server.image_bytes_backend(data, output_format, options) == output.read_bytes()
+
+
+@pytest.mark.parametrize("output_format", ["png", "webp"])
+def test_convert_image_is_the_same_above_the_memory_threshold(output_format, monkeypatch):
+    encoded = server.base64_codec.encode_bytes(sample_image("png"))
+    monkeypatch.setattr(server.conversion_cache, "enabled", False)
+
+    def convert():
+        return server.convert_image(
+            file_content_base64=encoded, input_format="png", output_format=output_format, output_mode="file")
+
+    in_memory = convert()
+    monkeypatch.setattr(server, "IMAGE_MEMORY_THRESHOLD", 0)
+    from_file = convert()
+    assert in_memory["success"] and from_file["success"]
+    assert in_memory["sha256"] == from_file["sha256"]
+
+
+def test_open_image_applies_its_own_limit_and_keeps_pillows(monkeypatch):
+    buffer = io.BytesIO()
+    Image.new("RGB", (50, 50)).save(buffer, format="PNG")
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)
+    monkeypatch.setattr(server, "IMAGE_MAX_PIXELS", 10000)
+    assert server.open_image(buffer.getvalue()).size == (50, 50)
+    assert Image.MAX_IMAGE_PIXELS == 100
+    monkeypatch.setattr(server, "IMAGE_MAX_PIXELS", 1000)
+    with pytest.raises(ValueError, match="above the limit"):
+        server.open_image(buffer.getvalue())
+    assert Image.MAX_IMAGE_PIXELS == 100
+
+
+def test_multipage_tiff_converts_to_one_pdf_page_per_frame(tmp_path, monkeypatch):
+    pymupdf = pytest.importorskip("pymupdf")
+    source = tmp_path / "pages.tiff"
+    pages = [Image.new("RGB", (40, 30), color) for color in ("red", "green", "blue")]
+    pages[0].save(source, save_all=True, append_images=pages[1:])
+    monkeypatch.setattr(server.conversion_cache, "enabled", False)
+    result = server.convert_image(input_file=str(source), output_format="pdf", output_mode="file")
+    assert result["success"], result
+    assert result["mime_type"] == "application/pdf"
+    with pymupdf.open(result["path"]) as document:
+        assert document.page_count == 3
@@ -0,0 +1,41 @@
+import pytest
+
+import file_converter_server as server
+
+
+DOCUMENTS = {
+    "sections": "# One\n\nText with *emphasis*.\n\n## Two\n\n- a\n- b\n\n# Three\n\n| a | b |\n|---|---|\n| 1 | 2 |\n",
+    "accented duplicate": "# é\n\nfirst\n\n# e\n\nsecond\n",
+    "setext and atx duplicate": "Intro\n=====\n\ntext\n\n# Intro\n\nmore\n",
+    "setext sections": "Title\n=====\n\nintro\n\nPart\n----\n\nbody\n\nOther\n-----\n\nend\n",
+    "paragraph before setext": "# Start\n\nsome text\nHeading\n=======\n\nafter\n",
+    "list before underline": "# Start\n\n- item\n---\n\n# End\n",
+    "fenced headings": "# Code\n\n```\n# not a heading\nText\n====\n```\n\n# Code 2\n",
+    "empty slugs": "# !!!\n\na\n\n# ???\n\nb\n",
+    "numbered slug": "# e_1\n\na\n\n# e\n\nb\n\n# e\n\nc\n",
+    "setext after atx": "# A\nText\n====\n\nbody\n\n# B\n",
+    "underline after fence": "# A\n\n```\ncode\n```\nText\n----\n",
+    "horizontal rule": "# A\n\ntext\n\n---\n\n# B\n\n***\n",
+}
+
+
+@pytest.mark.parametrize("name", sorted(DOCUMENTS))
+def test_incremental_render_matches_full_render(name, monkeypatch):
+    md_content = DOCUMENTS[name]
+    monkeypatch.setattr(server, "MARKDOWN_INCREMENTAL", False)
+    full = server.markdown_to_html(md_content, standalone=False)
+    monkeypatch.setattr(server, "MARKDOWN_INCREMENTAL", True)
+    # Twice: the second render reuses cached fragments
+    assert server.markdown_to_html(md_content, standalone=False) == full
+    assert server.markdown_to_html(md_content, standalone=False) == full
+
+
+def test_setext_headings_split_sections():
+    sections = server.split_markdown_sections(DOCUMENTS["setext sections"])
+    assert [section.splitlines()[0] for section in sections] == ["Title", "Part", "Other"]
+
+
+def test_colliding_ids_fall_back_to_full_render():
+    for name in ("accented duplicate", "setext and atx duplicate"):
+        sections = server.split_markdown_sections(DOCUMENTS[name])
+        assert sections is None or server.render_markdown_sections(sections) is None
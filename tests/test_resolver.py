@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import uuid
+
+import pytest
+
+import file_converter_server as server
+
+
+@pytest.fixture
+def temp_subdir():
+    path = os.path.join(tempfile.gettempdir(), f"resolver_test_{uuid.uuid4().hex[:8]}", "nested")
+    os.makedirs(path)
+    yield path
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+def test_nested_temp_file_resolves_by_name(temp_subdir):
+    filename = f"report_{uuid.uuid4().hex[:8]}.docx"
+    path = os.path.join(temp_subdir, filename)
+    open(path, "wb").close()
+    server.file_index.ensure_fresh(force=True)
+    assert os.path.realpath(server.validate_file_exists(filename, ".docx")) == os.path.realpath(path)
+
+
+def test_server_directories_do_not_resolve(temp_subdir):
+    filename = f"output_{uuid.uuid4().hex[:8]}.pdf"
+    os.makedirs(server.OUTPUT_DIR, exist_ok=True)
+    path = os.path.join(server.OUTPUT_DIR, filename)
+    open(path, "wb").close()
+    try:
+        server.file_index.ensure_fresh(force=True)
+        with pytest.raises(ValueError):
+            server.validate_file_exists(filename)
+    finally:
+        os.remove(path)
+
+
+def test_locations_are_searched_in_priority_order(tmp_path):
+    first, second = tmp_path / "first", tmp_path / "second"
+    (first / "deep" / "er").mkdir(parents=True)
+    second.mkdir()
+    for directory in (first / "deep" / "er", first, second):
+        (directory / "data.csv").write_text("a\n")
+    (second / "Data.CSV").write_text("a\n")
+    (first / "data.xlsx").write_text("a\n")
+    index = server.FileIndex(locations_func=lambda: [str(second), str(first)])
+    index.ensure_fresh()
+    assert index.find(["data.csv"], ["data"]) == [
+        str(second / "data.csv"), str(second / "Data.CSV"),
+        str(first / "data.csv"), str(first / "deep" / "er" / "data.csv"), str(first / "data.xlsx"),
+    ]
+
+
+def test_excluded_directories_are_skipped_and_forgotten(tmp_path):
+    (tmp_path / "kept").mkdir()
+    (tmp_path / "hidden").mkdir()
+    (tmp_path / "kept" / "a.txt").write_text("a")
+    (tmp_path / "hidden" / "a.txt").write_text("a")
+    index = server.FileIndex(locations_func=lambda: [str(tmp_path)])
+    index.ensure_fresh()
+    assert len(index.find(["a.txt"])) == 2
+    index.exclude(str(tmp_path / "hidden"))
+    index.ensure_fresh()
+    assert index.find(["a.txt"]) == [str(tmp_path / "kept" / "a.txt")]
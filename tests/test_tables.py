@@ -0,0 +1,31 @@
+import pytest
+
+import file_converter_server as server
+
+pa = pytest.importorskip("pyarrow")
+
+
+def read_table(path, output_format):
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(path)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "feather"])
+@pytest.mark.parametrize("later, expected_type", [(2.5, pa.float64()), ("text", pa.string())])
+def test_column_type_change_after_first_batch(output_format, later, expected_type, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "TABLE_BATCH_ROWS", 4)
+    path = str(tmp_path / f"output.{output_format}")
+    writer = server.TableWriter(path, output_format, ["value", "name"])
+    for index in range(6):
+        writer.append((index, f"row {index}"))
+    writer.append((later, "later"))
+    writer.close()
+    table = read_table(path, output_format)
+    assert table.schema.field("value").type == expected_type
+    assert table.schema.field("name").type == pa.string()
+    assert table.num_rows == 7
+    convert = float if expected_type == pa.float64() else str
+    assert table.column("value").to_pylist() == [convert(index) for index in range(6)] + [later]
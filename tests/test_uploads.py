@@ -0,0 +1,85 @@
+import base64
+import os
+import threading
+import uuid
+
+import pytest
+
+import file_converter_server as server
+
+
+@pytest.fixture
+def finished_upload():
+    filename = f"secret_report_{uuid.uuid4().hex[:8]}.docx"
+    upload = server.uploads.begin(filename)
+    server.uploads.append(upload["upload_id"], 0, b"confidential")
+    upload = server.uploads.finish(upload["upload_id"])
+    yield filename, upload
+    server.uploads.abort(upload["upload_id"])
+
+
+def test_upload_is_not_resolvable_by_name(finished_upload):
+    filename, upload = finished_upload
+    server.file_index.ensure_fresh(force=True)
+    with pytest.raises(ValueError):
+        server.validate_file_exists(filename)
+    with pytest.raises(ValueError):
+        server.validate_file_exists(filename, ".docx")
+
+
+def test_upload_is_resolvable_by_handle(finished_upload):
+    filename, upload = finished_upload
+    path = server.validate_file_exists(upload["handle"], ".docx")
+    assert os.path.basename(path) == filename
+    with open(path, "rb") as file:
+        assert file.read() == b"confidential"
+
+
+def test_excluded_directory_is_not_indexed(finished_upload):
+    filename, upload = finished_upload
+    index = server.FileIndex(locations_func=lambda: [os.path.dirname(server.UPLOAD_DIR)])
+    index.exclude(server.UPLOAD_DIR)
+    index.ensure_fresh()
+    assert index.find([filename]) == []
+
+
+def test_server_directories_are_excluded():
+    excluded = server.file_index.stats()["excluded"]
+    for directory in (server.UPLOAD_DIR, server.OUTPUT_DIR, server.CACHE_DIR,
+                      server.WORKSPACE_DIR, server.LIBREOFFICE_PROFILE_DIR):
+        assert os.path.abspath(directory) in excluded
+
+
+def test_append_waits_for_another_worker_writing_the_upload(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    manager = server.UploadManager(root=str(tmp_path))
+    upload = manager.begin("data.bin")
+    appended, rejected = threading.Event(), threading.Event()
+
+    def append():
+        try:
+            manager.append(upload["upload_id"], 0, b"first")
+            appended.set()
+        except server.UploadOffsetMismatch:
+            rejected.set()
+
+    # Another worker process holding the session lock, in the middle of a write
+    with open(tmp_path / upload["upload_id"] / ".lock", "a+b") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        thread = threading.Thread(target=append)
+        thread.start()
+        assert not appended.wait(0.3)
+        with open(tmp_path / upload["upload_id"] / "data.part", "r+b") as data:
+            data.write(b"other")
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    thread.join(5)
+    # The offset is checked again once the lock is released, so the chunk is rejected
+    assert rejected.is_set()
+    assert manager.status(upload["upload_id"])["offset"] == 5
+
+
+@pytest.mark.parametrize("data", [b"", b"a", b"ab", b"abc", b"abcd" * 100])
+def test_decoded_size_accounts_for_padding(data):
+    encoded = base64.encodebytes(data).decode("ascii")
+    assert server.base64_codec.decoded_size(encoded) == len(data)
+    assert server.base64_codec.decoded_size(encoded.replace("\n", "")) == len(data)